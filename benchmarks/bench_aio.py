@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Measures the event throughput and the request latency of
+``i3ipc.aio.Connection`` against a fake ipc server running in a child
+process.
+
+Pass ``--uvloop`` to run the benchmark on uvloop.
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+
+from fakeipc import FakeIpcServer
+from i3ipc.aio import Connection
+
+EVENTS = 50000
+REQUESTS = 5000
+
+
+async def bench_events(i3):
+    done = asyncio.get_event_loop().create_future()
+    count = 0
+
+    def on_window(i3, e):
+        nonlocal count
+        count += 1
+        if count == EVENTS:
+            done.set_result(None)
+
+    i3.on('window', on_window)
+    await i3.subscribe(['window'])
+
+    start = time.perf_counter()
+    await i3.command('fake-emit window {}'.format(EVENTS))
+    await done
+    elapsed = time.perf_counter() - start
+    i3.off(on_window)
+
+    print('events: {} window events in {:.3f} s, {:.0f} events/s'.format(
+        EVENTS, elapsed, EVENTS / elapsed))
+
+
+async def bench_latency(i3):
+    latencies = []
+    for _ in range(REQUESTS):
+        start = time.perf_counter()
+        await i3.get_version()
+        latencies.append(time.perf_counter() - start)
+
+    latencies.sort()
+    print('sequential requests: mean {:.1f} us, p50 {:.1f} us, p99 {:.1f} us'.format(
+        statistics.mean(latencies) * 1e6, latencies[len(latencies) // 2] * 1e6,
+        latencies[int(len(latencies) * 0.99)] * 1e6))
+
+    start = time.perf_counter()
+    await asyncio.gather(*[i3.get_version() for _ in range(REQUESTS)])
+    elapsed = time.perf_counter() - start
+    print('concurrent requests: {} in {:.3f} s, {:.0f} requests/s'.format(
+        REQUESTS, elapsed, REQUESTS / elapsed))
+
+
+async def run(socket_path):
+    i3 = await Connection(socket_path).connect()
+    await bench_latency(i3)
+    await bench_events(i3)
+    await i3.close()
+
+
+def main():
+    if '--uvloop' in sys.argv:
+        import uvloop
+        uvloop.install()
+
+    server = FakeIpcServer().start(process=True)
+    try:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(run(server.socket_path))
+        loop.close()
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
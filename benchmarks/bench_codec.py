@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""Compares the JSON codecs supported by the connections on GET_TREE
+payloads.
+
+Pass the paths of recorded payloads to benchmark them, for example one
+recorded with ``i3-msg -t get_tree > tree.json``. Without arguments,
+synthetic trees of several sizes are used.
+"""
+
+import sys
+
+from common import make_tree_json, human_size, best_of
+from i3ipc._private import get_codec
+
+CODECS = ['json', 'ujson', 'orjson']
+
+
+def load_payloads(paths):
+    if paths:
+        payloads = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                payloads.append((path, f.read()))
+        return payloads
+
+    return [('{} nodes'.format(n), make_tree_json(n)) for n in (100, 1000, 5000, 20000)]
+
+
+def main():
+    codecs = []
+    for name in CODECS:
+        try:
+            codecs.append(get_codec(name))
+        except ImportError:
+            print('{} is not installed'.format(name))
+
+    columns = ' '.join('{:>12}'.format(c.name + ' (ms)') for c in codecs)
+    print('{:>12} {:>10} {}'.format('payload', 'size', columns))
+
+    for name, payload in load_payloads(sys.argv[1:]):
+        buf = bytearray(payload)
+        times = [best_of(lambda: codec.loads(buf), repeat=5) for codec in codecs]
+        columns = ' '.join('{:>12.3f}'.format(t * 1000) for t in times)
+        print('{:>12} {:>10} {}'.format(name, human_size(len(payload)), columns))
+
+
+if __name__ == '__main__':
+    main()
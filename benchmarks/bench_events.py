@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""Measures the event throughput of the subscription reader of
+``i3ipc.aio.Connection`` by replaying 100k window events through a local
+socketpair.
+
+The events are a third each of focus, title and move events. With
+``--detail focus`` the handler only subscribes to ``window::focus`` and the
+other events are skipped.
+"""
+
+import argparse
+import asyncio
+import json
+import socket
+import threading
+import time
+
+from common import pack, make_window
+from i3ipc.aio import Connection
+from i3ipc.aio.connection import _IpcProtocol
+
+EVENTS = 100000
+WINDOW_EVENT = (1 << 31) | 3
+
+
+CHANGES = ('focus', 'title', 'move')
+
+
+def make_events(count):
+    frames = []
+    for i in range(count):
+        change = CHANGES[i % 3]
+        payload = json.dumps({'change': change, 'container': make_window(i + 1, 0x1000000 + i)})
+        frames.append(pack(WINDOW_EVENT, payload))
+    return b''.join(frames)
+
+
+async def replay(stream, detail):
+    i3 = Connection(socket_path='/dev/null')
+    i3._loop = asyncio.get_event_loop()
+    writer, reader = socket.socketpair()
+    _, i3._sub_protocol = await i3._loop.create_unix_connection(
+        lambda: _IpcProtocol(i3._on_sub_message, i3._on_sub_connection_lost), sock=reader)
+
+    done = i3._loop.create_future()
+    count = 0
+    expected = EVENTS if detail is None else EVENTS // 3 + (EVENTS % 3 > CHANGES.index(detail))
+
+    def on_window(i3, e):
+        nonlocal count
+        count += 1
+        if count == expected:
+            done.set_result(None)
+
+    i3.on('window' if detail is None else 'window::' + detail, on_window)
+
+    start = time.perf_counter()
+    threading.Thread(target=writer.sendall, args=(stream, )).start()
+    await done
+    elapsed = time.perf_counter() - start
+
+    i3._close()
+    writer.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='aio event throughput')
+    parser.add_argument('--detail', choices=CHANGES, help='only handle window::DETAIL events')
+    args = parser.parse_args()
+
+    stream = make_events(EVENTS)
+    elapsed = asyncio.get_event_loop().run_until_complete(replay(stream, args.detail))
+    print('{} window events ({:.1f} MB) in {:.3f} s: {:.0f} events/s'.format(
+        EVENTS,
+        len(stream) / (1 << 20), elapsed, EVENTS / elapsed))
+
+
+if __name__ == '__main__':
+    main()
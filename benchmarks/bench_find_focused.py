@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""Measures the time from a decoded GET_TREE reply to the focused container
+on a synthetic tree of 5k nodes (pass other sizes as the arguments).
+
+The tree is built up front or with ``lazy=True``, where only the containers
+on the focus path and their siblings are built. A search of every container
+is shown as well for comparison with the focus stack walk of
+``find_focused()``.
+"""
+
+import sys
+
+from common import make_tree_json, best_of
+from i3ipc import Con
+from i3ipc._private import get_codec
+
+
+def search(tree):
+    return next(c for c in tree if c.focused)
+
+
+def main():
+    sizes = [int(n) for n in sys.argv[1:]] or [5000]
+    codec = get_codec(None)
+    cases = [
+        ('eager, search', lambda data: search(Con(data, None, None))),
+        ('eager, find_focused', lambda data: Con(data, None, None).find_focused()),
+        ('lazy, search', lambda data: search(Con(data, None, None, True, True))),
+        ('lazy, find_focused', lambda data: Con(data, None, None, True, True).find_focused()),
+    ]
+
+    print('{:>8} {:>24} {:>10}'.format('nodes', 'tree', 'time (ms)'))
+    for n_nodes in sizes:
+        data = codec.loads(make_tree_json(n_nodes))
+        for name, func in cases:
+            assert func(data).focused
+            elapsed = best_of(lambda: func(data), repeat=5)
+            print('{:>8} {:>24} {:>10.3f}'.format(n_nodes, name, elapsed * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Compares the framed receive path of the sync ``Connection`` with the
+receive loop used up to i3ipc 2.2.1 for reply sizes from 1 KB to 20 MB.
+
+Each reply is written by a thread to one end of a socketpair and read back
+on the other end. The receive time and the receive plus JSON decode time are
+reported separately since the decode dominates for large replies.
+"""
+
+import json
+import socket
+import struct
+import threading
+
+from common import pack, make_payload, human_size, best_of
+from i3ipc import Connection
+
+SIZES = [1 << 10, 16 << 10, 256 << 10, 1 << 20, 5 << 20, 20 << 20]
+
+
+def legacy_ipc_recv(sock):
+    # the receive loop of i3ipc 2.2.1
+    data = sock.recv(14)
+    msg_magic, msg_length, msg_type = struct.unpack('=6sII', data[:14])
+    msg_size = 14 + msg_length
+    while len(data) < msg_size:
+        data += sock.recv(msg_length)
+    payload = data[14:msg_size].decode('utf-8', 'replace')
+    return payload, msg_type
+
+
+def run(recv, frame, decode):
+    a, b = socket.socketpair()
+
+    def send():
+        a.sendall(frame)
+
+    def receive():
+        writer = threading.Thread(target=send)
+        writer.start()
+        payload, msg_type = recv(b)
+        if decode:
+            json.loads(payload)
+        writer.join()
+
+    try:
+        return best_of(receive, repeat=5)
+    finally:
+        a.close()
+        b.close()
+
+
+def main():
+    conn = Connection.__new__(Connection)
+
+    for decode in (False, True):
+        print('receive{}'.format(' + decode' if decode else ''))
+        print('{:>10} {:>14} {:>14} {:>8}'.format('size', 'legacy (ms)', 'framed (ms)', 'speedup'))
+        for size in SIZES:
+            frame = pack(4, make_payload(size))
+            legacy = run(legacy_ipc_recv, frame, decode)
+            framed = run(conn._ipc_recv, frame, decode)
+            print('{:>10} {:>14.3f} {:>14.3f} {:>7.1f}x'.format(human_size(size), legacy * 1000,
+                                                                framed * 1000, legacy / framed))
+        print()
+
+
+if __name__ == '__main__':
+    main()
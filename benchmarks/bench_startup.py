@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Measures the startup time of a short lived script that connects to the ipc
+(``python -c 'import i3ipc; i3ipc.Connection()'``) for every way the socket
+path can be found:
+
+* ``env`` - ``I3SOCK`` is set.
+* ``scan`` - the socket is found in ``$XDG_RUNTIME_DIR/i3``.
+* ``cache`` - the socket path is read from the cache file.
+* ``binary`` - the socket path is printed by an ``i3`` script on ``PATH``.
+
+A plain ``python -c 'import i3ipc'`` is measured as the baseline.
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from fakeipc import FakeIpcServer
+
+RUNS = 20
+CONNECT = 'import i3ipc; i3ipc.Connection()'
+
+
+def bench(name, code, env):
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], env=env, check=True)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    print('{:<8} min {:6.1f} ms, median {:6.1f} ms'.format(name, times[0] * 1e3,
+                                                           times[len(times) // 2] * 1e3))
+
+
+def main():
+    server = FakeIpcServer().start(process=True)
+    tmp = tempfile.mkdtemp(prefix='i3ipc-bench-startup-')
+
+    try:
+        runtime_dir = os.path.join(tmp, 'runtime')
+        os.makedirs(os.path.join(runtime_dir, 'i3'))
+        os.symlink(server.socket_path, os.path.join(runtime_dir, 'i3', 'ipc-socket.1'))
+
+        bin_dir = os.path.join(tmp, 'bin')
+        os.mkdir(bin_dir)
+        i3 = os.path.join(bin_dir, 'i3')
+        with open(i3, 'w') as f:
+            f.write('#!/bin/sh\necho {}\n'.format(server.socket_path))
+        os.chmod(i3, 0o755)
+
+        env = dict(os.environ)
+        for name in ('I3SOCK', 'SWAYSOCK', 'XDG_RUNTIME_DIR', 'WAYLAND_DISPLAY'):
+            env.pop(name, None)
+        env['DISPLAY'] = ':99'
+        env['PYTHONPATH'] = os.pathsep.join(sys.path)
+
+        bench('import', 'import i3ipc', env)
+        bench('env', CONNECT, dict(env, I3SOCK=server.socket_path))
+
+        cache_file = os.path.join(runtime_dir, 'i3ipc-socket-path.json')
+        scan_code = 'import os; os.path.exists({0!r}) and os.unlink({0!r}); {1}'.format(
+            cache_file, CONNECT)
+        bench('scan', scan_code, dict(env, XDG_RUNTIME_DIR=runtime_dir))
+        bench('cache', CONNECT, dict(env, XDG_RUNTIME_DIR=runtime_dir))
+        bench('binary', CONNECT, dict(env, PATH=bin_dir + os.pathsep + env.get('PATH', '')))
+    finally:
+        shutil.rmtree(tmp)
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""Compares the ``find_*`` methods of the root container, which use a
+``TreeIndex``, with a search of the whole tree on a synthetic tree of 10k
+nodes (pass another size as the first argument).
+
+Every method is called for 100 different containers, like a script that
+looks up the windows of its history in a new tree.
+"""
+
+import re
+import sys
+
+from common import make_tree_json, best_of
+from i3ipc import Con, TreeIndex
+from i3ipc._private import get_codec
+
+LOOKUPS = 100
+
+
+def main():
+    n_nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    codec = get_codec(None)
+    tree = Con(codec.loads(make_tree_json(n_nodes)), None, None)
+    cons = list(tree)
+    windows = [c for c in cons if c.window][::len(cons) // LOOKUPS][:LOOKUPS]
+    marks = [c.marks[0] for c in cons if c.marks][:LOOKUPS]
+    classes = ['Firefox', 'URxvt', 'Emacs', 'Chromium', 'mpv']
+
+    def search_marked(mark):
+        pattern = re.compile(mark)
+        return [c for c in tree if any(pattern.search(m) for m in c.marks)]
+
+    cases = [
+        ('find_by_id', [w.id for w in windows], lambda i: next(c for c in tree if c.id == i)),
+        ('find_by_window', [w.window for w in windows],
+         lambda w: next(c for c in tree if c.window == w)),
+        ('find_by_pid', [w.pid for w in windows], lambda p: [c for c in tree if c.pid == p]),
+        ('find_marked', marks, search_marked),
+        ('find_classed', classes,
+         lambda k: [c for c in tree if c.window_class and re.search(k, c.window_class)]),
+    ]
+
+    print('{} containers, {} lookups per method'.format(len(cons) + 1, LOOKUPS))
+    build = best_of(lambda: TreeIndex(tree), repeat=5)
+    print('{:>16} {:>12.3f} ms'.format('index build', build * 1000))
+    print('{:>16} {:>12} {:>12}'.format('method', 'search (ms)', 'index (ms)'))
+
+    for method, args, search in cases:
+        find = getattr(tree, method)
+        for arg in args:
+            assert find(arg) == search(arg)
+
+        searched = best_of(lambda: [search(arg) for arg in args], repeat=3)
+        indexed = best_of(lambda: [find(arg) for arg in args], repeat=3)
+        print('{:>16} {:>12.3f} {:>12.3f}'.format(method, searched * 1000, indexed * 1000))
+
+
+if __name__ == '__main__':
+    main()
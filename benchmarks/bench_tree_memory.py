@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""Measures the memory a GET_TREE snapshot takes once it is built into
+``Con`` objects, on a synthetic tree of 10k nodes (pass another size as the
+first argument).
+
+The decoded JSON is measured on its own, then the ``Con`` tree with and
+without ``ipc_data``. Without it, the decoded JSON is freed once the tree is
+built and the ``Con`` objects are all that is left.
+"""
+
+import gc
+import sys
+import tracemalloc
+
+from common import make_tree_json, human_size, best_of
+from i3ipc import Con
+from i3ipc._private import get_codec
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    result = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    return result, size
+
+
+def main():
+    n_nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    payload = make_tree_json(n_nodes)
+    codec = get_codec(None)
+
+    data, data_size = measure(lambda: codec.loads(payload))
+    tree, tree_size = measure(lambda: Con(data, None, None))
+    n_cons = sum(1 for _ in tree) + 1
+    del tree
+
+    snapshot, snapshot_size = measure(lambda: Con(codec.loads(payload), None, None, False))
+    del snapshot
+
+    build_time = best_of(lambda: Con(data, None, None), repeat=5)
+
+    print('{} containers, {} of JSON, decoded with {}'.format(
+        n_cons, human_size(len(payload)), codec.name))
+    print('{:>32} {:>10}'.format('decoded JSON', human_size(data_size)))
+    for label, size in (('Con tree on top of ipc_data', tree_size),
+                        ('Con tree with ipc_data', data_size + tree_size),
+                        ('Con tree without ipc_data', snapshot_size)):
+        print('{:>32} {:>10} {:>8.0f} B/con'.format(label, human_size(size), size / n_cons))
+    print('{:>32} {:>10.1f} ms'.format('build time', build_time * 1000))
+
+
+if __name__ == '__main__':
+    main()
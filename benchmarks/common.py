@@ -0,0 +1,178 @@
+"""Helpers shared by the benchmark scripts.
+
+The benchmarks are standalone scripts. Run them from the root of the
+repository so the local ``i3ipc`` package is importable::
+
+    PYTHONPATH=. python3 benchmarks/bench_recv.py
+"""
+
+import json
+import struct
+import time
+
+MAGIC = b'i3-ipc'
+
+
+def pack(msg_type, payload):
+    """Frames a payload the way i3 does on the ipc socket."""
+    if isinstance(payload, str):
+        payload = payload.encode()
+    return MAGIC + struct.pack('=II', len(payload), msg_type) + payload
+
+
+def _rect(x=0, y=0, width=1920, height=1080):
+    return {'x': x, 'y': y, 'width': width, 'height': height}
+
+
+def make_window(con_id, window, workspace_num=1):
+    """Builds a leaf container like the ones i3 sends for application
+    windows."""
+    klass = ('Firefox', 'URxvt', 'Emacs', 'Chromium', 'mpv')[con_id % 5]
+    return {
+        'id': con_id,
+        'type': 'con',
+        'orientation': 'none',
+        'scratchpad_state': 'none',
+        'percent': 0.5,
+        'urgent': False,
+        'marks': ['mark-{}'.format(con_id)] if con_id % 50 == 0 else [],
+        'focused': False,
+        'output': 'eDP-1',
+        'layout': 'splith',
+        'workspace_layout': 'default',
+        'last_split_layout': 'splith',
+        'border': 'normal',
+        'current_border_width': 2,
+        'rect': _rect(),
+        'deco_rect': _rect(0, 0, 960, 20),
+        'window_rect': _rect(2, 0, 956, 1058),
+        'geometry': _rect(0, 0, 800, 600),
+        'name': '{} window {} on workspace {}'.format(klass, con_id, workspace_num),
+        'window': window,
+        'window_type': 'normal',
+        'window_properties': {
+            'class': klass,
+            'instance': klass.lower(),
+            'title': '{} window {}'.format(klass, con_id),
+            'transient_for': None,
+        },
+        'nodes': [],
+        'floating_nodes': [],
+        'focus': [],
+        'fullscreen_mode': 0,
+        'sticky': False,
+        'floating': 'auto_off',
+        'swallows': [],
+    }
+
+
+def make_tree(n_nodes, windows_per_workspace=20):
+    """Builds a synthetic GET_TREE reply with roughly ``n_nodes`` containers.
+
+    The tree has the usual root -> output -> content -> workspace layout and
+    the windows of every workspace are split into pairs so the tree has some
+    depth. The last window is focused.
+    """
+    next_id = [1]
+
+    def new_id():
+        next_id[0] += 1
+        return next_id[0]
+
+    def con(con_type, name, nodes, layout='splith'):
+        return {
+            'id': new_id(),
+            'type': con_type,
+            'name': name,
+            'layout': layout,
+            'orientation': 'horizontal',
+            'border': 'normal',
+            'scratchpad_state': 'none',
+            'floating': 'auto_off',
+            'focused': False,
+            'urgent': False,
+            'marks': [],
+            'rect': _rect(),
+            'deco_rect': _rect(0, 0, 0, 0),
+            'window_rect': _rect(0, 0, 0, 0),
+            'geometry': _rect(0, 0, 0, 0),
+            'window': None,
+            'nodes': nodes,
+            'floating_nodes': [],
+            'focus': [n['id'] for n in nodes],
+            'fullscreen_mode': 0,
+            'sticky': False,
+        }
+
+    workspaces = []
+    count = 4
+    ws_num = 0
+
+    while count < n_nodes:
+        ws_num += 1
+        splits = []
+        for _ in range(windows_per_workspace // 2):
+            pair = [make_window(new_id(), 0x1000000 + next_id[0], ws_num) for _ in range(2)]
+            splits.append(con('con', None, pair, layout='splitv'))
+            count += 3
+        ws = con('workspace', str(ws_num), splits)
+        ws['num'] = ws_num
+        workspaces.append(ws)
+        count += 1
+
+    content = con('con', 'content', workspaces)
+    output = con('output', 'eDP-1', [con('dockarea', 'topdock', []), content])
+    i3_output = con('output', '__i3',
+                    [con('con', 'content', [
+                        con('workspace', '__i3_scratch', []),
+                    ])])
+    root = con('root', 'root', [i3_output, output])
+
+    # focus the last window on the last workspace
+    node = root
+    node['focus'] = [output['id'], i3_output['id']]
+    output['focus'] = [content['id'], output['nodes'][0]['id']]
+    while node['nodes']:
+        child = node['nodes'][-1]
+        node['focus'] = [child['id']] + [n['id'] for n in node['nodes'] if n is not child]
+        node = child
+    node['focused'] = True
+
+    return root
+
+
+def make_tree_json(n_nodes):
+    return json.dumps(make_tree(n_nodes)).encode()
+
+
+def make_payload(size):
+    """Builds a JSON payload (a GET_TREE like reply) of about ``size``
+    bytes."""
+    n_nodes = 4
+    data = make_tree_json(n_nodes)
+    while len(data) < size:
+        n_nodes = max(n_nodes * 2, int(n_nodes * size / len(data)) + 1)
+        data = make_tree_json(n_nodes)
+    return data
+
+
+def human_size(size):
+    if size >= 1 << 20:
+        return '{:.1f} MB'.format(size / (1 << 20))
+    if size >= 1 << 10:
+        return '{:.1f} KB'.format(size / (1 << 10))
+    return '{} B'.format(size)
+
+
+def best_of(func, repeat=5, number=1):
+    """Returns the best average time in seconds of ``number`` calls of
+    ``func`` over ``repeat`` runs."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = (time.perf_counter() - start) / number
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
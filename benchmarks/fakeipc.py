@@ -0,0 +1,189 @@
+"""A minimal stand-in for the i3 ipc used by the benchmarks.
+
+It speaks the i3 ipc framing on a unix socket, answers every request with a
+canned reply and broadcasts events to the subscribed clients. It runs its own
+event loop in a background thread, or in a child process to keep it from
+competing with the benchmark for the GIL.
+
+Besides the usual requests, it understands the ``fake-emit <event> <count>``
+command which sends ``count`` window or tick events to the subscribers, and
+the ``fake-sleep <seconds>`` command which holds up the replies on its socket
+like a wedged window manager.
+"""
+
+import asyncio
+import json
+import multiprocessing
+import os
+import struct
+import tempfile
+import threading
+import time
+
+from common import pack, make_tree, make_window
+
+EVENT_TYPES = {
+    'workspace': 0,
+    'output': 1,
+    'mode': 2,
+    'window': 3,
+    'barconfig_update': 4,
+    'binding': 5,
+    'shutdown': 6,
+    'tick': 7,
+    'input': 21,
+}
+
+
+def window_event(change='focus', con_id=42):
+    return {'change': change, 'container': make_window(con_id, 0x1000000 + con_id)}
+
+
+class FakeIpcServer:
+    def __init__(self, tree_nodes=100):
+        self.socket_dir = tempfile.mkdtemp(prefix='i3ipc-bench-')
+        self.socket_path = os.path.join(self.socket_dir, 'ipc-socket')
+        self.replies = {
+            1: [{
+                'num': 1,
+                'name': '1',
+                'visible': True,
+                'focused': True,
+                'urgent': False,
+                'rect': {'x': 0, 'y': 0, 'width': 1920, 'height': 1080},
+                'output': 'eDP-1'
+            }],
+            3: [{
+                'name': 'eDP-1',
+                'active': True,
+                'primary': True,
+                'current_workspace': '1',
+                'rect': {'x': 0, 'y': 0, 'width': 1920, 'height': 1080}
+            }],
+            4: make_tree(tree_nodes),
+            5: ['mark-50'],
+            6: ['bar-0'],
+            7: {
+                'major': 4,
+                'minor': 20,
+                'patch': 0,
+                'human_readable': '4.20 (fake)',
+                'loaded_config_file_name': '/dev/null'
+            },
+            8: ['default'],
+            9: {'config': ''},
+        }
+        self._encoded = {}
+        self.requests = 0
+        self._clients = {}
+        self._readers = set()
+        self._loop = None
+        self._server = None
+        self._runner = None
+
+    def start(self, process=False):
+        if process:
+            self._runner = multiprocessing.Process(target=self._run, daemon=True)
+            self._runner.start()
+            while not os.path.exists(self.socket_path):
+                time.sleep(0.001)
+        else:
+            ready = threading.Event()
+            self._runner = threading.Thread(target=self._run, args=(ready, ), daemon=True)
+            self._runner.start()
+            ready.wait()
+        return self
+
+    def _run(self, ready=None):
+        self._loop = asyncio.new_event_loop()
+        self._server = self._loop.run_until_complete(
+            asyncio.start_unix_server(self._handle_client, self.socket_path))
+        if ready is not None:
+            ready.set()
+        self._loop.run_forever()
+
+    def stop(self):
+        if isinstance(self._runner, threading.Thread):
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._runner.join()
+        else:
+            self._runner.terminate()
+            self._runner.join()
+            os.unlink(self.socket_path)
+
+        os.rmdir(self.socket_dir)
+
+    async def _shutdown(self):
+        # like i3, stop accepting connections before the clients get EOF
+        self._server.close()
+        os.unlink(self.socket_path)
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for reader in self._readers:
+            reader.feed_eof()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def emit(self, event, payload, count=1):
+        """Sends ``count`` copies of the event to every subscribed client."""
+        self._loop.call_soon_threadsafe(self._emit, event, payload, count)
+
+    def _emit(self, event, payload, count):
+        frame = pack((1 << 31) | EVENT_TYPES[event], json.dumps(payload))
+        for writer, events in self._clients.items():
+            if event in events:
+                writer.write(frame * count)
+
+    async def _handle_client(self, reader, writer):
+        self._clients[writer] = set()
+        self._readers.add(reader)
+        try:
+            while True:
+                header = await reader.readexactly(14)
+                magic, length, message_type = struct.unpack('=6sII', header)
+                payload = (await reader.readexactly(length)).decode()
+                self.requests += 1
+                if message_type == 0 and payload.startswith('fake-sleep '):
+                    # a wedged window manager
+                    await asyncio.sleep(float(payload.split(';')[0].split()[1]))
+                self._handle_message(writer, message_type, payload)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._clients.pop(writer, None)
+            self._readers.discard(reader)
+            writer.close()
+
+    def _encode(self, message_type):
+        if message_type not in self._encoded:
+            reply = self.replies.get(message_type, {})
+            self._encoded[message_type] = pack(message_type, json.dumps(reply))
+        return self._encoded[message_type]
+
+    def _handle_message(self, writer, message_type, payload):
+        if message_type == 0:
+            if payload.startswith('fake-emit '):
+                _, event, count = payload.split()
+                payload_obj = window_event() if event == 'window' else {
+                    'first': False,
+                    'payload': ''
+                }
+                self._emit(event, payload_obj, int(count))
+            commands = [c for c in payload.replace(',', ';').split(';') if c.strip()]
+            reply = [{'success': True} for _ in commands]
+        elif message_type == 2:
+            self._clients[writer].update(json.loads(payload))
+            reply = {'success': True}
+        elif message_type == 6 and payload:
+            reply = {'id': payload, 'mode': 'dock', 'position': 'bottom', 'colors': {}}
+        elif message_type == 10:
+            reply = {'success': True}
+            self._emit('tick', {'first': False, 'payload': payload}, 1)
+        else:
+            writer.write(self._encode(message_type))
+            return
+
+        writer.write(pack(message_type, json.dumps(reply)))
+
+        if message_type == 2 and 'tick' in json.loads(payload):
+            writer.write(pack((1 << 31) | 7, json.dumps({'first': True, 'payload': ''})))
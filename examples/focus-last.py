@@ -2,9 +2,7 @@
 
 import os
 import socket
-import selectors
 import tempfile
-import threading
 from argparse import ArgumentParser
 import i3ipc
 
@@ -18,6 +16,8 @@ class FocusWatcher:
     def __init__(self):
         self.i3 = i3ipc.Connection()
         self.i3.on('window::focus', self.on_window_focus)
+        # the windows are looked up without asking i3 for the tree each time
+        self.tree = i3ipc.TreeCache(self.i3)
         # Make a directory with permissions that restrict access to
         # the user only.
         os.makedirs(SOCKET_DIR, mode=0o700, exist_ok=True)
@@ -27,55 +27,40 @@ class FocusWatcher:
         self.listening_socket.bind(SOCKET_FILE)
         self.listening_socket.listen(1)
         self.window_list = []
-        self.window_list_lock = threading.RLock()
+        self.loop = i3ipc.EventLoop()
 
     def on_window_focus(self, i3conn, event):
-        with self.window_list_lock:
-            window_id = event.container.id
-            if window_id in self.window_list:
-                self.window_list.remove(window_id)
-            self.window_list.insert(0, window_id)
-            if len(self.window_list) > MAX_WIN_HISTORY:
-                del self.window_list[MAX_WIN_HISTORY:]
-
-    def launch_i3(self):
-        self.i3.main()
-
-    def launch_server(self):
-        selector = selectors.DefaultSelector()
-
-        def accept(sock):
-            conn, addr = sock.accept()
-            selector.register(conn, selectors.EVENT_READ, read)
-
-        def read(conn):
-            data = conn.recv(1024)
-            if data == b'switch':
-                with self.window_list_lock:
-                    tree = self.i3.get_tree()
-                    windows = set(w.id for w in tree.leaves())
-                    for window_id in self.window_list[1:]:
-                        if window_id not in windows:
-                            self.window_list.remove(window_id)
-                        else:
-                            self.i3.command('[con_id=%s] focus' % window_id)
-                            break
-            elif not data:
-                selector.unregister(conn)
-                conn.close()
-
-        selector.register(self.listening_socket, selectors.EVENT_READ, accept)
-
-        while True:
-            for key, event in selector.select():
-                callback = key.data
-                callback(key.fileobj)
+        window_id = event.container.id
+        if window_id in self.window_list:
+            self.window_list.remove(window_id)
+        self.window_list.insert(0, window_id)
+        if len(self.window_list) > MAX_WIN_HISTORY:
+            del self.window_list[MAX_WIN_HISTORY:]
+
+    def accept(self):
+        conn, addr = self.listening_socket.accept()
+        self.loop.add_reader(conn, self.read, conn)
+
+    def read(self, conn):
+        data = conn.recv(1024)
+        if data == b'switch':
+            tree = self.tree.get_tree()
+            windows = set(w.id for w in tree.leaves())
+            for window_id in self.window_list[1:]:
+                if window_id not in windows:
+                    self.window_list.remove(window_id)
+                else:
+                    self.i3.command('[con_id=%s] focus' % window_id)
+                    break
+        elif not data:
+            self.loop.remove_reader(conn)
+            conn.close()
 
     def run(self):
-        t_i3 = threading.Thread(target=self.launch_i3)
-        t_server = threading.Thread(target=self.launch_server)
-        for t in (t_i3, t_server):
-            t.start()
+        # the i3 events and the clients are handled from the same thread
+        self.loop.add_connection(self.i3)
+        self.loop.add_reader(self.listening_socket, self.accept)
+        self.loop.run()
 
 
 if __name__ == '__main__':
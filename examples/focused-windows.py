@@ -18,7 +18,7 @@ def focused_windows():
                 break
 
             container_id = container.focus[0]
-            container = container.find_by_id(container_id)
+            container = tree.find_by_id(container_id)
 
         if container:
             coname = container.name
@@ -25,18 +25,16 @@ class FocusWatcher:
     def __init__(self):
         self.i3 = None
         self.window_list = []
-        self.update_task = None
         self.window_index = 1
 
     async def connect(self):
         self.i3 = await Connection().connect()
-        self.i3.on('window::focus', self.on_window_focus)
+        # only the last window that keeps the focus for UPDATE_DELAY seconds
+        # goes into the history
+        self.i3.on('window::focus', self.on_window_focus, debounce=UPDATE_DELAY * 1000)
         self.i3.on('shutdown', on_shutdown)
 
-    async def update_window_list(self, window_id):
-        if UPDATE_DELAY != 0.0:
-            await asyncio.sleep(UPDATE_DELAY)
-
+    def update_window_list(self, window_id):
         logging.info('updating window list')
         if window_id in self.window_list:
             self.window_list.remove(window_id)
@@ -75,11 +73,7 @@ class FocusWatcher:
             logging.info('not handling this floating window')
             return
 
-        if self.update_task is not None:
-            self.update_task.cancel()
-
-        logging.info('scheduling task to update window list')
-        self.update_task = asyncio.create_task(self.update_window_list(event.container.id))
+        self.update_window_list(event.container.id)
 
     async def run(self):
         async def handle_switch(reader, writer):
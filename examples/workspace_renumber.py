@@ -43,10 +43,14 @@ def fix_ordering(i3conn):
         workspaces = i3conn.get_tree().workspaces()
         disordered_workspaces, least_number = find_disordered(i3conn)
         containers = list(filter(lambda x: x.num in disordered_workspaces, workspaces))
+        commands = []
         for c in containers:
             for i in c.leaves():
-                i.command("move container to workspace %s" % least_number)
+                commands.append('[con_id="%s"] move container to workspace %s' %
+                                (i.id, least_number))
             least_number += 1
+        # move all the windows in a single round trip
+        i3conn.command_batch(commands)
     return
 
 
@@ -5,6 +5,8 @@ from .replies import (BarConfigReply, CommandReply, ConfigReply, OutputReply, Ti
                       VersionReply, WorkspaceReply, SeatReply, InputReply)
 from .events import (BarconfigUpdateEvent, BindingEvent, BindingInfo, OutputEvent, ShutdownEvent,
                      WindowEvent, TickEvent, ModeEvent, WorkspaceEvent, InputEvent, Event)
-from .con import Con
+from .con import Con, TreeIndex
 from .model import Rect, Gaps
 from .connection import Connection
+from .eventloop import EventLoop, TimerHandle
+from .treecache import TreeCache
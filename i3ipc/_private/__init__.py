@@ -1,3 +1,15 @@
 from .pubsub import PubSub
 from .types import MessageType, ReplyType, EventType
 from .sync import Synchronizer
+from .framing import FrameParser
+from .pool import SocketPool, PoolStats
+from .batch import count_commands, pack_commands, join_commands, map_replies
+from .codec import get_codec
+from . import discovery
+from .reconnect import Reconnector, ReconnectStats
+from .scheduler import HandlerScheduler, SchedulerStats
+from .executor import OrderedExecutor
+from .limiter import EventLimiter
+from .handoff import SubscriptionHandoff, is_handoff_marker
+from .criteria import Criteria, compile_criteria
+from .mirror import TreeMirror, diff_trees
@@ -0,0 +1,89 @@
+from typing import List
+
+
+def count_commands(cmd: str) -> int:
+    """Counts the commands in a command string the way the i3 command parser
+    splits them. i3 sends one reply for each command separated by ``;`` or
+    ``,`` outside of quoted strings."""
+    count = 0
+    in_command = False
+    quoted = False
+    escaped = False
+
+    for c in cmd:
+        if escaped:
+            escaped = False
+        elif quoted:
+            if c == '\\':
+                escaped = True
+            elif c == '"':
+                quoted = False
+        elif c in ';,':
+            if in_command:
+                count += 1
+            in_command = False
+            continue
+        elif c == '"':
+            quoted = True
+
+        if not c.isspace():
+            in_command = True
+
+    if in_command:
+        count += 1
+
+    return count
+
+
+def pack_commands(commands: List[str], max_payload: int) -> List[List[int]]:
+    """Groups the commands into as few messages as possible such that the
+    payload of every message is at most ``max_payload`` bytes. A command that
+    is larger than ``max_payload`` is sent on its own. Returns the indices of
+    the commands in each group."""
+    groups = []
+    group = []
+    size = 0
+
+    for i, cmd in enumerate(commands):
+        cmd_size = len(cmd.encode())
+        # the commands are joined with a ';'
+        if group and size + 1 + cmd_size > max_payload:
+            groups.append(group)
+            group = []
+            size = 0
+
+        size += cmd_size + (1 if group else 0)
+        group.append(i)
+
+    if group:
+        groups.append(group)
+
+    return groups
+
+
+def join_commands(commands: List[str]) -> str:
+    return ';'.join(commands)
+
+
+def map_replies(commands: List[str], replies: list) -> list:
+    """Splits the replies to a joined command string into the replies to each
+    of the commands. i3 stops executing a command string at a parse error, so
+    the commands after the one that failed to parse get no replies."""
+    result = []
+    pos = 0
+
+    for cmd in commands:
+        count = count_commands(cmd)
+        cmd_replies = replies[pos:pos + count]
+
+        for i, reply in enumerate(cmd_replies):
+            if reply.ipc_data.get('parse_error'):
+                cmd_replies = cmd_replies[:i + 1]
+                pos = len(replies)
+                break
+        else:
+            pos += count
+
+        result.append(cmd_replies)
+
+    return result
@@ -0,0 +1,145 @@
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def lossy_decode(data) -> str:
+    """Decodes a payload that is not valid UTF-8, like one with a window title
+    that i3 passed on as it is, replacing the invalid bytes."""
+    return bytes(data).decode('utf-8', 'replace')
+
+
+class Codec:
+    """The base of the codecs. Payloads the decoder rejects are decoded again
+    from a lossy string, so invalid UTF-8 does not make a reply or an event
+    fail."""
+    name = None
+
+    def loads(self, data):
+        try:
+            return self._loads(data)
+        except ValueError:
+            # UnicodeDecodeError of json, JSONDecodeError of orjson and the
+            # ValueError of ujson are all ValueErrors
+            if isinstance(data, str):
+                raise
+            return self._loads(lossy_decode(data))
+
+    def _loads(self, data):
+        raise NotImplementedError
+
+    def dumps(self, obj) -> str:
+        raise NotImplementedError
+
+
+class StdlibCodec(Codec):
+    """Decodes and encodes JSON with the :mod:`json` module of the standard
+    library."""
+    name = 'json'
+
+    def _loads(self, data):
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        return json.loads(data)
+
+    def dumps(self, obj) -> str:
+        return json.dumps(obj)
+
+
+class OrjsonCodec(Codec):
+    """Decodes and encodes JSON with `orjson
+    <https://github.com/ijl/orjson>`_."""
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+
+    def _loads(self, data):
+        # orjson takes bytes, bytearray, memoryview and str without a copy
+        return self._orjson.loads(data)
+
+    def dumps(self, obj) -> str:
+        return self._orjson.dumps(obj).decode()
+
+
+class UjsonCodec(Codec):
+    """Decodes and encodes JSON with `ujson
+    <https://github.com/ultrajson/ultrajson>`_."""
+    name = 'ujson'
+
+    def __init__(self):
+        import ujson
+        self._ujson = ujson
+
+    def _loads(self, data):
+        if isinstance(data, (bytearray, memoryview)):
+            data = bytes(data)
+        return self._ujson.loads(data)
+
+    def dumps(self, obj) -> str:
+        return self._ujson.dumps(obj, ensure_ascii=False)
+
+
+class CustomCodec(Codec):
+    """Wraps a codec object given by the user."""
+    def __init__(self, codec):
+        self.codec = codec
+        self.name = getattr(codec, 'name', type(codec).__name__)
+
+    def _loads(self, data):
+        return self.codec.loads(data)
+
+    def dumps(self, obj) -> str:
+        return self.codec.dumps(obj)
+
+
+_codecs = {
+    OrjsonCodec.name: OrjsonCodec,
+    UjsonCodec.name: UjsonCodec,
+    StdlibCodec.name: StdlibCodec,
+}
+
+_default_codec = None
+
+
+def default_codec():
+    """Returns the fastest codec that is installed."""
+    global _default_codec
+
+    if _default_codec is None:
+        for cls in _codecs.values():
+            try:
+                _default_codec = cls()
+                break
+            except ImportError:
+                continue
+
+        logger.info('using the %s json codec', _default_codec.name)
+
+    return _default_codec
+
+
+def get_codec(codec=None):
+    """Gets a JSON codec.
+
+    :param codec: ``None`` for the fastest codec that is installed, the name of
+        a codec (``"orjson"``, ``"ujson"`` or ``"json"``), or an object with
+        ``loads()`` and ``dumps()`` methods.
+    """
+    if codec is None:
+        return default_codec()
+
+    if isinstance(codec, str):
+        if codec not in _codecs:
+            raise ValueError('unknown json codec: {}'.format(codec))
+        return _codecs[codec]()
+
+    if not hasattr(codec, 'loads') or not hasattr(codec, 'dumps'):
+        raise TypeError('a json codec must have loads() and dumps() methods')
+
+    if isinstance(codec, Codec):
+        return codec
+
+    return CustomCodec(codec)
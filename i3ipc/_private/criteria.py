@@ -0,0 +1,192 @@
+from functools import lru_cache
+import re
+
+# key, then a double quoted, single quoted or bare value
+_criterion_re = re.compile(r'''\s*([A-Za-z_]+)(?:\s*=\s*(?:
+                                   "((?:[^"\\]|\\.)*)"
+                                 | '((?:[^'\\]|\\.)*)'
+                                 | ([^\s\]"']+)
+                               ))?\s*''', re.VERBOSE)
+
+_FOCUSED = '__focused__'
+
+
+def _title(con):
+    # wayland windows of sway have no window properties, only a name
+    return con.window_title if con.window_title is not None else con.name
+
+
+# key -> the string of the container the pattern is searched in
+_PATTERNS = {
+    'class': lambda con: con.window_class,
+    'instance': lambda con: con.window_instance,
+    'window_role': lambda con: con.window_role,
+    'title': _title,
+    'app_id': lambda con: con.app_id,
+}
+
+# key -> the integer property of the container
+_NUMBERS = {
+    'id': lambda con: con.window,
+    'con_id': lambda con: con.id,
+    'pid': lambda con: con.pid,
+}
+
+# criteria that can match containers without a window
+_CONTAINER_KEYS = ('con_id', 'con_mark')
+
+
+def _pattern_test(key, value):
+    get = _PATTERNS[key]
+
+    if value == _FOCUSED:
+
+        def test(con, workspace, floating, focused):
+            return focused is not None and get(con) is not None and get(con) == get(focused)
+
+        return test
+
+    pattern = re.compile(value)
+
+    def test(con, workspace, floating, focused):
+        string = get(con)
+        return string is not None and pattern.search(string) is not None
+
+    return test
+
+
+def _number_test(key, value):
+    get = _NUMBERS[key]
+
+    if value == _FOCUSED and key == 'con_id':
+        return lambda con, workspace, floating, focused: con is focused
+
+    try:
+        number = int(value, 0)
+    except ValueError:
+        raise ValueError('{} takes a number, got "{}"'.format(key, value)) from None
+
+    return lambda con, workspace, floating, focused: get(con) == number
+
+
+def _workspace_test(value):
+    if value == _FOCUSED:
+
+        def test(con, workspace, floating, focused):
+            return workspace is not None and focused is not None and (
+                workspace is focused.workspace())
+
+        return test
+
+    pattern = re.compile(value)
+    return lambda con, workspace, floating, focused: (workspace is not None and pattern.search(
+        workspace.name) is not None)
+
+
+def _mark_test(value):
+    pattern = re.compile(value)
+    return lambda con, workspace, floating, focused: any(
+        pattern.search(mark) for mark in con.marks)
+
+
+def _unquote(double, single, bare):
+    if double is not None:
+        return double.replace('\\"', '"')
+    if single is not None:
+        return single.replace("\\'", "'")
+    return bare
+
+
+class Criteria:
+    """A compiled i3 criteria expression. Get one with
+    :func:`compile_criteria`.
+
+    :ivar uses_focused: Whether a criterion compares with the focused
+        container, which must then be passed to :func:`matches`.
+    """
+    __slots__ = ('_tests', '_windows_only', 'uses_focused')
+
+    def __init__(self, tests, windows_only, uses_focused):
+        self._tests = tests
+        self._windows_only = windows_only
+        self.uses_focused = uses_focused
+
+    def matches(self, con, workspace, floating, focused=None) -> bool:
+        """Whether the container matches every criterion.
+
+        :param workspace: The workspace the container is on.
+        :param floating: Whether the container is floating or inside a
+            floating container.
+        :param focused: The focused container, if :attr:`uses_focused`.
+        """
+        if self._windows_only and con.window is None and con.shell is None:
+            return False
+
+        for test in self._tests:
+            if not test(con, workspace, floating, focused):
+                return False
+
+        return True
+
+
+@lru_cache(maxsize=256)
+def compile_criteria(criteria: str) -> Criteria:
+    """Compiles an i3 criteria expression like ``[class="^Firefox$"
+    floating]``. The brackets are optional. Compiled expressions are cached.
+
+    Like i3, only containers with a window match unless ``con_id`` or
+    ``con_mark`` is given, and all the criteria must match. ``urgent`` takes
+    any value and matches the urgent windows.
+
+    :raises ValueError: If the expression cannot be parsed or uses a
+        criterion that is not supported.
+    """
+    text = criteria.strip()
+    if text.startswith('['):
+        if not text.endswith(']'):
+            raise ValueError('unterminated criteria: {}'.format(criteria))
+        text = text[1:-1]
+
+    tests = []
+    keys = set()
+    uses_focused = False
+    pos = 0
+
+    while pos < len(text):
+        match = _criterion_re.match(text, pos)
+        if match is None or match.end() == pos:
+            raise ValueError('invalid criteria at "{}": {}'.format(text[pos:], criteria))
+        pos = match.end()
+
+        key = match.group(1)
+        value = _unquote(match.group(2), match.group(3), match.group(4))
+        keys.add(key)
+        uses_focused = uses_focused or value == _FOCUSED
+
+        if key in ('floating', 'tiling', 'all', 'urgent'):
+            if key == 'floating':
+                tests.append(lambda con, workspace, floating, focused: floating)
+            elif key == 'tiling':
+                tests.append(lambda con, workspace, floating, focused: not floating)
+            elif key == 'urgent':
+                tests.append(lambda con, workspace, floating, focused: bool(con.urgent))
+            continue
+
+        if value is None:
+            raise ValueError('the {} criterion takes a value'.format(key))
+
+        if key in _PATTERNS:
+            tests.append(_pattern_test(key, value))
+        elif key in _NUMBERS:
+            tests.append(_number_test(key, value))
+        elif key == 'con_mark':
+            tests.append(_mark_test(value))
+        elif key == 'workspace':
+            tests.append(_workspace_test(value))
+        elif key == 'shell':
+            tests.append(lambda con, workspace, floating, focused, value=value: con.shell == value)
+        else:
+            raise ValueError('unsupported criterion: {}'.format(key))
+
+    windows_only = not any(key in keys for key in _CONTAINER_KEYS)
+    return Criteria(tuple(tests), windows_only, uses_focused)
@@ -0,0 +1,194 @@
+import glob
+import json
+import logging
+import os
+import socket
+import stat
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+# The binaries that can tell the socket path of the running window manager,
+# in order of preference.
+SOCKETPATH_BINARIES = ('i3', 'sway')
+
+CACHE_FILE_NAME = 'i3ipc-socket-path.json'
+
+
+def _runtime_dir():
+    return os.environ.get('XDG_RUNTIME_DIR')
+
+
+def _display_key():
+    # sessions are told apart by their display. A sway session also has
+    # DISPLAY set for xwayland, so the wayland display takes precedence.
+    return os.environ.get('WAYLAND_DISPLAY') or os.environ.get('DISPLAY') or ''
+
+
+def is_live_socket(path):
+    """Whether ``path`` is a unix socket that accepts connections. Stale
+    sockets left behind by a window manager that is gone refuse them."""
+    try:
+        if not stat.S_ISSOCK(os.stat(path).st_mode):
+            return False
+    except OSError:
+        return False
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+def env_socket_path(check_exists=False):
+    """Returns the socket path from the ``I3SOCK`` or ``SWAYSOCK``
+    environment variables."""
+    for name in ('I3SOCK', 'SWAYSOCK'):
+        socket_path = os.environ.get(name)
+        if not socket_path:
+            continue
+        logger.info('got socket path from %s env variable: %s', name, socket_path)
+        if not check_exists or os.path.exists(socket_path):
+            return socket_path
+        logger.info('file not found: %s', socket_path)
+    return None
+
+
+def cache_path():
+    """The path of the per user cache file, or ``None`` when there is no
+    ``XDG_RUNTIME_DIR`` to keep it in."""
+    runtime_dir = _runtime_dir()
+    if not runtime_dir:
+        return None
+    return os.path.join(runtime_dir, CACHE_FILE_NAME)
+
+
+def _read_cache(path):
+    try:
+        with open(path) as f:
+            entries = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return entries if isinstance(entries, dict) else {}
+
+
+def cached_socket_path():
+    """Returns the cached socket path for this display if it is still live."""
+    path = cache_path()
+    if not path:
+        return None
+
+    socket_path = _read_cache(path).get(_display_key())
+    if isinstance(socket_path, str) and is_live_socket(socket_path):
+        logger.info('got socket path from the cache: %s', socket_path)
+        return socket_path
+    return None
+
+
+def remember_socket_path(socket_path):
+    """Stores ``socket_path`` in the cache for this display. Failures are
+    logged and otherwise ignored."""
+    path = cache_path()
+    if not path or not socket_path:
+        return
+
+    entries = _read_cache(path)
+    if entries.get(_display_key()) == socket_path:
+        return
+    entries[_display_key()] = socket_path
+
+    tmp_path = '{}.{}'.format(path, os.getpid())
+    try:
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.info('could not write the socket path cache %s', path, exc_info=e)
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+
+
+def _scan_patterns():
+    runtime_dir = _runtime_dir()
+    i3_patterns = []
+    sway_patterns = []
+    if runtime_dir:
+        i3_patterns.append(os.path.join(runtime_dir, 'i3', 'ipc-socket.*'))
+        sway_patterns.append(os.path.join(runtime_dir, 'sway-ipc.*.sock'))
+    # i3 falls back to /tmp when there is no runtime dir
+    i3_patterns.append('/tmp/i3-*/ipc-socket.*')
+
+    if os.environ.get('WAYLAND_DISPLAY'):
+        return sway_patterns + i3_patterns
+    return i3_patterns + sway_patterns
+
+
+def scanned_socket_path():
+    """Looks for the socket in the places i3 and sway create it. Only a
+    single live socket is an answer: with more than one (nested sessions,
+    stale sockets of a crashed session that were reused) the window manager
+    binaries have to be asked."""
+    candidates = []
+    for pattern in _scan_patterns():
+        for path in sorted(glob.glob(pattern)):
+            if path not in candidates and is_live_socket(path):
+                candidates.append(path)
+
+    if len(candidates) == 1:
+        logger.info('found socket path in the runtime dir: %s', candidates[0])
+        return candidates[0]
+
+    if candidates:
+        logger.info('found more than one live socket: %s', candidates)
+    return None
+
+
+def parse_socketpath_output(binary, returncode, stdout, stderr):
+    """Returns the socket path printed by ``<binary> --get-socketpath``."""
+    if returncode == 0 and stdout:
+        socket_path = stdout.decode().strip()
+        logger.info('got socket path from `%s` binary: %s', binary, socket_path)
+        return socket_path
+
+    logger.info(
+        'could not get socket path from `%s` binary: returncode=%d, stdout=%s, stderr=%s',
+        binary, returncode, stdout, stderr)
+    return None
+
+
+def find_socket_path():
+    """Finds the ipc socket path without the environment variables: from the
+    cache, by scanning the runtime dirs, and finally by asking the ``i3`` and
+    ``sway`` binaries, which are started together."""
+    socket_path = cached_socket_path() or scanned_socket_path()
+    if socket_path:
+        remember_socket_path(socket_path)
+        return socket_path
+
+    processes = []
+    for binary in SOCKETPATH_BINARIES:
+        try:
+            processes.append((binary,
+                              subprocess.Popen([binary, '--get-socketpath'],
+                                               stdout=subprocess.PIPE,
+                                               stderr=subprocess.PIPE)))
+        except Exception as e:
+            logger.info('could not get i3 socket path from `%s` binary', binary, exc_info=e)
+
+    for binary, process in processes:
+        stdout, stderr = process.communicate()
+        if socket_path is None:
+            socket_path = parse_socketpath_output(binary, process.returncode, stdout, stderr)
+
+    if socket_path:
+        remember_socket_path(socket_path)
+    else:
+        logger.info('could not find i3/sway socket path')
+    return socket_path
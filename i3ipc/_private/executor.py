@@ -0,0 +1,102 @@
+from collections import deque
+from threading import Condition
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class OrderedExecutor:
+    """Runs calls on a thread pool of ``max_workers`` threads. Calls with the
+    same key run one at a time in the order they were submitted. Calls with
+    different keys run in parallel.
+
+    A worker runs up to ``batch_size`` calls of a key before it goes back to
+    the pool, so a busy key cannot keep a worker from the other keys.
+    Exceptions raised by the calls are passed to ``on_error`` from the
+    worker thread.
+
+    The threads are started with the first call and stopped by
+    :meth:`shutdown`. Calls submitted after that start new threads.
+    """
+    def __init__(self, max_workers, on_error, batch_size=64):
+        if max_workers < 1:
+            raise ValueError('the number of handler threads must be at least 1')
+
+        self._max_workers = max_workers
+        self._executor = None
+        self._on_error = on_error
+        self._batch_size = batch_size
+        self._cond = Condition()
+        # key -> the calls waiting for the running call of the key. A key is
+        # present while a worker is scheduled for it.
+        self._queues = {}
+        self._pending = 0
+
+    def submit(self, key, fn, args):
+        with self._cond:
+            self._pending += 1
+            queue = self._queues.get(key)
+            if queue is not None:
+                queue.append((fn, args))
+                return
+            queue = self._queues[key] = deque([(fn, args)])
+
+            if self._executor is None:
+                # imported here so connections without handler threads do not
+                # load concurrent.futures
+                from concurrent.futures import ThreadPoolExecutor
+                self._executor = ThreadPoolExecutor(self._max_workers,
+                                                    thread_name_prefix='i3ipc-handler')
+            self._executor.submit(self._run, key, queue)
+
+    def _run(self, key, queue):
+        while True:
+            for _ in range(self._batch_size):
+                with self._cond:
+                    if not queue:
+                        del self._queues[key]
+                        return
+                    fn, args = queue.popleft()
+
+                try:
+                    fn(*args)
+                except Exception as e:
+                    self._on_error(e)
+                finally:
+                    with self._cond:
+                        self._pending -= 1
+                        if not self._pending:
+                            self._cond.notify_all()
+
+            with self._cond:
+                if not queue:
+                    del self._queues[key]
+                    return
+                if self._executor is not None:
+                    self._executor.submit(self._run, key, queue)
+                    return
+            # the pool is shut down, finish the key on this thread
+
+    @property
+    def running(self) -> bool:
+        """Whether the worker threads are started."""
+        return self._executor is not None
+
+    @property
+    def pending(self) -> int:
+        """The number of calls that were submitted and did not return yet."""
+        return self._pending
+
+    def join(self, timeout=None) -> bool:
+        """Waits until every submitted call returned. Returns whether they did
+        before the timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending, timeout)
+
+    def shutdown(self, wait=True):
+        """Stops the worker threads once the calls that were submitted
+        returned. With ``wait``, blocks until they did."""
+        with self._cond:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait)
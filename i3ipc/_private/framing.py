@@ -0,0 +1,50 @@
+import struct
+from typing import Iterator, Tuple
+
+_MAGIC = b'i3-ipc'
+_struct_header = '={}sII'.format(len(_MAGIC))
+_struct_header_size = struct.calcsize(_struct_header)
+
+
+class FrameParser:
+    """Splits the stream of bytes read from an ipc socket into messages.
+
+    Data can be fed in chunks of any size. Complete messages are returned by
+    :func:`frames()` and incomplete headers or payloads are kept until the
+    rest of the message is fed.
+    """
+    def __init__(self):
+        self._buf = bytearray()
+        self._pos = 0
+
+    def __len__(self):
+        """The number of buffered bytes that were not returned as a message
+        yet."""
+        return len(self._buf) - self._pos
+
+    def feed(self, data: bytes):
+        if self._pos:
+            # drop the messages that were already returned
+            del self._buf[:self._pos]
+            self._pos = 0
+        self._buf += data
+
+    def frames(self) -> Iterator[Tuple[int, bytes]]:
+        """Yields a ``(message_type, payload)`` tuple for every complete
+        message in the buffer."""
+        buf = self._buf
+
+        while len(buf) - self._pos >= _struct_header_size:
+            magic, length, message_type = struct.unpack_from(_struct_header, buf, self._pos)
+            if magic != _MAGIC:
+                raise ValueError('got an ipc message with an invalid magic string')
+
+            start = self._pos + _struct_header_size
+            end = start + length
+            if len(buf) < end:
+                break
+
+            self._pos = end
+            with memoryview(buf) as view:
+                payload = bytes(view[start:end])
+            yield message_type, payload
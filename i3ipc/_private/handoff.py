@@ -0,0 +1,111 @@
+import itertools
+import os
+
+_TICK = (1 << 31) | 7
+_EVENT = 1 << 31
+
+_MARKER_PREFIX = 'i3ipc-handoff-'
+
+_markers = itertools.count()
+
+
+def is_handoff_marker(payload) -> bool:
+    """Whether the payload of a tick is the marker of a handoff, of this or
+    any other program. The marker ticks are not passed to tick handlers."""
+    return isinstance(payload, str) and payload.startswith(_MARKER_PREFIX)
+
+
+class SubscriptionHandoff:
+    """Moves the events of a connection from its subscription socket to a new
+    one that is subscribed to fewer events. i3 cannot unsubscribe a socket,
+    so this is the only way to stop events nobody handles.
+
+    Both sockets are subscribed to ticks. Once i3 confirmed both
+    subscriptions with the ``first`` tick, the connection sends a tick with
+    :attr:`marker` as the payload. i3 sends every event to all the
+    subscribed sockets in the same order, so:
+
+    * events of the old socket are handled up to the marker.
+    * events of the new socket are dropped up to the marker, since the old
+      socket got them too, and held after it until the old socket reached
+      the marker.
+
+    When both sockets reached the marker, the old socket is closed, the held
+    events are handled and the new socket takes over with no event lost or
+    handled twice.
+
+    i3 sends the marker tick to every client subscribed to ticks, and the
+    new socket stays subscribed to ticks for the next handoff.
+
+    :param loads: The ``loads()`` of the JSON codec, used for ticks only.
+    :param old_acked: Whether the old socket is subscribed to ticks already.
+        If not, the connection subscribes it and its ``first`` tick is
+        dropped.
+    :param events: The events the new socket is subscribed to.
+    :param transport: The new socket or protocol.
+    """
+    def __init__(self, loads, old_acked, events=None, transport=None):
+        self.events = events
+        self.transport = transport
+        self.timer = None
+        self.marker = '{}{}-{}'.format(_MARKER_PREFIX, os.getpid(), next(_markers))
+        self._loads = loads
+        self.old_acked = old_acked
+        self.new_acked = False
+        self.marker_sent = False
+        self.old_done = False
+        self._new_live = False
+        self.held = []
+
+    @property
+    def done(self) -> bool:
+        """Whether both sockets reached the marker and the new socket can
+        take over."""
+        return self.old_done and self._new_live
+
+    @property
+    def ready(self) -> bool:
+        """Whether both sockets are subscribed and the marker can be sent."""
+        return self.old_acked and self.new_acked and not self.marker_sent
+
+    def _tick(self, payload):
+        tick = self._loads(payload)
+        return tick.get('first', False), tick.get('payload', None) == self.marker
+
+    def old_message(self, message_type, payload) -> bool:
+        """Returns whether the message of the old socket should be handled."""
+        if self.old_done or not message_type & _EVENT:
+            return False
+
+        if message_type == _TICK:
+            first, marker = self._tick(payload)
+            if first and not self.old_acked:
+                self.old_acked = True
+                return False
+            if marker:
+                self.old_done = True
+                return False
+
+        return True
+
+    def new_message(self, message_type, payload) -> bool:
+        """Returns whether the message of the new socket should be handled
+        now. Messages after the marker that arrive before the old socket
+        reached it are added to :attr:`held`."""
+        if not message_type & _EVENT:
+            return False
+
+        if not self._new_live:
+            if message_type == _TICK:
+                first, marker = self._tick(payload)
+                if first:
+                    self.new_acked = True
+                elif marker:
+                    self._new_live = True
+            return False
+
+        if not self.old_done:
+            self.held.append((message_type, payload))
+            return False
+
+        return True
@@ -0,0 +1,109 @@
+import time
+
+_EMPTY = object()
+
+
+def _attribute_key(path):
+    names = path.split('.')
+
+    def key(data):
+        for name in names:
+            data = getattr(data, name, None)
+            if data is None:
+                break
+        return data
+
+    return key
+
+
+class EventLimiter:
+    """Limits how often the events of a subscription reach the handler.
+
+    Events are grouped by the key ``coalesce_by`` returns for them: a dotted
+    attribute path of the event like ``"container_id"`` or a function of the
+    event. Without it, all the events of the subscription share one key. For
+    every key, only the latest event is kept:
+
+    * with ``debounce``, the latest event is delivered once no event came
+      for ``debounce`` milliseconds.
+    * with ``throttle``, the first event is delivered right away and then
+      at most one event, the latest, every ``throttle`` milliseconds.
+
+    Timers are started with ``call_later(delay, callback, *args)`` of the
+    connection. A debounce timer is not moved for every event of a storm.
+    It checks when it fires whether a later event pushed the deadline and
+    sleeps again for the rest.
+    """
+    def __init__(self, call_later, deliver, debounce=None, throttle=None, coalesce_by=None):
+        if debounce and throttle:
+            raise ValueError('debounce and throttle cannot be used together')
+        if (debounce or 0) < 0 or (throttle or 0) < 0:
+            raise ValueError('debounce and throttle must not be negative')
+
+        self._call_later = call_later
+        self._deliver = deliver
+        self._debounce = debounce / 1000 if debounce else None
+        self._throttle = throttle / 1000 if throttle else None
+
+        if coalesce_by is None:
+            self._key = lambda data: None
+        elif callable(coalesce_by):
+            self._key = coalesce_by
+        else:
+            self._key = _attribute_key(coalesce_by)
+
+        # key -> [event, data, due] for debounce and [event, data] for
+        # throttle, where data is _EMPTY when no event is waiting
+        self._pending = {}
+        self._closed = False
+
+    def push(self, event, data):
+        key = self._key(data)
+        state = self._pending.get(key)
+
+        if self._debounce:
+            due = time.monotonic() + self._debounce
+            if state is None:
+                self._pending[key] = [event, data, due]
+                self._call_later(self._debounce, self._debounce_due, key)
+            else:
+                state[0], state[1], state[2] = event, data, due
+        elif state is None:
+            # the first event of a throttle window goes out right away
+            self._pending[key] = [event, _EMPTY]
+            self._call_later(self._throttle, self._throttle_due, key)
+            self._deliver(event, data)
+        else:
+            state[0], state[1] = event, data
+
+    def _debounce_due(self, key):
+        if self._closed:
+            return
+
+        state = self._pending[key]
+        remaining = state[2] - time.monotonic()
+        if remaining > 0:
+            self._call_later(remaining, self._debounce_due, key)
+            return
+
+        del self._pending[key]
+        self._deliver(state[0], state[1])
+
+    def _throttle_due(self, key):
+        if self._closed:
+            return
+
+        state = self._pending[key]
+        if state[1] is _EMPTY:
+            del self._pending[key]
+            return
+
+        event, data = state
+        state[1] = _EMPTY
+        self._call_later(self._throttle, self._throttle_due, key)
+        self._deliver(event, data)
+
+    def close(self):
+        """Drops the waiting events. Timers that fire later do nothing."""
+        self._closed = True
+        self._pending.clear()
@@ -0,0 +1,244 @@
+import itertools
+
+# class -> the slots of its containers that describe them rather than their
+# place in the tree
+_property_slots_cache = {}
+
+# the properties the events keep up to date, compared by diff_trees()
+_COMPARED = ('type', 'name', 'num', 'focused', 'focus', 'marks', 'urgent', 'fullscreen_mode',
+             'floating', 'window', 'window_class', 'window_instance', 'window_role',
+             'window_title', 'app_id', 'pid')
+
+_MISSING = object()
+
+
+def _property_slots(cls):
+    slots = _property_slots_cache.get(cls)
+
+    if slots is None:
+        skipped = ('_conn', 'parent', 'nodes', 'floating_nodes', '_lazy', '_index', '__dict__',
+                   '__weakref__')
+        slots = _property_slots_cache[cls] = [(name, vars(klass)[name])
+                                              for klass in cls.__mro__
+                                              for name in vars(klass).get('__slots__', ())
+                                              if name not in skipped]
+
+    return slots
+
+
+class TreeMirror:
+    """Applies window and workspace events to a tree gotten from
+    ``GET_TREE`` so it keeps matching the layout of i3.
+
+    The events that can be applied change the tree in place. For the others,
+    like ``window::new`` whose event does not tell where the window was put,
+    :func:`apply` returns ``False`` and the tree must be gotten again.
+
+    The structure, the focus and the properties of the containers are kept
+    up to date. The geometry and the layout of containers that were not in
+    an event may be out of date.
+    """
+    def __init__(self, root):
+        self.root = root
+        self._by_id = {}
+        self._focused = None
+        self._add(root)
+
+    def _add(self, con):
+        self._by_id[con.id] = con
+        if con.focused:
+            self._set_focused(con)
+        for c in con:
+            self._by_id[c.id] = c
+            if c.focused:
+                self._set_focused(c)
+
+    def _set_focused(self, con):
+        if self._focused is not None and self._focused is not con:
+            self._focused.focused = False
+        self._focused = con
+
+    def _changed(self):
+        # the find_* index of the root is out of date
+        try:
+            del self.root._index
+        except AttributeError:
+            pass
+
+    def _build(self, data, parent):
+        return self.root.__class__(data, parent, self.root._conn)
+
+    def _update(self, con, data):
+        # copies the properties of the container in the event, keeping its
+        # place in the tree
+        new = self._build(data, None)
+
+        for name, slot in _property_slots(self.root.__class__):
+            value = _MISSING
+            try:
+                value = slot.__get__(new)
+            except AttributeError:
+                pass
+
+            if value is not _MISSING:
+                slot.__set__(con, value)
+            else:
+                try:
+                    slot.__delete__(con)
+                except AttributeError:
+                    pass
+
+        if con.marks:
+            # marks are unique, a mark set on this container left the others
+            for other in self._by_id.values():
+                if other is not con and other.marks:
+                    other.marks = [m for m in other.marks if m not in con.marks]
+
+        if con.focused:
+            self._set_focused(con)
+        elif self._focused is con:
+            self._focused = None
+
+    def _remove(self, con):
+        parent = con.parent
+        for c in itertools.chain((con, ), con):
+            self._by_id.pop(c.id, None)
+            if c is self._focused:
+                self._focused = None
+
+        if con in parent.nodes:
+            parent.nodes.remove(con)
+        else:
+            parent.floating_nodes.remove(con)
+        if con.id in parent.focus:
+            parent.focus.remove(con.id)
+
+    def _focus(self, con):
+        # i3 moves the container to the top of the focus stacks up to the root
+        while con.parent is not None:
+            focus = con.parent.focus
+            if con.id in focus:
+                focus.remove(con.id)
+            focus.insert(0, con.id)
+            con = con.parent
+
+    def _window_event(self, change, data):
+        con = self._by_id.get(data['id'])
+
+        if change == 'close':
+            if con is None:
+                return True
+
+            parent = con.parent
+            self._remove(con)
+
+            # i3 closes split and floating containers that were left empty
+            while (parent.parent is not None and parent.type in ('con', 'floating_con')
+                   and not parent.nodes and not parent.floating_nodes):
+                con, parent = parent, parent.parent
+                self._remove(con)
+
+            # and may flatten a split container that was left with one child
+            return not (parent.type == 'con' and len(parent.nodes) == 1)
+
+        if con is None or change not in ('focus', 'title', 'mark', 'urgent', 'fullscreen_mode'):
+            # new, move, floating and the other changes move containers to
+            # places the event does not tell
+            return False
+
+        self._update(con, data)
+
+        if change == 'focus':
+            self._focus(con)
+            con.focused = True
+            self._set_focused(con)
+
+        return True
+
+    def _replace(self, data):
+        # replaces the workspace with its full dump from the event
+        old = self._by_id.get(data['id'])
+        if old is None:
+            return False
+
+        parent = old.parent
+        new = self._build(data, parent)
+        siblings = parent.nodes if old in parent.nodes else parent.floating_nodes
+        siblings[siblings.index(old)] = new
+
+        for c in itertools.chain((old, ), old):
+            if self._by_id.get(c.id) is c:
+                del self._by_id[c.id]
+            if c is self._focused:
+                self._focused = None
+        self._add(new)
+
+        return True
+
+    def _workspace_event(self, change, data):
+        current = data.get('current')
+
+        if change == 'empty':
+            con = self._by_id.get(current['id']) if current else None
+            if con is not None:
+                self._remove(con)
+            return True
+
+        if change not in ('focus', 'urgent') or not current:
+            # init, rename, move, reload and restored change the order or
+            # the place of workspaces
+            return False
+
+        if change == 'focus' and data.get('old'):
+            # the old workspace may be gone already, an empty event follows
+            self._replace(data['old'])
+
+        if not self._replace(current):
+            return False
+
+        if change == 'focus':
+            self._focus(self._by_id[current['id']])
+
+        return True
+
+    def apply(self, event) -> bool:
+        """Applies a window or workspace event to the tree. Returns whether it
+        could be applied. If not, the tree is out of date."""
+        data = event.ipc_data
+
+        if 'container' in data:
+            applied = self._window_event(event.change, data['container'])
+        elif 'current' in data:
+            applied = self._workspace_event(event.change, data)
+        else:
+            return False
+
+        self._changed()
+        return applied
+
+
+def diff_trees(mirror, fresh) -> list:
+    """Compares the structure, the focus and the properties the events keep
+    up to date of two trees. Returns the differences, or an empty list if
+    they match."""
+    differences = []
+    pairs = [(mirror, fresh)]
+
+    while pairs:
+        a, b = pairs.pop()
+        where = '{} {}'.format(b.type, b.id if b.name is None else '{} "{}"'.format(b.id, b.name))
+
+        for name in _COMPARED:
+            value, expected = getattr(a, name), getattr(b, name)
+            if value != expected:
+                differences.append('{}: {} is {!r}, not {!r}'.format(where, name, value, expected))
+
+        for name in ('nodes', 'floating_nodes'):
+            ids = [c.id for c in getattr(a, name)]
+            expected = [c.id for c in getattr(b, name)]
+            if ids != expected:
+                differences.append('{}: {} are {}, not {}'.format(where, name, ids, expected))
+            else:
+                pairs.extend(zip(getattr(a, name), getattr(b, name)))
+
+    return differences
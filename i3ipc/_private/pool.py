@@ -0,0 +1,160 @@
+import select
+import socket
+import time
+import logging
+from collections import deque
+from threading import Condition
+
+logger = logging.getLogger(__name__)
+
+
+class PoolStats:
+    """A snapshot of the usage of a :class:`SocketPool`.
+
+    :ivar size: The maximum number of sockets in the pool.
+    :vartype size: int
+    :ivar open: The number of sockets currently open.
+    :vartype open: int
+    :ivar in_use: The number of sockets currently checked out.
+    :vartype in_use: int
+    :ivar checkouts: The number of times a socket was checked out.
+    :vartype checkouts: int
+    :ivar waits: The number of checkouts that had to wait for a socket.
+    :vartype waits: int
+    :ivar wait_time: The total time in seconds spent waiting for a socket.
+    :vartype wait_time: float
+    :ivar max_wait_time: The longest time in seconds spent waiting for a
+        socket.
+    :vartype max_wait_time: float
+    :ivar reconnects: The number of broken sockets that were replaced.
+    :vartype reconnects: int
+    """
+    def __init__(self, size, open, in_use, checkouts, waits, wait_time, max_wait_time,
+                 reconnects):
+        self.size = size
+        self.open = open
+        self.in_use = in_use
+        self.checkouts = checkouts
+        self.waits = waits
+        self.wait_time = wait_time
+        self.max_wait_time = max_wait_time
+        self.reconnects = reconnects
+
+
+class SocketPool:
+    """A thread safe pool of sockets connected to the ipc.
+
+    Sockets are opened on demand up to ``size``. A socket that is checked out
+    belongs to one thread until it is checked in again. Idle sockets are
+    checked for EOF or unexpected data before they are handed out and are
+    replaced by a fresh connection if they are broken.
+    """
+    def __init__(self, socket_path, size=1):
+        if size < 1:
+            raise ValueError('the pool size must be at least 1')
+
+        self._socket_path = socket_path
+        self._size = size
+        self._idle = deque()
+        self._open = 0
+        self._cond = Condition()
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
+        self._reconnects = 0
+
+        # connect one socket right away so connection errors show up early
+        self._idle.append(self._connect())
+        self._open = 1
+
+    @property
+    def size(self):
+        return self._size
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self._socket_path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def _is_healthy(self, sock):
+        # nothing should be readable on an idle socket. If it is, the ipc
+        # closed the socket or the framing is out of sync.
+        poller = select.poll()
+        poller.register(sock, select.POLLIN)
+        try:
+            return not poller.poll(0)
+        except OSError:
+            return False
+
+    def checkout(self, timeout=None):
+        """Takes a socket from the pool, waiting for one to be checked in if
+        all the sockets are in use. Raises ``TimeoutError`` if none is
+        available within ``timeout`` seconds."""
+        with self._cond:
+            self._checkouts += 1
+
+            if not self._idle and self._open >= self._size:
+                self._waits += 1
+                start = time.perf_counter()
+                available = self._cond.wait_for(
+                    lambda: self._idle or self._open < self._size, timeout)
+                waited = time.perf_counter() - start
+                self._wait_time += waited
+                self._max_wait_time = max(self._max_wait_time, waited)
+                if not available:
+                    raise TimeoutError('no socket was available in {} seconds'.format(timeout))
+
+            if self._idle:
+                sock = self._idle.pop()
+                if self._is_healthy(sock):
+                    return sock
+                logger.info('replacing a broken socket in the pool')
+                sock.close()
+                self._reconnects += 1
+            else:
+                self._open += 1
+
+        try:
+            return self._connect()
+        except BaseException:
+            self._release_slot()
+            raise
+
+    def checkin(self, sock):
+        """Returns a socket to the pool after a complete request."""
+        with self._cond:
+            self._idle.append(sock)
+            self._cond.notify()
+
+    def discard(self, sock):
+        """Closes a socket that is broken or in an unknown state instead of
+        returning it to the pool."""
+        sock.close()
+        self._release_slot()
+
+    def _release_slot(self):
+        with self._cond:
+            self._open -= 1
+            self._cond.notify()
+
+    def stats(self) -> PoolStats:
+        with self._cond:
+            return PoolStats(size=self._size,
+                             open=self._open,
+                             in_use=self._open - len(self._idle),
+                             checkouts=self._checkouts,
+                             waits=self._waits,
+                             wait_time=self._wait_time,
+                             max_wait_time=self._max_wait_time,
+                             reconnects=self._reconnects)
+
+    def close(self):
+        with self._cond:
+            while self._idle:
+                self._idle.pop().close()
+                self._open -= 1
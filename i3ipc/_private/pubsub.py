@@ -1,19 +1,122 @@
+import re
+
+from .limiter import EventLimiter
+
+# the change of an event, skipping any escaped quotes in the value
+_change_re = re.compile(rb'"change"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+def peek_change(payload):
+    """Finds the ``change`` of an event in its raw JSON payload without
+    decoding it. Returns ``None`` if the payload has no plain ``change``
+    string, in which case it must be decoded to tell.
+    """
+    match = _change_re.search(payload)
+    if match is None:
+        return None
+    change = match.group(1)
+    if b'\\' in change:
+        return None
+    return change.decode('utf-8', 'replace')
+
+
 class PubSub(object):
     def __init__(self, conn):
         self.conn = conn
         self._subscriptions = []
+        # event -> the details that have handlers, or None if a handler
+        # takes every detail
+        self._details = {}
+        # event -> the number of handlers subscribed to it
+        self._refcounts = {}
 
-    def subscribe(self, detailed_event, handler):
+    def subscribe(self,
+                  detailed_event,
+                  handler,
+                  debounce=None,
+                  throttle=None,
+                  coalesce_by=None,
+                  inline=False):
         event = detailed_event.replace('-', '_')
         detail = ''
 
         if detailed_event.count('::') > 0:
             [event, detail] = detailed_event.split('::')
 
-        self._subscriptions.append({'event': event, 'detail': detail, 'handler': handler})
+        limiter = None
+        if debounce or throttle:
+            limiter = EventLimiter(self.conn._call_later,
+                                   lambda event, data: self.queue_handler(handler, event, data),
+                                   debounce=debounce,
+                                   throttle=throttle,
+                                   coalesce_by=coalesce_by)
+
+        self._subscriptions.append({
+            'event': event,
+            'detail': detail,
+            'handler': handler,
+            'limiter': limiter,
+            'inline': inline
+        })
+        self._refcounts[event] = self._refcounts.get(event, 0) + 1
+        self._details.clear()
 
     def unsubscribe(self, handler):
+        """Removes the handler from every event. Returns the events that have
+        no handler left."""
+        unused = set()
+
+        for s in self._subscriptions:
+            if s['handler'] != handler:
+                continue
+            if s['limiter'] is not None:
+                s['limiter'].close()
+            event = s['event']
+            self._refcounts[event] -= 1
+            if not self._refcounts[event]:
+                del self._refcounts[event]
+                unused.add(event)
+
         self._subscriptions = list(filter(lambda s: s['handler'] != handler, self._subscriptions))
+        self._details.clear()
+        return unused
+
+    def events(self):
+        """The events that have at least one handler."""
+        return set(self._refcounts)
+
+    def _wanted_details(self, event):
+        if event in self._details:
+            return self._details[event]
+
+        details = set()
+        for s in self._subscriptions:
+            if s['event'] == event:
+                if not s['detail']:
+                    details = None
+                    break
+                details.add(s['detail'])
+
+        self._details[event] = details
+        return details
+
+    def wants(self, event, payload):
+        """Whether any handler would be called for the event with the raw
+        ``payload``. Only the ``change`` is looked up in the payload, so events
+        nobody handles can be dropped before they are decoded."""
+        details = self._wanted_details(event)
+        if details is None:
+            return True
+        if not details:
+            return False
+        change = peek_change(payload)
+        return change is None or change in details
+
+    def queue_handler(self, handler, event, data=None):
+        if data:
+            handler(self.conn, data)
+        else:
+            handler(self.conn)
 
     def emit(self, event, data):
         detail = ''
@@ -24,7 +127,11 @@ class PubSub(object):
         for s in self._subscriptions:
             if s['event'] == event:
                 if not s['detail'] or s['detail'] == detail:
-                    if data:
-                        s['handler'](self.conn, data)
+                    if s['limiter'] is not None and data:
+                        s['limiter'].push(event, data)
+                    elif s['inline']:
+                        # called right away and in order, even when the
+                        # connection runs handlers elsewhere
+                        PubSub.queue_handler(self, s['handler'], event, data)
                     else:
-                        s['handler'](self.conn)
+                        self.queue_handler(s['handler'], event, data)
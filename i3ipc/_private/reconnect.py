@@ -0,0 +1,226 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import random
+import select
+import time
+import logging
+from threading import Lock
+
+from .discovery import is_live_socket
+
+logger = logging.getLogger(__name__)
+
+_IN_ATTRIB = 0x00000004
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+
+_libc = None
+
+
+def _load_libc():
+    global _libc
+    if _libc is None:
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            libc.inotify_init1
+            libc.inotify_add_watch
+        except (OSError, AttributeError):
+            libc = False
+        _libc = libc
+    return _libc
+
+
+class DirWatcher:
+    """Wakes up when an entry is created in a directory, with inotify.
+
+    :meth:`create` returns ``None`` where inotify is not available.
+    """
+    def __init__(self, fd):
+        self.fd = fd
+
+    @staticmethod
+    def create(directory):
+        libc = _load_libc()
+        if not libc:
+            return None
+
+        fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if fd < 0:
+            return None
+
+        mask = _IN_CREATE | _IN_MOVED_TO | _IN_ATTRIB
+        if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+            logger.info('could not watch %s: %s', directory, os.strerror(ctypes.get_errno()))
+            os.close(fd)
+            return None
+
+        return DirWatcher(fd)
+
+    def wait(self, timeout):
+        """Waits up to ``timeout`` seconds for a change in the directory.
+        Returns whether there was one."""
+        try:
+            select.select([self.fd], [], [], timeout)
+        except InterruptedError:
+            pass
+        return self.drain()
+
+    def drain(self):
+        changed = False
+        try:
+            while os.read(self.fd, 4096):
+                changed = True
+        except OSError as e:
+            if e.errno != errno.EAGAIN:
+                raise
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class ReconnectStats:
+    """A snapshot of the reconnects of a connection.
+
+    :ivar reconnects: The number of times the connection was established
+        again after it was lost.
+    :vartype reconnects: int
+    :ivar failures: The number of reconnects that gave up at the deadline.
+    :vartype failures: int
+    :ivar last_latency: The time in seconds from losing the connection to
+        being connected again for the last reconnect.
+    :vartype last_latency: float
+    :ivar max_latency: The longest reconnect latency in seconds.
+    :vartype max_latency: float
+    :ivar total_latency: The sum of all the reconnect latencies in seconds.
+    :vartype total_latency: float
+    """
+    def __init__(self, reconnects, failures, last_latency, max_latency, total_latency):
+        self.reconnects = reconnects
+        self.failures = failures
+        self.last_latency = last_latency
+        self.max_latency = max_latency
+        self.total_latency = total_latency
+
+
+class Reconnector:
+    """Waits for the ipc socket to accept connections again after the
+    connection was lost (i3 restarts, crashes or reloads in place).
+
+    The socket is tried right away and then after exponentially growing
+    delays with jitter, from ``initial_delay`` up to ``max_delay``. Where
+    inotify is available, a change in the directory of the socket ends the
+    delay early and starts the backoff over, so the socket is usually picked
+    up as soon as it is created and listening. Waiting gives up after
+    ``deadline`` seconds.
+    """
+    def __init__(self, socket_path, deadline=10.0, initial_delay=0.002, max_delay=0.5):
+        self.socket_path = socket_path
+        self.deadline = deadline
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self._lock = Lock()
+        self._reconnects = 0
+        self._failures = 0
+        self._last_latency = 0.0
+        self._max_latency = 0.0
+        self._total_latency = 0.0
+
+    def delays(self):
+        """Yields the delays between tries. ``send()`` a true value to start
+        over from the initial delay."""
+        delay = self.initial_delay
+        while True:
+            reset = yield delay * random.uniform(0.5, 1.0)
+            delay = self.initial_delay if reset else min(delay * 2, self.max_delay)
+
+    def watch(self):
+        """Returns a :class:`DirWatcher` for the directory of the socket or
+        ``None``."""
+        return DirWatcher.create(os.path.dirname(self.socket_path) or '.')
+
+    def is_ready(self):
+        return is_live_socket(self.socket_path)
+
+    def wait(self, deadline=None):
+        """Blocks until the socket accepts connections. Returns whether it
+        did before the deadline."""
+        deadline = self.deadline if deadline is None else deadline
+        end = time.monotonic() + deadline
+        watcher = self.watch()
+        delays = self.delays()
+        delay = next(delays)
+        try:
+            while not self.is_ready():
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    return False
+                if watcher is not None:
+                    changed = watcher.wait(min(delay, remaining))
+                else:
+                    changed = False
+                    time.sleep(min(delay, remaining))
+                delay = delays.send(changed)
+            return True
+        finally:
+            if watcher is not None:
+                watcher.close()
+
+    async def wait_async(self, loop, deadline=None):
+        """Like :meth:`wait` without blocking the event loop."""
+        # asyncio is imported here so the sync connection does not load it
+        import asyncio
+        deadline = self.deadline if deadline is None else deadline
+        end = time.monotonic() + deadline
+        watcher = self.watch()
+        delays = self.delays()
+        delay = next(delays)
+        try:
+            while not self.is_ready():
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    return False
+                if watcher is None:
+                    await asyncio.sleep(min(delay, remaining))
+                    delay = next(delays)
+                    continue
+
+                readable = loop.create_future()
+                loop.add_reader(watcher.fd, lambda: readable.done() or readable.set_result(None))
+                try:
+                    await asyncio.wait_for(readable, min(delay, remaining))
+                except asyncio.TimeoutError:
+                    pass
+                finally:
+                    loop.remove_reader(watcher.fd)
+                delay = delays.send(watcher.drain())
+            return True
+        finally:
+            if watcher is not None:
+                watcher.close()
+
+    def record(self, latency):
+        """Records a successful reconnect that took ``latency`` seconds."""
+        logger.info('reconnected to %s in %.3f s', self.socket_path, latency)
+        with self._lock:
+            self._reconnects += 1
+            self._last_latency = latency
+            self._max_latency = max(self._max_latency, latency)
+            self._total_latency += latency
+
+    def record_failure(self):
+        logger.info('could not reconnect to %s', self.socket_path)
+        with self._lock:
+            self._failures += 1
+
+    def stats(self) -> ReconnectStats:
+        with self._lock:
+            return ReconnectStats(reconnects=self._reconnects,
+                                  failures=self._failures,
+                                  last_latency=self._last_latency,
+                                  max_latency=self._max_latency,
+                                  total_latency=self._total_latency)
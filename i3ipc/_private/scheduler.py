@@ -0,0 +1,181 @@
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ('block', 'drop_oldest', 'coalesce')
+
+
+class SchedulerStats:
+    """A snapshot of the event handler scheduler of an aio ``Connection``.
+
+    :ivar queued: The number of handler calls waiting to run.
+    :vartype queued: int
+    :ivar max_queued: The largest number of handler calls that were waiting
+        at the same time.
+    :vartype max_queued: int
+    :ivar running: The number of coroutine handlers currently running.
+    :vartype running: int
+    :ivar submitted: The number of handler calls submitted.
+    :vartype submitted: int
+    :ivar dropped: The number of handler calls dropped because the queue was
+        full.
+    :vartype dropped: int
+    :ivar coalesced: The number of handler calls replaced by a newer call
+        with the same key.
+    :vartype coalesced: int
+    :ivar pauses: The number of times reading events was paused because the
+        queue was full.
+    :vartype pauses: int
+    """
+    def __init__(self, queued, max_queued, running, submitted, dropped, coalesced, pauses):
+        self.queued = queued
+        self.max_queued = max_queued
+        self.running = running
+        self.submitted = submitted
+        self.dropped = dropped
+        self.coalesced = coalesced
+        self.pauses = pauses
+
+
+class _Job:
+    __slots__ = ('handler', 'args', 'key')
+
+    def __init__(self, handler, args, key):
+        self.handler = handler
+        self.args = args
+        self.key = key
+
+
+class HandlerScheduler:
+    """Runs event handlers on the event loop with at most ``concurrency``
+    coroutine handlers running at the same time. Handler calls wait in a FIFO
+    queue of ``queue_size`` calls. Plain functions run in queue order without
+    a task of their own.
+
+    When the queue is full, ``overflow`` decides what happens:
+
+    * ``"block"`` - ``pause()`` is called to stop reading events until the
+      queue is half empty and ``resume()`` is called. Calls that arrive in
+      the meantime (from data that was already read) are still queued.
+    * ``"drop_oldest"`` - the oldest waiting call is dropped.
+    * ``"coalesce"`` - a waiting call with the same key is replaced by the
+      new one and keeps its place in the queue. If there is none, the oldest
+      waiting call is dropped.
+    """
+    def __init__(self,
+                 on_error,
+                 concurrency=64,
+                 queue_size=1024,
+                 overflow='block',
+                 pause=None,
+                 resume=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError('overflow must be one of {}, got {!r}'.format(
+                ', '.join(OVERFLOW_POLICIES), overflow))
+        if concurrency is not None and concurrency < 1:
+            raise ValueError('the concurrency must be at least 1')
+        if queue_size < 1:
+            raise ValueError('the queue size must be at least 1')
+
+        self._on_error = on_error
+        self._concurrency = concurrency
+        self._queue_size = queue_size
+        self._overflow = overflow
+        self._pause = pause
+        self._resume = resume
+
+        self._queue = deque()
+        self._keyed = {}
+        self._tasks = set()
+        self._drain_handle = None
+        self._paused = False
+
+        self._max_queued = 0
+        self._submitted = 0
+        self._dropped = 0
+        self._coalesced = 0
+        self._pauses = 0
+
+    def submit(self, handler, args, key=None):
+        """Queues a call of ``handler(*args)``. ``key`` identifies calls that
+        may replace each other with the ``"coalesce"`` policy."""
+        self._submitted += 1
+
+        if self._overflow == 'coalesce' and key is not None:
+            job = self._keyed.get(key)
+            if job is not None:
+                job.handler = handler
+                job.args = args
+                self._coalesced += 1
+                return
+
+        if len(self._queue) >= self._queue_size:
+            if self._overflow == 'block':
+                if not self._paused and self._pause is not None:
+                    logger.info('handler queue is full, pausing events')
+                    self._paused = True
+                    self._pauses += 1
+                    self._pause()
+            else:
+                self._forget(self._queue.popleft())
+                self._dropped += 1
+
+        job = _Job(handler, args, key)
+        self._queue.append(job)
+        if self._overflow == 'coalesce' and key is not None:
+            self._keyed[key] = job
+        self._max_queued = max(self._max_queued, len(self._queue))
+
+        if self._drain_handle is None:
+            import asyncio
+            self._drain_handle = asyncio.get_event_loop().call_soon(self._drain)
+
+    def _forget(self, job):
+        if job.key is not None and self._keyed.get(job.key) is job:
+            del self._keyed[job.key]
+
+    def _drain(self):
+        # asyncio is imported here so the sync connection does not load it
+        import asyncio
+        self._drain_handle = None
+
+        while self._queue and (self._concurrency is None
+                               or len(self._tasks) < self._concurrency):
+            job = self._queue.popleft()
+            self._forget(job)
+
+            try:
+                if asyncio.iscoroutinefunction(job.handler):
+                    task = asyncio.ensure_future(job.handler(*job.args))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._done)
+                else:
+                    job.handler(*job.args)
+            except Exception as e:
+                self._on_error(e)
+
+        if self._paused and len(self._queue) <= self._queue_size // 2:
+            logger.info('handler queue drained, resuming events')
+            self._paused = False
+            if self._resume is not None:
+                self._resume()
+
+    def _done(self, task):
+        self._tasks.discard(task)
+
+        if not task.cancelled() and task.exception() is not None:
+            self._on_error(task.exception())
+
+        if self._queue and self._drain_handle is None:
+            import asyncio
+            self._drain_handle = asyncio.get_event_loop().call_soon(self._drain)
+
+    def stats(self) -> SchedulerStats:
+        return SchedulerStats(queued=len(self._queue),
+                              max_queued=self._max_queued,
+                              running=len(self._tasks),
+                              submitted=self._submitted,
+                              dropped=self._dropped,
+                              coalesced=self._coalesced,
+                              pauses=self._pauses)
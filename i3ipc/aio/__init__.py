@@ -1 +1,2 @@
 from .connection import Connection, Con
+from .treecache import TreeCache
@@ -0,0 +1,488 @@
+"""A local ipc broker that shares one connection to i3 between many clients.
+
+Run it with ``python -m i3ipc.aio.broker`` and point the clients at its
+socket with ``I3SOCK`` or the ``socket_path`` argument of the
+``Connection``.
+"""
+
+from .._private import MessageType, EventType, FrameParser, Reconnector
+from .connection import _IpcProtocol, _find_socket_path, ensure_future
+import argparse
+import json
+import os
+from typing import Optional
+import struct
+import time
+import logging
+
+import asyncio
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b'i3-ipc'
+
+# events that may come with a change of the layout tree. A cached tree is
+# dropped when one of them arrives or when a command is run. Bindings are
+# included because the commands they run, like resize or layout, change the
+# tree without a window or workspace event.
+_TREE_EVENTS = frozenset(
+    e.value.bit_length() - 1 for e in (EventType.WINDOW, EventType.WORKSPACE, EventType.OUTPUT,
+                                       EventType.SHUTDOWN, EventType.BINDING))
+
+# events that never change the layout tree
+_TREE_NEUTRAL_EVENTS = frozenset(
+    e.value.bit_length() - 1 for e in (EventType.MODE, EventType.BARCONFIG_UPDATE,
+                                       EventType.TICK))
+
+_TICK = EventType.TICK.value.bit_length() - 1
+
+_SUBSCRIBE_SUCCESS = b'{"success":true}'
+_SUBSCRIBE_FAILURE = b'{"success":false}'
+_FIRST_TICK = b'{"first":true,"payload":""}'
+
+
+def _frame(message_type: int, payload: bytes) -> bytes:
+    return b''.join((_MAGIC, struct.pack('=II', len(payload), message_type), payload))
+
+
+def _event_index(name: str) -> int:
+    return EventType.from_string(name).value.bit_length() - 1
+
+
+def default_socket_path() -> Optional[str]:
+    """The socket path the broker listens on when none is given:
+    ``i3ipc-broker.sock`` in ``$XDG_RUNTIME_DIR``."""
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if not runtime_dir:
+        return None
+    return os.path.join(runtime_dir, 'i3ipc-broker.sock')
+
+
+class _Reply:
+    __slots__ = ('frame', 'on_sent')
+
+    def __init__(self):
+        self.frame = None
+        self.on_sent = None
+
+
+class _ClientProtocol(asyncio.Protocol):
+    """A client of the broker. Replies are written in the order the requests
+    came in, whether they were forwarded to i3 or answered by the broker."""
+    def __init__(self, broker):
+        self._broker = broker
+        self._parser = FrameParser()
+        self._replies = deque()
+        self.events = frozenset()
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self._broker._clients.add(self)
+
+    def connection_lost(self, exc):
+        self._broker._clients.discard(self)
+        self.transport = None
+
+    def data_received(self, data):
+        self._parser.feed(data)
+        try:
+            for message_type, payload in self._parser.frames():
+                reply = _Reply()
+                self._replies.append(reply)
+                self._broker._handle_request(self, reply, message_type, payload)
+        except ValueError as e:
+            logger.info('closing client: %s', e)
+            self.transport.close()
+
+    def reply(self, reply, message_type, payload):
+        reply.frame = _frame(message_type, payload)
+        while self._replies and self._replies[0].frame is not None:
+            reply = self._replies.popleft()
+            if self.transport is None:
+                continue
+            self.transport.write(reply.frame)
+            if reply.on_sent is not None:
+                reply.on_sent()
+
+
+class Broker:
+    """A daemon that holds one subscription and one command connection to i3
+    and serves any number of clients on a local socket with the same ipc
+    protocol.
+
+    Events are encoded once and the same bytes are written to every client
+    subscribed to them. ``SUBSCRIBE`` requests are answered by the broker,
+    which subscribes upstream only to the events some client wants. All the
+    other requests are forwarded to i3 on the shared command connection.
+
+    With ``cache_tree`` set, the ``GET_TREE`` reply is kept and served to
+    clients until a command is run or an event arrives that may come with a
+    layout change. Only mode, bar config and tick events keep the cache.
+    Commands sent to i3 without the broker, like ``i3-msg layout tabbed`` or
+    ``split v``, can change the layout without an event, so the cached reply
+    is also dropped after ``tree_max_age`` seconds.
+
+    When i3 restarts or reloads, the broker keeps its socket and its clients,
+    connects to i3 again and subscribes to the same events. Clients waiting
+    for a reply when the connection was lost are disconnected, like i3 does
+    with its own clients. Requests that come in while the broker reconnects
+    are sent once it is connected again.
+
+    :param socket_path: The path of the socket to listen on. The default is
+        ``i3ipc-broker.sock`` in ``$XDG_RUNTIME_DIR``.
+    :type socket_path: str
+    :param upstream_socket_path: The path of the i3 ipc socket. If not given,
+        it is found the same way as for the ``Connection``.
+    :type upstream_socket_path: str
+    :param cache_tree: Whether to cache the ``GET_TREE`` reply.
+    :type cache_tree: bool
+    :param tree_max_age: How long in seconds a cached ``GET_TREE`` reply is
+        served, or ``None`` to serve it until it is dropped for a command or
+        an event.
+    :type tree_max_age: float
+    :param reconnect_deadline: How long in seconds to wait for the i3 socket
+        to come back when the connection to i3 is lost.
+    :type reconnect_deadline: float
+    """
+    def __init__(self,
+                 socket_path: Optional[str] = None,
+                 upstream_socket_path: Optional[str] = None,
+                 cache_tree: bool = False,
+                 tree_max_age: Optional[float] = 1.0,
+                 reconnect_deadline: float = 10.0):
+        self._socket_path = socket_path or default_socket_path()
+        self._upstream_socket_path = upstream_socket_path
+        self._cache_tree = cache_tree
+        self._tree_max_age = tree_max_age
+        self._reconnector = Reconnector(upstream_socket_path, reconnect_deadline)
+        self._reconnect_task = None
+        self._clients = set()
+        self._server = None
+        self._closed = None
+
+        self._cmd_protocol = None
+        self._cmd_pending = deque()
+        # the requests that came in while reconnecting
+        self._cmd_backlog = []
+        self._sub_protocol = None
+        self._sub_pending = deque()
+        self._upstream_events = set()
+
+        self._tree = None
+        self._tree_time = 0.0
+        self._tree_generation = 0
+
+        self.tree_hits = 0
+        self.tree_misses = 0
+
+    @property
+    def socket_path(self) -> str:
+        """The path of the socket the broker listens on.
+
+        :rtype: str
+        """
+        return self._socket_path
+
+    async def start(self) -> 'Broker':
+        """Connects to i3 and starts listening for clients.
+
+        :returns: The broker.
+        :rtype: :class:`Broker`
+        """
+        if not self._socket_path:
+            raise Exception('No socket path to listen on (XDG_RUNTIME_DIR is not set)')
+
+        if not self._upstream_socket_path:
+            self._upstream_socket_path = await _find_socket_path()
+        if not self._upstream_socket_path:
+            raise Exception('Failed to retrieve the i3 or sway IPC socket path')
+
+        self._reconnector.socket_path = self._upstream_socket_path
+        loop = asyncio.get_event_loop()
+        self._closed = loop.create_future()
+
+        await self._connect_upstream()
+
+        if self._cache_tree:
+            # the cache is only safe while we hear about every layout change
+            self._subscribe_upstream(_TREE_EVENTS, lambda success: None)
+
+        if os.path.exists(self._socket_path):
+            os.unlink(self._socket_path)
+        self._server = await loop.create_unix_server(lambda: _ClientProtocol(self),
+                                                     self._socket_path)
+        logger.info('broker for %s listening on %s', self._upstream_socket_path,
+                    self._socket_path)
+        return self
+
+    async def _connect_upstream(self):
+        loop = asyncio.get_event_loop()
+        _, cmd_protocol = await loop.create_unix_connection(
+            lambda: _IpcProtocol(self._on_cmd_message, self._on_upstream_lost),
+            self._upstream_socket_path)
+        try:
+            _, sub_protocol = await loop.create_unix_connection(
+                lambda: _IpcProtocol(self._on_sub_message, self._on_upstream_lost),
+                self._upstream_socket_path)
+        except Exception:
+            cmd_protocol.transport.close()
+            raise
+        self._cmd_protocol = cmd_protocol
+        self._sub_protocol = sub_protocol
+
+    async def serve_forever(self):
+        """Serves clients until the connection to i3 is lost for good or the
+        broker is closed. Raises the connection error if there was one."""
+        await self._closed
+
+    def close(self, error: Optional[Exception] = None):
+        """Closes the connections to i3 and to all the clients and stops
+        listening."""
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+            try:
+                os.unlink(self._socket_path)
+            except OSError:
+                pass
+
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+
+        for client in list(self._clients):
+            client.transport.close()
+        self._clients.clear()
+
+        self._close_upstream()
+        self._cmd_backlog.clear()
+
+        if self._closed is not None and not self._closed.done():
+            if error is None:
+                self._closed.set_result(None)
+            else:
+                self._closed.set_exception(error)
+
+    def _close_upstream(self):
+        for protocol in (self._cmd_protocol, self._sub_protocol):
+            if protocol is not None and protocol.transport is not None:
+                protocol.transport.close()
+        self._cmd_protocol = None
+        self._sub_protocol = None
+
+        # the replies to the requests that were sent are lost. The clients
+        # waiting for them find out by losing their connection to the broker,
+        # like they would with i3.
+        while self._cmd_pending:
+            client, reply, request_type, generation = self._cmd_pending.popleft()
+            if client.transport is not None:
+                client.transport.close()
+
+        while self._sub_pending:
+            for callback in self._sub_pending.popleft():
+                callback(False)
+
+    def _on_upstream_lost(self, protocol, exc):
+        if protocol is not self._cmd_protocol and protocol is not self._sub_protocol:
+            return
+
+        logger.info('lost the connection to %s, reconnecting', self._upstream_socket_path)
+        self._close_upstream()
+        # events may be missed until the subscription is back
+        self._invalidate_tree()
+        self._reconnect_task = ensure_future(self._reconnect(exc))
+
+    async def _reconnect(self, error):
+        start = time.monotonic()
+
+        while True:
+            # the deadline counts from when the connection was lost
+            deadline = self._reconnector.deadline - (time.monotonic() - start)
+            if not await self._reconnector.wait_async(asyncio.get_event_loop(), deadline):
+                error = error or ConnectionRefusedError(
+                    'the ipc socket did not come back in {} seconds'.format(
+                        self._reconnector.deadline))
+                break
+            try:
+                await self._connect_upstream()
+                error = None
+                break
+            except OSError as e:
+                # the socket went away again
+                error = e
+
+        self._reconnect_task = None
+        if error is not None:
+            self._reconnector.record_failure()
+            self.close(error)
+            return
+
+        self._reconnector.record(time.monotonic() - start)
+
+        events, self._upstream_events = self._upstream_events, set()
+        if events:
+            self._subscribe_upstream(
+                events, lambda success: success or logger.warning(
+                    'could not subscribe to the events again after reconnecting'))
+
+        backlog, self._cmd_backlog = self._cmd_backlog, []
+        for frame in backlog:
+            self._cmd_protocol.transport.write(frame)
+
+    def _invalidate_tree(self):
+        self._tree = None
+        self._tree_generation += 1
+
+    def _handle_request(self, client, reply, message_type, payload):
+        if message_type == MessageType.SUBSCRIBE.value:
+            self._subscribe(client, reply, payload)
+            return
+
+        if message_type == MessageType.COMMAND.value:
+            self._invalidate_tree()
+        elif message_type == MessageType.GET_TREE.value and self._cache_tree:
+            if self._tree is not None and self._tree_max_age is not None and (
+                    time.monotonic() - self._tree_time > self._tree_max_age):
+                self._tree = None
+            if self._tree is not None:
+                self.tree_hits += 1
+                client.reply(reply, message_type, self._tree)
+                return
+            self.tree_misses += 1
+
+        if self._cmd_protocol is None:
+            if self._reconnect_task is None:
+                client.transport.close()
+                return
+            self._cmd_backlog.append(_frame(message_type, payload))
+        else:
+            self._cmd_protocol.transport.write(_frame(message_type, payload))
+
+        self._cmd_pending.append((client, reply, message_type, self._tree_generation))
+
+    def _on_cmd_message(self, message_type, payload):
+        client, reply, request_type, generation = self._cmd_pending.popleft()
+
+        if request_type == MessageType.COMMAND.value:
+            self._invalidate_tree()
+        elif (request_type == MessageType.GET_TREE.value and self._cache_tree
+              and generation == self._tree_generation):
+            self._tree = payload
+            self._tree_time = time.monotonic()
+
+        client.reply(reply, message_type, payload)
+
+    def _subscribe(self, client, reply, payload):
+        try:
+            events = frozenset(_event_index(name) for name in json.loads(payload))
+        except (ValueError, TypeError) as e:
+            logger.info('bad subscription from client: %s', e)
+            client.reply(reply, MessageType.SUBSCRIBE.value, _SUBSCRIBE_FAILURE)
+            return
+
+        def on_sent():
+            client.events = client.events | events
+            if _TICK in events:
+                # i3 greets tick subscribers with a first tick
+                client.transport.write(_frame(0x80000000 | _TICK, _FIRST_TICK))
+
+        reply.on_sent = on_sent
+
+        def on_upstream_reply(success):
+            client.reply(reply, MessageType.SUBSCRIBE.value,
+                         _SUBSCRIBE_SUCCESS if success else _SUBSCRIBE_FAILURE)
+
+        self._subscribe_upstream(events, on_upstream_reply)
+
+    def _subscribe_upstream(self, events, callback):
+        # every entry of _sub_pending is the list of callbacks to call with
+        # the result of one upstream subscription
+        missing = set(events) - self._upstream_events
+        if not missing:
+            if self._sub_pending:
+                # the events may be in a subscription that is not active yet
+                self._sub_pending[-1].append(callback)
+            else:
+                callback(True)
+            return
+
+        if self._sub_protocol is None:
+            if self._reconnect_task is None:
+                callback(False)
+            else:
+                # subscribed with the others once the broker is connected
+                self._upstream_events |= missing
+                callback(True)
+            return
+
+        self._upstream_events |= missing
+        names = [EventType(1 << i).to_string() for i in sorted(missing)]
+        self._sub_pending.append([callback])
+        self._sub_protocol.transport.write(
+            _frame(MessageType.SUBSCRIBE.value, json.dumps(names).encode()))
+
+    def _on_sub_message(self, message_type, payload):
+        if not message_type & 0x80000000:
+            success = json.loads(payload).get('success', False)
+            for callback in self._sub_pending.popleft():
+                callback(success)
+            return
+
+        index = message_type & 0x7f
+        if index not in _TREE_NEUTRAL_EVENTS:
+            self._invalidate_tree()
+
+        if index == _TICK and json.loads(payload).get('first'):
+            # the broker greeted its clients with their own first tick when
+            # they subscribed
+            return
+
+        frame = None
+        for client in self._clients:
+            if index in client.events:
+                if frame is None:
+                    frame = _frame(message_type, payload)
+                client.transport.write(frame)
+
+
+async def _run(args):
+    broker = await Broker(socket_path=args.socket_path,
+                          upstream_socket_path=args.upstream,
+                          cache_tree=args.cache_tree,
+                          tree_max_age=args.tree_max_age or None).start()
+    try:
+        await broker.serve_forever()
+    finally:
+        broker.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Share one i3 ipc connection between many clients.')
+    parser.add_argument('-s',
+                        '--socket-path',
+                        help='the socket to listen on (default: $XDG_RUNTIME_DIR/i3ipc-broker.sock)')
+    parser.add_argument('-u', '--upstream', help='the i3 ipc socket (default: found like I3SOCK)')
+    parser.add_argument('--cache-tree',
+                        action='store_true',
+                        help='serve GET_TREE from a cache between layout changes. Commands '
+                        'sent to i3 without the broker may change the layout without an '
+                        'event, so the cache also expires (see --tree-max-age)')
+    parser.add_argument('--tree-max-age',
+                        type=float,
+                        default=1.0,
+                        metavar='SECONDS',
+                        help='how long a cached GET_TREE reply is served, 0 for no limit '
+                        '(default: 1)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='log what the broker does')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    asyncio.run(_run(args))
+
+
+if __name__ == '__main__':
+    main()
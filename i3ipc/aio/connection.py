@@ -1,25 +1,27 @@
-from .._private import PubSub, MessageType, EventType, Synchronizer
+from .._private import (PubSub, MessageType, EventType, Synchronizer, FrameParser, Reconnector,
+                        ReconnectStats, HandlerScheduler, SchedulerStats, pack_commands,
+                        join_commands, map_replies, get_codec, discovery, SubscriptionHandoff,
+                        is_handoff_marker)
 from ..replies import (BarConfigReply, CommandReply, ConfigReply, OutputReply, TickReply,
                        VersionReply, WorkspaceReply, SeatReply, InputReply)
 from ..events import (IpcBaseEvent, BarconfigUpdateEvent, BindingEvent, OutputEvent, ShutdownEvent,
                       WindowEvent, TickEvent, ModeEvent, WorkspaceEvent, InputEvent, Event)
 from .. import con
 import os
-import json
-from typing import Optional, List, Tuple, Callable, Union
+from typing import Optional, List, Tuple, Callable, Union, Iterable, Hashable
 import struct
-import socket
+import time
 import logging
 
 import asyncio
 from asyncio.subprocess import PIPE
 from asyncio import Future
+from collections import deque
 
 _MAGIC = b'i3-ipc'  # safety string for i3-ipc
-_chunk_size = 1024  # in bytes
-_timeout = 0.5  # in seconds
 _struct_header = f'={len(_MAGIC)}sII'
 _struct_header_size = struct.calcsize(_struct_header)
+_max_command_payload = 65536  # in bytes
 _running_futures = set()
 
 logger = logging.getLogger(__name__)
@@ -33,37 +35,48 @@ def ensure_future(obj):
     return future
 
 
-class _AIOPubSub(PubSub):
-    def queue_handler(self, handler, data=None):
-        conn = self.conn
+class _IpcProtocol(asyncio.Protocol):
+    """Splits the data received on an ipc socket into messages and passes
+    them to the ``Connection``."""
+    def __init__(self, on_message, on_connection_lost):
+        self._parser = FrameParser()
+        self._on_message = on_message
+        self._on_connection_lost = on_connection_lost
+        self.transport = None
 
-        async def handler_coroutine():
-            try:
-                if data:
-                    if asyncio.iscoroutinefunction(handler):
-                        await handler(conn, data)
-                    else:
-                        handler(conn, data)
-                else:
-                    if asyncio.iscoroutinefunction(handler):
-                        await handler(conn)
-                    else:
-                        handler(conn)
-            except Exception as e:
-                conn.main_quit(_error=e)
+    def connection_made(self, transport):
+        self.transport = transport
 
-        ensure_future(handler_coroutine())
+    def data_received(self, data):
+        self._parser.feed(data)
+        for message_type, payload in self._parser.frames():
+            if self.transport.is_closing():
+                # the connection replaced this socket
+                break
+            self._on_message(message_type, payload)
 
-    def emit(self, event, data):
-        detail = ''
+    def connection_lost(self, exc):
+        if exc is None and len(self._parser):
+            logger.error('premature ending while reading message (%s bytes read)',
+                         len(self._parser))
+        self._on_connection_lost(self, exc)
 
-        if data and hasattr(data, 'change'):
-            detail = data.change
 
-        for s in self._subscriptions:
-            if s['event'] == event:
-                if not s['detail'] or s['detail'] == detail:
-                    self.queue_handler(s['handler'], data)
+class _AIOPubSub(PubSub):
+    def queue_handler(self, handler, event, data=None):
+        conn = self.conn
+
+        if data:
+            # calls for the same handler, event and container can be
+            # coalesced
+            key = (handler, event, getattr(data, 'change', None))
+            if isinstance(data, WindowEvent):
+                key += (data.container_id, )
+            elif isinstance(data, WorkspaceEvent):
+                key += (data.current_id, )
+            conn._scheduler.submit(handler, (conn, data), key)
+        else:
+            conn._scheduler.submit(handler, (conn, ))
 
 
 class Con(con.Con):
@@ -134,9 +147,12 @@ class Con(con.Con):
     :ivar gaps: (gaps only)
     :vartype gaps: :class:`Gaps <i3ipc.Gaps>`
 
-    :ivar ipc_data: The raw data from the i3 ipc.
+    :ivar ipc_data: The raw data from the i3 ipc, or ``None`` if the tree
+        was gotten with ``ipc_data=False``.
     :vartype ipc_data: dict
     """
+    __slots__ = ()
+
     async def command(self, command: str) -> List[CommandReply]:
         """Runs a command on this container.
 
@@ -157,14 +173,8 @@ class Con(con.Con):
         :returns: A list of replies for each command that was executed.
         :rtype: list(CommandReply)
         """
-        if not len(self.nodes):
-            return []
-
-        commands = []
-        for c in self.nodes:
-            commands.append('[con_id="{}"] {};'.format(c.id, command))
-
-        return await self._conn.command(' '.join(commands))
+        replies = await self._conn.command_containers(self.nodes, command)
+        return [r for con_replies in replies for r in con_replies]
 
 
 def _pack(msg_type: MessageType, payload: str) -> bytes:
@@ -177,54 +187,44 @@ def _unpack_header(data: bytes) -> Tuple[bytes, int, int]:
     return struct.unpack(_struct_header, data[:_struct_header_size])
 
 
-async def _find_socket_path() -> Optional[str]:
-    socket_path = None
-
-    def exists(path):
-        if not path:
-            return False
-        result = os.path.exists(path)
-        if not result:
-            logger.info('file not found: %s', socket_path)
-        return result
+async def _get_socketpath(binary: str) -> Optional[str]:
+    try:
+        process = await asyncio.create_subprocess_exec(binary,
+                                                       '--get-socketpath',
+                                                       stdout=PIPE,
+                                                       stderr=PIPE)
+
+        stdout, stderr = await process.communicate()
+    except Exception as e:
+        logger.info('could not get i3 socket path from `%s` binary', binary, exc_info=e)
+        return None
+
+    socket_path = discovery.parse_socketpath_output(binary, process.returncode, stdout, stderr)
+    if socket_path and not os.path.exists(socket_path):
+        logger.info('file not found: %s', socket_path)
+        return None
+    return socket_path
 
+
+async def _find_socket_path() -> Optional[str]:
     # first try environment variables
-    socket_path = os.environ.get('I3SOCK')
+    socket_path = discovery.env_socket_path(check_exists=True)
     if socket_path:
-        logger.info('got socket path from I3SOCK env variable: %s', socket_path)
-        if exists(socket_path):
-            return socket_path
+        return socket_path
 
-    socket_path = os.environ.get('SWAYSOCK')
+    # then the cache and the runtime dirs
+    socket_path = discovery.cached_socket_path() or discovery.scanned_socket_path()
     if socket_path:
-        logger.info('got socket path from SWAYSOCK env variable: %s', socket_path)
-        if exists(socket_path):
+        discovery.remember_socket_path(socket_path)
+        return socket_path
+
+    # finally ask the binaries, all at once
+    results = await asyncio.gather(*[_get_socketpath(b) for b in discovery.SOCKETPATH_BINARIES])
+    for socket_path in results:
+        if socket_path:
+            discovery.remember_socket_path(socket_path)
             return socket_path
 
-    # finally try the binaries
-    for binary in ('i3', 'sway'):
-        try:
-            process = await asyncio.create_subprocess_exec(binary,
-                                                           '--get-socketpath',
-                                                           stdout=PIPE,
-                                                           stderr=PIPE)
-
-            stdout, stderr = await process.communicate()
-
-            if process.returncode == 0 and stdout:
-                socket_path = stdout.decode().strip()
-                logger.info('got socket path from `%s` binary: %s', binary, socket_path)
-                if exists(socket_path):
-                    return socket_path
-            else:
-                logger.info(
-                    'could not get socket path from `%s` binary: returncode=%d, stdout=%s, stderr=%s',
-                    process.returncode, stdout, stderr)
-
-        except Exception as e:
-            logger.info('could not get i3 socket path from `%s` binary', binary, exc_info=e)
-            continue
-
     logger.info('could not find i3 socket path')
     return None
 
@@ -251,17 +251,68 @@ class Connection:
     :param auto_reconnect: Whether to attempt to reconnect if the connection to
         the socket is broken when i3 restarts.
     :type auto_reconnect: bool
+    :param reconnect_deadline: How long in seconds to wait for the socket to
+        come back when reconnecting.
+    :type reconnect_deadline: float
+    :param timeout: The default number of seconds to wait for the reply to a
+        request. If not given, wait as long as it takes.
+    :type timeout: float
+    :param handler_concurrency: The maximum number of coroutine event handlers
+        running at the same time, or ``None`` for no limit.
+    :type handler_concurrency: int
+    :param handler_queue_size: The number of event handler calls that can wait
+        for their turn before ``handler_overflow`` applies.
+    :type handler_queue_size: int
+    :param handler_overflow: What to do when the handler queue is full:
+        ``"block"`` stops reading events until the queue drains,
+        ``"drop_oldest"`` drops the oldest waiting call and ``"coalesce"``
+        replaces a waiting call of the same handler for the same event,
+        change and container, and drops the oldest call otherwise.
+    :type handler_overflow: str
+    :param json_codec: The JSON codec used to decode replies and events:
+        ``"orjson"``, ``"ujson"``, ``"json"`` or an object with ``loads()`` and
+        ``dumps()`` methods. If not given, use the fastest codec that is
+        installed.
+    :type json_codec: str
 
     :raises Exception: If the connection to i3 cannot be established.
     """
-    def __init__(self, socket_path: Optional[str] = None, auto_reconnect: bool = False):
+    _handoff_timeout = 5.0  # in seconds
+
+    def __init__(self,
+                 socket_path: Optional[str] = None,
+                 auto_reconnect: bool = False,
+                 json_codec=None,
+                 reconnect_deadline: float = 10.0,
+                 timeout: Optional[float] = None,
+                 handler_concurrency: Optional[int] = 64,
+                 handler_queue_size: int = 1024,
+                 handler_overflow: str = 'block'):
         self._socket_path = socket_path
         self._auto_reconnect = auto_reconnect
+        self._reconnector = Reconnector(socket_path, reconnect_deadline)
+        self._timeout = timeout
+        self._timeouts = 0
+        self._codec = get_codec(json_codec)
         self._pubsub = _AIOPubSub(self)
+        self._scheduler = HandlerScheduler(lambda e: self.main_quit(_error=e),
+                                           concurrency=handler_concurrency,
+                                           queue_size=handler_queue_size,
+                                           overflow=handler_overflow,
+                                           pause=self._pause_events,
+                                           resume=self._resume_events)
         self._subscriptions = set()
+        self._sub_events = set()
+        self._handoff = None
+        # connects the socket of the handoff
+        self._handoff_task = None
+        self._resubscribe_pending = False
         self._main_future = None
         self._reconnect_future = None
         self._synchronizer = None
+        self._sub_protocol = None
+        self._cmd_protocol = None
+        self._cmd_pending = deque()
 
     def _sync(self):
         if self._synchronizer is None:
@@ -291,43 +342,184 @@ class Connection:
         """
         return self._auto_reconnect
 
-    async def _ipc_recv(self, sock):
-        pass
+    @property
+    def reconnect_stats(self) -> ReconnectStats:
+        """Statistics of the reconnects of this ``Connection``: the number of
+        successful ``reconnects`` and of ``failures`` to reconnect before the
+        deadline, and the ``last_latency``, ``max_latency`` and
+        ``total_latency`` in seconds from losing the connection to being
+        connected again.
+
+        :rtype: ReconnectStats
+        """
+        return self._reconnector.stats()
+
+    @property
+    def handler_stats(self) -> SchedulerStats:
+        """Statistics of the event handler queue: the number of calls
+        ``queued`` now and at most (``max_queued``), the coroutine handlers
+        ``running``, the calls ``submitted``, ``dropped`` and ``coalesced``,
+        and the number of ``pauses`` in reading events.
+
+        :rtype: SchedulerStats
+        """
+        return self._scheduler.stats()
+
+    def _call_later(self, delay, callback, *args):
+        # timers of the debounce and throttle limiters
+        self._loop.call_later(delay, callback, *args)
+
+    def _pause_events(self):
+        if self._sub_protocol is not None:
+            self._sub_protocol.transport.pause_reading()
 
-    def _message_reader(self):
+    def _resume_events(self):
+        if self._sub_protocol is not None:
+            self._sub_protocol.transport.resume_reading()
+
+    @property
+    def timeouts(self) -> int:
+        """The number of requests that gave up waiting for a reply.
+
+        :rtype: int
+        """
+        return self._timeouts
+
+    def _on_sub_message(self, message_type, raw_message):
         try:
-            self._read_message()
+            handoff = self._handoff
+            if handoff is not None and not handoff.old_message(message_type, raw_message):
+                self._handoff_progress(handoff)
+                return
+
+            self._dispatch_message(message_type, raw_message)
         except Exception as e:
             self.main_quit(_error=e)
 
-    def _read_message(self):
+    def _resubscribe(self):
+        # moves the events to a new socket subscribed to the events that
+        # still have handlers
+        if self._handoff is not None:
+            self._resubscribe_pending = True
+            return
 
-        error = None
-        buf = b''
+        if self._sub_protocol is None:
+            return
+
+        # the tick subscription is kept for the handoffs
+        events = self._subscriptions | {Event.TICK}
+        if not self._sub_events - events:
+            return
+
+        logger.info('moving the events to a socket subscribed to %s', events)
+        self._handoff = SubscriptionHandoff(self._codec.loads, Event.TICK in self._sub_events,
+                                            events)
+        self._handoff_task = ensure_future(self._start_handoff(self._handoff))
+
+    async def _start_handoff(self, handoff):
         try:
-            buf = self._sub_socket.recv(_struct_header_size)
-        except ConnectionError as e:
-            error = e
+            _, protocol = await self._loop.create_unix_connection(
+                lambda: _IpcProtocol(lambda t, m: self._on_handoff_message(handoff, t, m),
+                                     lambda p, e: self._on_handoff_connection_lost(handoff, p, e)),
+                self.socket_path)
+        except OSError as e:
+            logger.info('could not connect a new subscription socket', exc_info=e)
+            self._abort_handoff(handoff)
+            return
 
-        if not buf or error is not None:
-            self._loop.remove_reader(self._sub_fd)
+        if self._handoff is not handoff:
+            protocol.transport.close()
+            return
 
-            if self._auto_reconnect:
-                logger.info('could not read message, reconnecting', exc_info=error)
-                ensure_future(self._reconnect())
-            else:
-                if error is not None:
-                    raise error
-                else:
-                    raise EOFError()
+        handoff.transport = protocol
+        handoff.timer = self._loop.call_later(self._handoff_timeout, self._abort_handoff, handoff)
+        protocol.transport.write(
+            _pack(MessageType.SUBSCRIBE, self._codec.dumps([e.value for e in handoff.events])))
+        if not handoff.old_acked:
+            self._sub_protocol.transport.write(
+                _pack(MessageType.SUBSCRIBE, self._codec.dumps([Event.TICK.value])))
+
+    def _on_handoff_message(self, handoff, message_type, raw_message):
+        if self._handoff is not handoff:
+            # the new socket took over
+            self._on_sub_message(message_type, raw_message)
+            return
+
+        try:
+            if handoff.new_message(message_type, raw_message):
+                self._dispatch_message(message_type, raw_message)
+            self._handoff_progress(handoff)
+        except Exception as e:
+            self.main_quit(_error=e)
+
+    def _on_handoff_connection_lost(self, handoff, protocol, error):
+        if self._handoff is handoff:
+            self._abort_handoff(handoff)
+        else:
+            self._on_sub_connection_lost(protocol, error)
+
+    def _handoff_progress(self, handoff):
+        if handoff.done:
+            self._finish_handoff(handoff)
+        elif handoff.ready:
+            handoff.marker_sent = True
+            ensure_future(self._send_handoff_marker(handoff))
+
+    async def _send_handoff_marker(self, handoff):
+        try:
+            await self.send_tick(handoff.marker)
+        except Exception as e:
+            logger.info('could not send the handoff marker', exc_info=e)
+            self._abort_handoff(handoff)
+
+    def _finish_handoff(self, handoff):
+        self._handoff = None
+        self._handoff_task = None
+        handoff.timer.cancel()
+
+        old, self._sub_protocol = self._sub_protocol, handoff.transport
+        self._sub_events = handoff.events
+        old.transport.close()
+        logger.info('moved the events to the new socket')
+
+        for message_type, raw_message in handoff.held:
+            self._dispatch_message(message_type, raw_message)
+
+        if self._resubscribe_pending:
+            self._resubscribe_pending = False
+            self._resubscribe()
+
+    def _abort_handoff(self, handoff):
+        if handoff is None or self._handoff is not handoff:
+            return
 
+        logger.info('could not move the events to a new socket, keeping the old one')
+        self._handoff = None
+        self._resubscribe_pending = False
+        task, self._handoff_task = self._handoff_task, None
+        if task is not None and not task.done():
+            # stops a connect in progress. The task may be the caller, which
+            # returns right after.
+            task.cancel()
+        if handoff.timer is not None:
+            handoff.timer.cancel()
+        if handoff.transport is not None:
+            handoff.transport.transport.close()
+
+    def _on_sub_connection_lost(self, protocol, error):
+        if protocol is not self._sub_protocol:
+            # the socket was closed by connect()
             return
 
-        magic, message_length, event_type = _unpack_header(buf)
-        assert magic == _MAGIC
-        raw_message = self._sub_socket.recv(message_length)
-        message = json.loads(raw_message)
+        self._sub_protocol = None
 
+        if self._auto_reconnect:
+            logger.info('could not read message, reconnecting', exc_info=error)
+            self._reconnect()
+        else:
+            self.main_quit(_error=error if error is not None else EOFError())
+
+    def _dispatch_message(self, event_type, raw_message):
         # events have the highest bit set
         if not event_type & (1 << 31):
             # a reply
@@ -337,6 +529,11 @@ class Connection:
         logger.info('got message on subscription socket: type=%s, message=%s', event_type,
                     raw_message)
 
+        if not self._pubsub.wants(event_type.to_string(), raw_message):
+            return
+
+        message = self._codec.loads(raw_message)
+
         if event_type == EventType.WORKSPACE:
             event = WorkspaceEvent(message, self, _Con=Con)
         elif event_type == EventType.OUTPUT:
@@ -353,6 +550,9 @@ class Connection:
             event = ShutdownEvent(message)
         elif event_type == EventType.TICK:
             event = TickEvent(message)
+            if is_handoff_marker(event.payload):
+                # the handoffs of this or other connections
+                return
         elif event_type == EventType.INPUT:
             event = InputEvent(message)
         else:
@@ -377,16 +577,19 @@ class Connection:
         if not self.socket_path:
             raise Exception('Failed to retrieve the i3 or sway IPC socket path')
 
-        self._cmd_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        self._cmd_socket.connect(self.socket_path)
+        self._reconnector.socket_path = self._socket_path
+        self._loop = asyncio.get_event_loop()
+        self._close()
 
-        self._sub_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        self._sub_socket.connect(self.socket_path)
+        _, self._cmd_protocol = await self._loop.create_unix_connection(
+            lambda: _IpcProtocol(self._on_cmd_message, self._on_cmd_connection_lost),
+            self.socket_path)
 
-        self._loop = asyncio.get_event_loop()
-        self._sub_fd = self._sub_socket.fileno()
-        self._loop.add_reader(self._sub_fd, self._message_reader)
+        _, self._sub_protocol = await self._loop.create_unix_connection(
+            lambda: _IpcProtocol(self._on_sub_message, self._on_sub_connection_lost),
+            self.socket_path)
 
+        self._sub_events = set()
         await self.subscribe(list(self._subscriptions), force=True)
 
         return self
@@ -396,31 +599,124 @@ class Connection:
             return self._reconnect_future
 
         self._reconnect_future = self._loop.create_future()
+        # a failure is also passed to main_quit(), so there is no need to
+        # warn when no request is waiting for the reconnect
+        self._reconnect_future.add_done_callback(lambda f: f.cancelled() or f.exception())
 
         async def do_reconnect():
+            start = time.monotonic()
             error = None
 
-            for tries in range(0, 1000):
+            while True:
+                # the deadline counts from when the connection was lost
+                deadline = self._reconnector.deadline - (time.monotonic() - start)
+                if not await self._reconnector.wait_async(self._loop, deadline):
+                    error = error or ConnectionRefusedError(
+                        'the ipc socket did not come back in {} seconds'.format(
+                            self._reconnector.deadline))
+                    break
                 try:
                     await self.connect()
                     error = None
                     break
                 except Exception as e:
+                    # the socket went away again
                     error = e
-                    await asyncio.sleep(0.001)
+
+            future, self._reconnect_future = self._reconnect_future, None
 
             if error:
-                self._reconnect_future.set_exception(error)
+                self._reconnector.record_failure()
+                future.set_exception(error)
+                # nothing is left to wait for events
+                self.main_quit(_error=error)
             else:
-                self._reconnect_future.set_result(None)
-
-            self._reconnect_future = None
+                self._reconnector.record(time.monotonic() - start)
+                future.set_result(None)
 
         ensure_future(do_reconnect())
 
         return self._reconnect_future
 
-    async def _message(self, message_type: MessageType, payload: str = '') -> bytearray:
+    async def close(self):
+        """Closes the sockets of this connection. Requests that are waiting for
+        a reply get a ``ConnectionResetError``. The connection can be
+        connected again with :func:`connect()`.
+        """
+        task = self._handoff_task
+        self._close()
+        if task is not None:
+            # wait for the cancelled handoff so it does not outlive the loop
+            await asyncio.wait([task])
+
+    def _close(self):
+        """Closes the sockets of this connection. Requests that are waiting for
+        a reply get a ``ConnectionResetError``."""
+        self._abort_handoff(self._handoff)
+
+        sub_protocol, self._sub_protocol = self._sub_protocol, None
+        if sub_protocol is not None:
+            sub_protocol.transport.close()
+
+        cmd_protocol, self._cmd_protocol = self._cmd_protocol, None
+        if cmd_protocol is not None:
+            cmd_protocol.transport.close()
+            self._cmd_fail_pending(ConnectionResetError('the connection was reset'))
+
+    def _on_cmd_message(self, reply_type, message):
+        if not self._cmd_pending:
+            logger.error('got an unexpected reply on the command socket: type=%s', reply_type)
+            return
+
+        message_type, future = self._cmd_pending.popleft()
+
+        if future.done():
+            # the caller went away, discard its reply
+            return
+
+        if reply_type != message_type.value:
+            future.set_exception(
+                Exception('got reply type {} for a {} message'.format(reply_type, message_type)))
+            return
+
+        logger.info('got message reply: %s', message)
+        future.set_result(message)
+
+    def _on_cmd_connection_lost(self, protocol, error):
+        if protocol is not self._cmd_protocol:
+            # the socket was closed by connect()
+            return
+
+        self._cmd_protocol = None
+        self._cmd_fail_pending(error)
+
+        if error is not None and self._auto_reconnect:
+            self._reconnect()
+
+    def _cmd_fail_pending(self, error=None):
+        # Requests that are waiting for a reply get an EOFError on EOF (i3
+        # closes the socket when it restarts) or the error otherwise.
+        while self._cmd_pending:
+            message_type, future = self._cmd_pending.popleft()
+            if future.done():
+                continue
+            future.set_exception(error if error is not None else EOFError(
+                'the ipc socket was closed before the reply to {}'.format(message_type)))
+
+    def _send_request(self, message_type: MessageType, payload: str) -> Future:
+        # the replies come back in the order the requests were written
+        if self._cmd_protocol is None or self._cmd_protocol.transport.is_closing():
+            raise ConnectionResetError('the command socket is closed')
+
+        future = self._loop.create_future()
+        self._cmd_pending.append((message_type, future))
+        self._cmd_protocol.transport.write(_pack(message_type, payload))
+        return future
+
+    async def _message(self,
+                       message_type: MessageType,
+                       payload: str = '',
+                       timeout: Optional[float] = None) -> bytes:
         if message_type is MessageType.SUBSCRIBE:
             raise Exception('cannot subscribe on the command socket')
 
@@ -428,41 +724,34 @@ class Connection:
 
         for tries in range(0, 5):
             try:
-                await self._loop.sock_sendall(self._cmd_socket, _pack(message_type, payload))
-                buf = await self._loop.sock_recv(self._cmd_socket, _struct_header_size)
+                future = self._send_request(message_type, payload)
                 break
             except ConnectionError as e:
                 if not self._auto_reconnect:
                     raise e
 
                 logger.info('got connection error, attempting to reconnect', exc_info=e)
+                error = e
                 await self._reconnect()
+        else:
+            # the socket went away again after every reconnect
+            raise error
 
-        if not buf:
-            return bytearray()
-
-        magic, message_length, reply_type = _unpack_header(buf)
-        assert reply_type == message_type.value
-        assert magic == _MAGIC
+        if timeout is None:
+            timeout = self._timeout
+        if timeout is None:
+            return await future
 
         try:
-            message = bytearray()
-            remaining_length = message_length
-            while remaining_length:
-                buf = await self._loop.sock_recv(self._cmd_socket, remaining_length)
-                if not buf:
-                    logger.error('premature ending while reading message (%s bytes remaining)',
-                                 remaining_length)
-                    break
-                message.extend(buf)
-                remaining_length -= len(buf)
-        except ConnectionError as e:
-            if self._auto_reconnect:
-                ensure_future(self._reconnect())
-            raise e
-
-        logger.info('got message reply: %s', message)
-        return message
+            # on timeout the future is cancelled, but it keeps its place in
+            # the queue of pending requests. The late reply is read and
+            # dropped when it arrives, so the next reply is not mistaken for
+            # it.
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self._timeouts += 1
+            raise TimeoutError('no reply to {} in {} seconds'.format(message_type,
+                                                                     timeout)) from None
 
     async def subscribe(self, events: Union[List[Event], List[str]], force: bool = False):
         """Send a ``SUBSCRIBE`` command to the ipc subscription connection and
@@ -504,17 +793,33 @@ class Connection:
 
         self._subscriptions.update(subscriptions)
 
-        payload = json.dumps([s.value for s in subscriptions])
+        payload = self._codec.dumps([s.value for s in subscriptions])
 
         logger.info('sending SUBSCRIBE message with payload: %s', payload)
 
-        await self._loop.sock_sendall(self._sub_socket, _pack(MessageType.SUBSCRIBE, payload))
+        if self._sub_protocol is None:
+            # the subscriptions are sent when the connection is established
+            logger.info('not connected, deferring the subscription')
+            return
+
+        self._sub_protocol.transport.write(_pack(MessageType.SUBSCRIBE, payload))
+        self._sub_events.update(subscriptions)
+
+        handoff = self._handoff
+        if handoff is not None:
+            # the socket that takes over needs them too
+            handoff.events.update(subscriptions)
+            if handoff.transport is not None:
+                handoff.transport.transport.write(_pack(MessageType.SUBSCRIBE, payload))
 
     def on(self,
            event: Union[Event, str],
-           handler: Callable[['Connection', IpcBaseEvent], None] = None):
+           handler: Callable[['Connection', IpcBaseEvent], None] = None,
+           debounce: Optional[float] = None,
+           throttle: Optional[float] = None,
+           coalesce_by: Union[str, Callable[[IpcBaseEvent], Hashable], None] = None):
         def on_wrapped(handler):
-            self._on(event, handler)
+            self._on(event, handler, debounce, throttle, coalesce_by)
             return handler
 
         if handler:
@@ -522,14 +827,41 @@ class Connection:
         else:
             return on_wrapped
 
-    def _on(self, event: Union[Event, str], handler: Callable[['Connection', IpcBaseEvent], None]):
+    def _on(self,
+            event: Union[Event, str],
+            handler: Callable[['Connection', IpcBaseEvent], None],
+            debounce: Optional[float] = None,
+            throttle: Optional[float] = None,
+            coalesce_by: Union[str, Callable[[IpcBaseEvent], Hashable], None] = None,
+            inline: bool = False):
         """Subscribe to the event and call the handler when it is emitted by
         the i3 ipc.
 
+        Storms of events, like the ``window::title`` events of a terminal,
+        can be thinned out with ``debounce`` or ``throttle``. The events are
+        grouped by ``coalesce_by`` and only the latest event of a group
+        reaches the handler.
+
         :param event: The event to subscribe to.
         :type event: :class:`Event <i3ipc.Event>` or str
         :param handler: The event handler to call.
         :type handler: :class:`Callable`
+        :param debounce: Call the handler with the latest event of a group
+            once no event came for ``debounce`` milliseconds.
+        :type debounce: float
+        :param throttle: Call the handler with the first event of a group
+            right away, then at most once every ``throttle`` milliseconds
+            with the latest event.
+        :type throttle: float
+        :param coalesce_by: What groups the events: a dotted attribute path
+            of the event like ``"container_id"`` or a function of the event.
+            If not given, all the events of this subscription are one group.
+        :type coalesce_by: str or :class:`Callable`
+        :param inline: Call the handler from the loop as soon as the event is
+            read, in the order of the events, instead of passing it to the
+            handler threads or the scheduler. Used by :class:`TreeCache
+            <i3ipc.aio.TreeCache>`.
+        :type inline: bool
         """
         if type(event) is Event:
             event = event.value
@@ -543,164 +875,390 @@ class Connection:
 
         logger.info('adding event handler: event=%s, handler=%s', event, handler)
 
-        self._pubsub.subscribe(event, handler)
+        self._pubsub.subscribe(event, handler, debounce, throttle, coalesce_by, inline)
         ensure_future(self.subscribe([base_event]))
 
     def off(self, handler: Callable[['Connection', IpcBaseEvent], None]):
         """Unsubscribe the handler from being called on ipc events.
 
+        When the last handler of an event is removed, the events move to a new
+        subscription socket without that event, so i3 stops sending it.
+
+        The move is synchronized with a tick that i3 sends to every client
+        subscribed to ticks, including other programs. Its payload starts
+        with ``i3ipc-handoff-`` and connections of this library do not pass
+        it to their tick handlers. The new socket is always subscribed to
+        ticks for the next move.
+
         :param handler: The handler that was previously attached with
             :func:`on()`.
         :type handler: :class:`Callable`
         """
         logger.info('removing event handler: handler=%s', handler)
-        self._pubsub.unsubscribe(handler)
+        unused = self._pubsub.unsubscribe(handler)
+        unused.discard('ipc_shutdown')
+
+        if unused:
+            self._subscriptions.difference_update(Event(e) for e in unused)
+            self._resubscribe()
+
+    async def _get(self, message_type: MessageType, payload: str, parse: Optional[Callable],
+                   raw: bool, decode: bool, timeout: Optional[float]):
+        if raw and decode:
+            raise ValueError('raw and dict cannot be used together')
+
+        data = await self._message(message_type, payload, timeout)
+
+        if raw:
+            return bytes(data)
 
-    async def command(self, cmd: str) -> List[CommandReply]:
+        data = self._codec.loads(data)
+
+        if decode or parse is None:
+            return data
+
+        return parse(data)
+
+    async def command(self, cmd: str, timeout: Optional[float] = None) -> List[CommandReply]:
         """Sends a command to i3.
 
         .. seealso:: https://i3wm.org/docs/userguide.html#list_of_commands
 
         :param cmd: The command to send to i3.
         :type cmd: str
+        :param timeout: Seconds to wait for the reply. If not given, use the
+            ``timeout`` of the ``Connection``.
+        :type timeout: float
         :returns: A list of replies that contain info for the result of each
             command given.
         :rtype: list(:class:`CommandReply <i3ipc.CommandReply>`)
         """
-        data = await self._message(MessageType.COMMAND, cmd)
-
-        if data:
-            data = json.loads(data)
-            return CommandReply._parse_list(data)
-        else:
+        try:
+            data = await self._message(MessageType.COMMAND, cmd, timeout)
+        except EOFError:
+            # commands like restart and exit close the socket without a reply
             return []
 
-    async def get_version(self) -> VersionReply:
+        data = self._codec.loads(data)
+        return CommandReply._parse_list(data)
+
+    async def command_batch(self,
+                            commands: List[str],
+                            max_payload: int = None,
+                            timeout: Optional[float] = None) -> List[List[CommandReply]]:
+        """Sends many commands to i3 in as few messages as possible.
+
+        The commands are joined into command strings of at most
+        ``max_payload`` bytes so a batch normally takes a single round trip.
+        Each command is run with its own criteria like separate calls to
+        :func:`command()`. When the batch needs more than one message, the
+        messages are pipelined on the command socket.
+
+        :param commands: The commands to send to i3.
+        :type commands: list(str)
+        :param max_payload: The maximum size in bytes of a single message.
+        :type max_payload: int
+        :param timeout: Seconds to wait for the replies to the whole batch. If
+            not given, use the ``timeout`` of the ``Connection``.
+        :type timeout: float
+        :returns: The replies for each command in the order they were given.
+            If a command fails to parse, i3 skips the commands after it in
+            the same message and they get an empty list of replies.
+        :rtype: list(list(:class:`CommandReply <i3ipc.CommandReply>`))
+        """
+        groups = [[commands[i] for i in group]
+                  for group in pack_commands(commands, max_payload or _max_command_payload)]
+
+        # the messages are sent together, so they share the timeout
+        replies = await asyncio.gather(*[self.command(join_commands(g), timeout) for g in groups])
+
+        result = []
+        for group_commands, group_replies in zip(groups, replies):
+            result.extend(map_replies(group_commands, group_replies))
+
+        return result
+
+    async def command_containers(self,
+                                 containers: Iterable[con.Con],
+                                 command: str,
+                                 timeout: Optional[float] = None) -> List[List[CommandReply]]:
+        """Runs a command on each of the given containers with
+        :func:`command_batch()`.
+
+        :param containers: The containers to run the command on.
+        :type containers: list(:class:`Con <i3ipc.aio.Con>`)
+        :param command: The command to run on each container.
+        :type command: str
+        :param timeout: Seconds to wait for all the replies. If not given, use
+            the ``timeout`` of the ``Connection``.
+        :type timeout: float
+        :returns: The replies for the command on each container.
+        :rtype: list(list(:class:`CommandReply <i3ipc.CommandReply>`))
+        """
+        return await self.command_batch(
+            ['[con_id="{}"] {}'.format(c.id, command) for c in containers], timeout=timeout)
+
+    async def get_version(self,
+                          raw: bool = False,
+                          dict: bool = False,
+                          timeout: Optional[float] = None) -> VersionReply:
         """Gets the i3 version.
 
+        :param raw: Return the payload of the reply as bytes without decoding it.
+        :type raw: bool
+        :param dict: Return the decoded JSON of the reply without building
+            reply objects.
+        :type dict: bool
+        :param timeout: Seconds to wait for the reply. If not given, use the
+            ``timeout`` of the ``Connection``.
+        :type timeout: float
+
         :returns: The i3 version.
         :rtype: :class:`i3ipc.VersionReply`
         """
-        data = await self._message(MessageType.GET_VERSION)
-        data = json.loads(data)
-        return VersionReply(data)
+        return await self._get(MessageType.GET_VERSION, '', VersionReply, raw, dict, timeout)
 
-    async def get_bar_config_list(self) -> List[str]:
+    async def get_bar_config_list(self,
+                                  raw: bool = False,
+                                  dict: bool = False,
+                                  timeout: Optional[float] = None) -> List[str]:
         """Gets the names of all bar configurations.
 
+        :param raw: Return the payload of the reply as bytes without decoding it.
+        :type raw: bool
+        :param dict: Return the decoded JSON of the reply without building
+            reply objects.
+        :type dict: bool
+        :param timeout: Seconds to wait for the reply. If not given, use the
+            ``timeout`` of the ``Connection``.
+        :type timeout: float
+
         :returns: A list of all bar configurations.
         :rtype: list(str)
         """
-        data = await self._message(MessageType.GET_BAR_CONFIG)
-        return json.loads(data)
+        return await self._get(MessageType.GET_BAR_CONFIG, '', None, raw, dict, timeout)
 
-    async def get_bar_config(self, bar_id=None) -> Optional[BarConfigReply]:
+    async def get_bar_config(self,
+                             bar_id=None,
+                             raw: bool = False,
+                             dict: bool = False,
+                             timeout: Optional[float] = None) -> Optional[BarConfigReply]:
         """Gets the bar configuration specified by the id.
 
         :param bar_id: The bar id to get the configuration for. If not given,
             get the configuration for the first bar id.
         :type bar_id: str
+        :param raw: Return the payload of the reply as bytes without decoding it.
+        :type raw: bool
+        :param dict: Return the decoded JSON of the reply without building
+            reply objects.
+        :type dict: bool
+        :param timeout: Seconds to wait for the reply. If not given, use the
+            ``timeout`` of the ``Connection``.
+        :type timeout: float
 
         :returns: The bar configuration for the bar id.
         :rtype: :class:`BarConfigReply <i3ipc.BarConfigReply>` or :class:`None`
             if no bar configuration is found.
         """
         if not bar_id:
-            bar_config_list = await self.get_bar_config_list()
+            bar_config_list = await self.get_bar_config_list(timeout=timeout)
             if not bar_config_list:
                 return None
             bar_id = bar_config_list[0]
 
-        data = await self._message(MessageType.GET_BAR_CONFIG, bar_id)
-        data = json.loads(data)
-        return BarConfigReply(data)
+        return await self._get(MessageType.GET_BAR_CONFIG, bar_id, BarConfigReply, raw, dict,
+                               timeout)
 
-    async def get_outputs(self) -> List[OutputReply]:
+    async def get_outputs(self,
+                          raw: bool = False,
+                          dict: bool = False,
+                          timeout: Optional[float] = None) -> List[OutputReply]:
         """Gets the list of current outputs.
 
+        :param raw: Return the payload of the reply as bytes without decoding it.
+        :type raw: bool
+        :param dict: Return the decoded JSON of the reply without building
+            reply objects.
+        :type dict: bool
+        :param timeout: Seconds to wait for the reply. If not given, use the
+            ``timeout`` of the ``Connection``.
+        :type timeout: float
+
         :returns: A list of current outputs.
         :rtype: list(:class:`i3ipc.OutputReply`)
         """
-        data = await self._message(MessageType.GET_OUTPUTS)
-        data = json.loads(data)
-        return OutputReply._parse_list(data)
+        return await self._get(MessageType.GET_OUTPUTS, '', OutputReply._parse_list, raw, dict,
+                               timeout)
 
-    async def get_workspaces(self) -> List[WorkspaceReply]:
+    async def get_workspaces(self,
+                             raw: bool = False,
+                             dict: bool = False,
+                             timeout: Optional[float] = None) -> List[WorkspaceReply]:
         """Gets the list of current workspaces.
 
+        :param raw: Return the payload of the reply as bytes without decoding it.
+        :type raw: bool
+        :param dict: Return the decoded JSON of the reply without building
+            reply objects.
+        :type dict: bool
+        :param timeout: Seconds to wait for the reply. If not given, use the
+            ``timeout`` of the ``Connection``.
+        :type timeout: float
+
         :returns: A list of current workspaces
         :rtype: list(:class:`i3ipc.WorkspaceReply`)
         """
-        data = await self._message(MessageType.GET_WORKSPACES)
-        data = json.loads(data)
-        return WorkspaceReply._parse_list(data)
-
-    async def get_tree(self) -> Con:
+        return await self._get(MessageType.GET_WORKSPACES, '', WorkspaceReply._parse_list, raw,
+                               dict, timeout)
+
+    async def get_tree(self,
+                       raw: bool = False,
+                       dict: bool = False,
+                       timeout: Optional[float] = None,
+                       ipc_data: bool = True,
+                       lazy: bool = False) -> Con:
         """Gets the root container of the i3 layout tree.
 
+        :param raw: Return the payload of the reply as bytes without decoding it.
+        :type raw: bool
+        :param dict: Return the decoded JSON of the reply without building
+            reply objects.
+        :type dict: bool
+        :param timeout: Seconds to wait for the reply. If not given, use the
+            ``timeout`` of the ``Connection``.
+        :type timeout: float
+        :param ipc_data: Keep the decoded JSON of every container in its
+            ``ipc_data``. Pass ``False`` to save memory when the tree is kept
+            around, like for snapshots.
+        :type ipc_data: bool
+        :param lazy: Build the children and rects of a container the first
+            time they are read instead of building the whole tree up front.
+            This is faster for callers that only look at part of the tree,
+            like :func:`Con.find_focused() <i3ipc.Con.find_focused>`.
+        :type lazy: bool
+
         :returns: The root container of the i3 layout tree.
         :rtype: :class:`i3ipc.Con`
         """
-        data = await self._message(MessageType.GET_TREE)
-        return Con(json.loads(data), None, self)
-
-    async def get_marks(self) -> List[str]:
+        return await self._get(MessageType.GET_TREE, '',
+                               lambda data: Con(data, None, self, ipc_data, lazy), raw, dict,
+                               timeout)
+
+    async def get_marks(self,
+                        raw: bool = False,
+                        dict: bool = False,
+                        timeout: Optional[float] = None) -> List[str]:
         """Gets the names of all currently set marks.
 
+        :param raw: Return the payload of the reply as bytes without decoding it.
+        :type raw: bool
+        :param dict: Return the decoded JSON of the reply without building
+            reply objects.
+        :type dict: bool
+        :param timeout: Seconds to wait for the reply. If not given, use the
+            ``timeout`` of the ``Connection``.
+        :type timeout: float
+
         :returns: A list of currently set marks.
         :rtype: list(str)
         """
-        data = await self._message(MessageType.GET_MARKS)
-        return json.loads(data)
+        return await self._get(MessageType.GET_MARKS, '', None, raw, dict, timeout)
 
-    async def get_binding_modes(self) -> List[str]:
+    async def get_binding_modes(self,
+                                raw: bool = False,
+                                dict: bool = False,
+                                timeout: Optional[float] = None) -> List[str]:
         """Gets the names of all currently configured binding modes
 
+        :param raw: Return the payload of the reply as bytes without decoding it.
+        :type raw: bool
+        :param dict: Return the decoded JSON of the reply without building
+            reply objects.
+        :type dict: bool
+        :param timeout: Seconds to wait for the reply. If not given, use the
+            ``timeout`` of the ``Connection``.
+        :type timeout: float
+
         :returns: A list of binding modes
         :rtype: list(str)
         """
-        data = await self._message(MessageType.GET_BINDING_MODES)
-        return json.loads(data)
+        return await self._get(MessageType.GET_BINDING_MODES, '', None, raw, dict, timeout)
 
-    async def get_config(self) -> ConfigReply:
+    async def get_config(self,
+                         raw: bool = False,
+                         dict: bool = False,
+                         timeout: Optional[float] = None) -> ConfigReply:
         """Returns the last loaded i3 config.
 
+        :param raw: Return the payload of the reply as bytes without decoding it.
+        :type raw: bool
+        :param dict: Return the decoded JSON of the reply without building
+            reply objects.
+        :type dict: bool
+        :param timeout: Seconds to wait for the reply. If not given, use the
+            ``timeout`` of the ``Connection``.
+        :type timeout: float
+
         :returns: A class containing the config.
         :rtype: :class:`i3ipc.ConfigReply`
         """
-        data = await self._message(MessageType.GET_CONFIG)
-        data = json.loads(data)
-        return ConfigReply(data)
+        return await self._get(MessageType.GET_CONFIG, '', ConfigReply, raw, dict, timeout)
 
-    async def send_tick(self, payload: str = "") -> TickReply:
+    async def send_tick(self, payload: str = "", timeout: Optional[float] = None) -> TickReply:
         """Sends a tick with the specified payload.
 
+        :param timeout: Seconds to wait for the reply. If not given, use the
+            ``timeout`` of the ``Connection``.
+        :type timeout: float
+
         :returns: The reply to the tick command
         :rtype: :class:`i3ipc.TickReply`
         """
-        data = await self._message(MessageType.SEND_TICK, payload)
-        data = json.loads(data)
+        data = await self._message(MessageType.SEND_TICK, payload, timeout)
+        data = self._codec.loads(data)
         return TickReply(data)
 
-    async def get_inputs(self) -> List[InputReply]:
+    async def get_inputs(self,
+                         raw: bool = False,
+                         dict: bool = False,
+                         timeout: Optional[float] = None) -> List[InputReply]:
         """(sway only) Gets the inputs connected to the compositor.
 
+        :param raw: Return the payload of the reply as bytes without decoding it.
+        :type raw: bool
+        :param dict: Return the decoded JSON of the reply without building
+            reply objects.
+        :type dict: bool
+        :param timeout: Seconds to wait for the reply. If not given, use the
+            ``timeout`` of the ``Connection``.
+        :type timeout: float
+
         :returns: The reply to the inputs command
         :rtype: list(:class:`i3ipc.InputReply`)
         """
-        data = await self._message(MessageType.GET_INPUTS)
-        data = json.loads(data)
-        return InputReply._parse_list(data)
+        return await self._get(MessageType.GET_INPUTS, '', InputReply._parse_list, raw, dict,
+                               timeout)
 
-    async def get_seats(self) -> List[SeatReply]:
+    async def get_seats(self,
+                        raw: bool = False,
+                        dict: bool = False,
+                        timeout: Optional[float] = None) -> List[SeatReply]:
         """(sway only) Gets the seats configured on the compositor
 
+        :param raw: Return the payload of the reply as bytes without decoding it.
+        :type raw: bool
+        :param dict: Return the decoded JSON of the reply without building
+            reply objects.
+        :type dict: bool
+        :param timeout: Seconds to wait for the reply. If not given, use the
+            ``timeout`` of the ``Connection``.
+        :type timeout: float
+
         :returns: The reply to the seats command
         :rtype: list(:class:`i3ipc.SeatReply`)
         """
-        data = await self._message(MessageType.GET_SEATS)
-        data = json.loads(data)
-        return SeatReply._parse_list(data)
+        return await self._get(MessageType.GET_SEATS, '', SeatReply._parse_list, raw, dict, timeout)
 
     def main_quit(self, _error=None):
         """Quits the running main loop for this connection."""
@@ -0,0 +1,158 @@
+from .._private import TreeMirror, diff_trees
+from ..events import Event
+from .connection import Con
+from typing import List
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+_EVENTS = (Event.WINDOW, Event.WORKSPACE, Event.OUTPUT, Event.SHUTDOWN)
+
+
+class TreeCache:
+    """A copy of the layout tree that is kept up to date from the window and
+    workspace events, so scripts that look at the tree on every event do not
+    need a ``GET_TREE`` round trip each time.
+
+    The tree is gotten once, the first time :func:`get_tree()` is called.
+    Focus, title, mark, urgent, fullscreen and close events of windows and
+    focus, urgent and empty events of workspaces are then applied to it in
+    place. The other events, like new windows or ``output`` and ``shutdown``
+    events, change the tree in ways the event does not tell, so the tree is
+    gotten again the next time it is needed.
+
+    The structure, the focus and the properties of the containers are kept
+    up to date. The geometry and the layout of containers that were not in
+    an event may be out of date.
+
+    :Example:
+
+    .. code-block:: python3
+
+        i3 = await Connection().connect()
+        cache = TreeCache(i3)
+
+        async def on_binding(i3, e):
+            windows = (await cache.get_tree()).leaves()
+
+        i3.on(Event.BINDING, on_binding)
+        await i3.main()
+
+    :param conn: The connection to keep the tree of.
+    :type conn: :class:`Connection <i3ipc.aio.Connection>`
+    :param verify: Compare the tree with a new one from i3 every time it is
+        gotten and log the differences. This is slow and meant for debugging.
+    :type verify: bool
+
+    :ivar fetches: The number of times the tree was gotten from i3.
+    :vartype fetches: int
+    """
+    def __init__(self, conn, verify: bool = False):
+        self._conn = conn
+        self._verify = verify
+        self._lock = asyncio.Lock()
+        self._mirror = None
+        # the event socket the events of the tree come from. A new socket
+        # may have missed events.
+        self._protocol = None
+        # the events that came while a tree is gotten
+        self._pending = None
+        self.fetches = 0
+
+        for event in _EVENTS:
+            conn._on(event, self._on_event, inline=True)
+
+    def _apply(self, event):
+        try:
+            applied = self._mirror.apply(event)
+        except Exception as e:
+            logger.warning('could not apply the %s event to the tree', event.change, exc_info=e)
+            applied = False
+
+        if not applied:
+            self._mirror = None
+
+    def _on_event(self, conn, event):
+        if self._pending is not None:
+            # the reply may be older than the event, apply it to the new tree
+            self._pending.append(event)
+        elif self._mirror is not None:
+            self._apply(event)
+
+    async def _fetch(self):
+        self._pending = []
+        try:
+            tree = await self._conn.get_tree()
+            self.fetches += 1
+            return tree, self._pending
+        finally:
+            self._pending = None
+
+    def _apply_pending(self, pending):
+        for event in pending:
+            if self._mirror is None:
+                break
+            self._apply(event)
+
+    def _load(self, tree, pending):
+        self._mirror = TreeMirror(tree)
+        self._apply_pending(pending)
+        return tree if self._mirror is None else self._mirror.root
+
+    async def get_tree(self) -> Con:
+        """Gets the root container of the layout tree. The tree is updated in
+        place as events come in, so keep the root rather than containers in
+        it across events.
+
+        :rtype: :class:`Con <i3ipc.aio.Con>`
+        """
+        async with self._lock:
+            protocol = self._conn._sub_protocol
+            if protocol is None:
+                # no events are handled to keep the tree up to date
+                self._mirror = None
+                tree, _ = await self._fetch()
+                return tree
+
+            if self._mirror is None or self._protocol is not protocol:
+                self._protocol = protocol
+                return self._load(*await self._fetch())
+
+            if self._verify:
+                fresh, pending = await self._fetch()
+                differences = diff_trees(self._mirror.root, fresh)
+                if differences:
+                    logger.warning('the cached tree is out of date: %s', '; '.join(differences))
+                    return self._load(fresh, pending)
+                self._apply_pending(pending)
+                if self._mirror is None:
+                    return fresh
+
+            return self._mirror.root
+
+    async def verify(self) -> List[str]:
+        """Compares the cached tree with a new tree from i3. Differences are
+        expected while events are still on their way.
+
+        :returns: The differences, or an empty list if the trees match.
+        :rtype: list(str)
+        """
+        async with self._lock:
+            fresh, pending = await self._fetch()
+            if self._mirror is None:
+                return []
+
+            differences = diff_trees(self._mirror.root, fresh)
+            self._apply_pending(pending)
+            return differences
+
+    def invalidate(self):
+        """Drops the cached tree so the next :func:`get_tree()` gets a new
+        one."""
+        self._mirror = None
+
+    def close(self):
+        """Stops handling events and drops the cached tree."""
+        self._conn.off(self._on_event)
+        self.invalidate()
@@ -1,9 +1,25 @@
+import itertools
 import re
 import sys
 from .model import Rect, Gaps
 from . import replies
+from ._private import compile_criteria
 from collections import deque
-from typing import List, Optional
+from typing import Callable, Dict, Iterator, List, Optional
+
+_IPC_PROPERTIES = ('border', 'current_border_width', 'floating', 'focus', 'focused',
+                   'fullscreen_mode', 'id', 'layout', 'marks', 'name', 'num', 'orientation',
+                   'percent', 'scratchpad_state', 'shell', 'sticky', 'type', 'urgent', 'window',
+                   'pid', 'app_id', 'representation', 'visible')
+
+# properties that a lazy container builds when they are first read
+_LAZY_PROPERTIES = ('nodes', 'floating_nodes', 'rect', 'window_rect', 'deco_rect', 'geometry',
+                    'gaps')
+
+_MISSING = object()
+
+# properties with a handful of values that repeat on every node of the tree
+_INTERNED_PROPERTIES = ('type', 'layout', 'border', 'floating', 'orientation', 'scratchpad_state')
 
 
 class Con:
@@ -82,26 +98,43 @@ class Con:
     :ivar visible: (sway only)
     :vartype visible: bool
 
-    :ivar ipc_data: The raw data from the i3 ipc.
+    :ivar ipc_data: The raw data from the i3 ipc, or ``None`` if the tree
+        was gotten with ``ipc_data=False``.
     :vartype ipc_data: dict
+
+    The properties are stored in ``__slots__`` and the strings of properties
+    like ``type`` and ``layout`` are interned, so large trees take much less
+    memory. Containers have no ``__dict__``, so other attributes cannot be set
+    on them. Subclass ``Con`` to add attributes.
+
+    In a tree gotten with ``lazy=True``, the ``nodes``, ``floating_nodes``,
+    rects and gaps of a container are built from the ipc data the first time
+    they are read.
+
+    The ``find_*`` methods of the root container look containers up in a
+    :class:`TreeIndex` of the tree, built the first time one of them is
+    called.
     """
-    def __init__(self, data, parent, conn):
-        self.ipc_data = data
+    # the attributes set after __init__ are slots too: _lazy holds the data
+    # of a lazy container and _index the TreeIndex of the root
+    __slots__ = ('ipc_data', '_conn', 'parent', 'nodes', 'floating_nodes', 'window_class',
+                 'window_instance', 'window_role', 'window_title', 'rect', 'window_rect',
+                 'deco_rect', 'geometry', 'gaps', '_lazy', '_index',
+                 '__weakref__') + _IPC_PROPERTIES
+
+    def __init__(self, data, parent, conn, ipc_data=True, lazy=False):
+        self.ipc_data = data if ipc_data else None
         self._conn = conn
         self.parent = parent
 
         # set simple properties
-        ipc_properties = [
-            'border', 'current_border_width', 'floating', 'focus', 'focused', 'fullscreen_mode',
-            'id', 'layout', 'marks', 'name', 'num', 'orientation', 'percent', 'scratchpad_state',
-            'shell', 'sticky', 'type', 'urgent', 'window', 'pid', 'app_id', 'representation',
-            'visible'
-        ]
-        for attr in ipc_properties:
-            if attr in data:
-                setattr(self, attr, data[attr])
-            else:
-                setattr(self, attr, None)
+        for attr in _IPC_PROPERTIES:
+            setattr(self, attr, data.get(attr))
+
+        for attr in _INTERNED_PROPERTIES:
+            value = getattr(self, attr)
+            if value.__class__ is str:
+                setattr(self, attr, sys.intern(value))
 
         # XXX in 4.12, marks is an array (old property was a string "mark")
         if self.marks is None:
@@ -122,17 +155,6 @@ class Con:
             elif self.type == 5:
                 self.type = "dockarea"
 
-        # set complex properties
-        self.nodes = []
-        if 'nodes' in data:
-            for n in data['nodes']:
-                self.nodes.append(self.__class__(n, self, conn))
-
-        self.floating_nodes = []
-        if 'floating_nodes' in data:
-            for n in data['floating_nodes']:
-                self.floating_nodes.append(self.__class__(n, self, conn))
-
         self.window_class = None
         self.window_instance = None
         self.window_role = None
@@ -147,21 +169,55 @@ class Con:
             if 'title' in data['window_properties']:
                 self.window_title = data['window_properties']['title']
 
-        self.rect = Rect(data['rect'])
-        if 'window_rect' in data:
-            self.window_rect = Rect(data['window_rect'])
+        # set complex properties
+        # subclasses written for older versions may not take ipc_data or lazy
+        child_args = (conn, ipc_data, lazy) if lazy or not ipc_data else (conn, )
+
+        if lazy:
+            self._lazy = (data, child_args)
+            return
 
-        self.deco_rect = None
-        if 'deco_rect' in data:
-            self.deco_rect = Rect(data['deco_rect'])
+        for name in _LAZY_PROPERTIES:
+            value = self._build(name, data, child_args)
+            if value is not _MISSING:
+                setattr(self, name, value)
+
+    def _build(self, name, data, child_args):
+        if name == 'nodes' or name == 'floating_nodes':
+            return [self.__class__(n, self, *child_args) for n in data.get(name, ())]
+        if name == 'rect':
+            return Rect(data['rect'])
+        if name in data:
+            return Gaps(data[name]) if name == 'gaps' else Rect(data[name])
+        # i3 does not send window_rect for some containers
+        return _MISSING if name == 'window_rect' else None
+
+    def __getattr__(self, name):
+        # only called for the slots that are not set. The children and the
+        # rects of a lazy container are built here when they are first read.
+        if name in _LAZY_PROPERTIES:
+            try:
+                data, child_args = self._lazy
+            except AttributeError:
+                pass
+            else:
+                value = self._build(name, data, child_args)
+                if value is not _MISSING:
+                    setattr(self, name, value)
+                    return value
 
-        self.geometry = None
-        if 'geometry' in data:
-            self.geometry = Rect(data['geometry'])
+        raise AttributeError("'{}' object has no attribute '{}'".format(
+            self.__class__.__name__, name))
 
-        self.gaps = None
-        if 'gaps' in data:
-            self.gaps = Gaps(data['gaps'])
+    def _tree_index(self) -> Optional['TreeIndex']:
+        # the index of the tree when this is the root, built on first use
+        if self.parent is not None:
+            return None
+        try:
+            return self._index
+        except AttributeError:
+            self._index = TreeIndex(self)
+            return self._index
 
     def __iter__(self):
         """Iterate through the descendents of this node (breadth-first tree traversal)
@@ -232,13 +288,108 @@ class Con:
         :returns: A list of leaf descendants.
         :rtype: list(:class:`Con`)
         """
-        leaves = []
+        return list(self.iter_leaves())
+
+    def iter_descendants(self,
+                         order: str = 'bfs',
+                         max_depth: Optional[int] = None,
+                         prune: Optional[Callable[['Con'], bool]] = None) -> Iterator['Con']:
+        """Iterates through the child containers of this container. The tree
+        is walked as the containers are taken from the iterator, so a caller
+        that stops early does not visit the rest of it.
+
+        :Example:
+
+        .. code-block:: python3
+
+            # the first window of the regular workspaces
+            window = next((c for c in tree.iter_descendants(prune=Con.is_special)
+                           if c.window), None)
+
+        :param order: ``"bfs"`` for breadth-first order, like iterating the
+            container, or ``"dfs"`` for depth-first order where a container
+            comes right before its descendants.
+        :type order: str
+        :param max_depth: If given, do not go further down than this many
+            levels. The children of this container are at depth 1.
+        :type max_depth: int
+        :param prune: A function of a container that returns whether to skip
+            it along with all the containers under it, like
+            :func:`is_special`.
+        :type prune: :class:`Callable`
+
+        :returns: An iterator of descendants.
+        :rtype: iterator(:class:`Con`)
+        :raises ValueError: If the order is not ``"bfs"`` or ``"dfs"``.
+        """
+        if order not in ('bfs', 'dfs'):
+            raise ValueError('order must be "bfs" or "dfs", not {!r}'.format(order))
+
+        depth_first = order == 'dfs'
+
+        def children(con, depth):
+            nodes = [(c, depth) for c in itertools.chain(con.nodes, con.floating_nodes)]
+            if depth_first:
+                # the stack pops the last container first
+                nodes.reverse()
+            return nodes
+
+        def walk():
+            if depth_first:
+                stack = children(self, 1)
+                pop = stack.pop
+            else:
+                stack = deque(children(self, 1))
+                pop = stack.popleft
+
+            while stack:
+                con, depth = pop()
+                if prune is not None and prune(con):
+                    continue
+
+                yield con
+
+                if max_depth is None or depth < max_depth:
+                    stack.extend(children(con, depth + 1))
+
+        # the order is checked above rather than in the generator so a bad
+        # order raises when this is called
+        return walk()
+
+    def iter_leaves(self,
+                    order: str = 'bfs',
+                    prune: Optional[Callable[['Con'], bool]] = None) -> Iterator['Con']:
+        """Iterates through the leaf child containers of this container, like
+        :func:`leaves`, without building a list.
+
+        :param order: ``"bfs"`` or ``"dfs"``, see :func:`iter_descendants`.
+        :type order: str
+        :param prune: A function of a container that returns whether to skip
+            it along with all the containers under it.
+        :type prune: :class:`Callable`
+
+        :returns: An iterator of leaf descendants.
+        :rtype: iterator(:class:`Con`)
+        """
+        return (c for c in self.iter_descendants(order, prune=prune)
+                if not c.nodes and c.type == "con" and c.parent.type != "dockarea")
 
-        for c in self:
-            if not c.nodes and c.type == "con" and c.parent.type != "dockarea":
-                leaves.append(c)
+    def is_special(self) -> bool:
+        """Whether this is a container of i3 itself rather than of the
+        layout of the user: the ``__i3`` output that holds the scratchpad,
+        a workspace whose name starts with ``__`` like ``__i3_scratch``, or a
+        dockarea. Pass it as the ``prune`` of :func:`iter_descendants` to
+        skip them.
 
-        return leaves
+        :rtype: bool
+        """
+        if self.type == 'dockarea':
+            return True
+        if self.type == 'output':
+            return self.name == '__i3'
+        if self.type == 'workspace':
+            return self.name is not None and self.name.startswith('__')
+        return False
 
     def command(self, command: str) -> List[replies.CommandReply]:
         """Runs a command on this container.
@@ -260,14 +411,8 @@ class Con:
         :returns: A list of replies for each command that was executed.
         :rtype: list(:class:`CommandReply <i3ipc.CommandReply>`)
         """
-        if not len(self.nodes):
-            return
-
-        commands = []
-        for c in self.nodes:
-            commands.append('[con_id="{}"] {};'.format(c.id, command))
-
-        self._conn.command(' '.join(commands))
+        replies = self._conn.command_containers(self.nodes, command)
+        return [r for con_replies in replies for r in con_replies]
 
     def workspaces(self) -> List['Con']:
         """Gets a list of workspace containers for this tree.
@@ -295,6 +440,18 @@ class Con:
         :rtype: :class:`Con` or :class:`None` if the focused container is not
             under this container
         """
+        # follow the focus stacks first, which only builds the containers on
+        # the way in a lazy tree
+        con = self
+        while con.focus:
+            focus_id = con.focus[0]
+            con = next((c for c in itertools.chain(con.nodes, con.floating_nodes)
+                        if c.id == focus_id), None)
+            if con is None:
+                break
+            if con.focused:
+                return con
+
         try:
             return next(c for c in self if c.focused)
         except StopIteration:
@@ -307,6 +464,10 @@ class Con:
         :rtype: :class:`Con` or :class:`None` if there is no container with
             this container id.
         """
+        index = self._tree_index()
+        if index is not None:
+            return index.find_by_id(id)
+
         try:
             return next(c for c in self if c.id == id)
         except StopIteration:
@@ -318,6 +479,10 @@ class Con:
         :returns: A list of containers with this pid.
         :rtype: list(:class:`Con`)
         """
+        index = self._tree_index()
+        if index is not None:
+            return index.find_by_pid(pid)
+
         return [c for c in self if c.pid == pid]
 
     def find_by_window(self, window: int) -> Optional['Con']:
@@ -327,11 +492,66 @@ class Con:
         :rtype: :class:`Con` or :class:`None` if there is no container with
             this window id.
         """
+        index = self._tree_index()
+        if index is not None:
+            return index.find_by_window(window)
+
         try:
             return next(c for c in self if c.window == window)
         except StopIteration:
             return None
 
+    def query(self, criteria: str) -> Iterator['Con']:
+        """Finds the containers under this node that match an i3 criteria
+        expression like ``[class="^Firefox$" title="foo" floating
+        workspace="3"]``.
+
+        .. seealso:: https://i3wm.org/docs/userguide.html#command_criteria
+
+        The expression is compiled once and cached. The tree is searched in
+        breadth-first order as the containers are taken from the iterator,
+        so ``next(con.query(criteria), None)`` stops at the first match.
+
+        The ``class``, ``instance``, ``window_role``, ``title``, ``id``,
+        ``con_id``, ``con_mark``, ``workspace``, ``floating``, ``tiling``,
+        ``urgent`` and ``all`` criteria are supported, and ``app_id``,
+        ``pid`` and ``shell`` for sway. ``__focused__`` can be used as the
+        value where i3 allows it.
+
+        :returns: An iterator of the matching containers.
+        :rtype: iterator(:class:`Con`)
+        :raises ValueError: If the expression is not valid.
+        """
+        # compiled here rather than in the generator so a bad expression
+        # raises when query() is called
+        match = compile_criteria(criteria)
+
+        def search():
+            focused = self.root().find_focused() if match.uses_focused else None
+
+            floating = False
+            con = self
+            while con is not None and not floating:
+                floating = con.type == 'floating_con' or con.is_floating()
+                con = con.parent
+
+            queue = deque((c, self.workspace(), floating)
+                          for c in itertools.chain(self.nodes, self.floating_nodes))
+
+            while queue:
+                con, workspace, floating = queue.popleft()
+                if con.type == 'workspace':
+                    workspace = con
+                floating = floating or con.type == 'floating_con' or con.is_floating()
+
+                if match.matches(con, workspace, floating, focused):
+                    yield con
+
+                for child in itertools.chain(con.nodes, con.floating_nodes):
+                    queue.append((child, workspace, floating))
+
+        return search()
+
     def find_by_role(self, pattern: str) -> List['Con']:
         """Finds all the containers under this node with a window role that
         matches the given regex pattern.
@@ -340,7 +560,8 @@ class Con:
             pattern.
         :rtype: list(:class:`Con`)
         """
-        return [c for c in self if c.window_role and re.search(pattern, c.window_role)]
+        pattern = re.compile(pattern)
+        return [c for c in self if c.window_role and pattern.search(c.window_role)]
 
     def find_named(self, pattern: str) -> List['Con']:
         """Finds all the containers under this node with a name that
@@ -350,7 +571,8 @@ class Con:
             pattern.
         :rtype: list(:class:`Con`)
         """
-        return [c for c in self if c.name and re.search(pattern, c.name)]
+        pattern = re.compile(pattern)
+        return [c for c in self if c.name and pattern.search(c.name)]
 
     def find_titled(self, pattern: str) -> List['Con']:
         """Finds all the containers under this node with a window title that
@@ -360,7 +582,8 @@ class Con:
             the pattern.
         :rtype: list(:class:`Con`)
         """
-        return [c for c in self if c.window_title and re.search(pattern, c.window_title)]
+        pattern = re.compile(pattern)
+        return [c for c in self if c.window_title and pattern.search(c.window_title)]
 
     def find_classed(self, pattern: str) -> List['Con']:
         """Finds all the containers under this node with a window class,
@@ -370,8 +593,19 @@ class Con:
             app_id that matches the pattern.
         :rtype: list(:class:`Con`)
         """
-        x11_windows = [c for c in self if c.window_class and re.search(pattern, c.window_class)]
-        wayland_windows = [c for c in self if c.app_id and re.search(pattern, c.app_id)]
+        index = self._tree_index()
+        if index is not None:
+            return index.find_classed(pattern)
+
+        pattern = re.compile(pattern)
+        x11_windows = []
+        wayland_windows = []
+
+        for c in self:
+            if c.window_class and pattern.search(c.window_class):
+                x11_windows.append(c)
+            if c.app_id and pattern.search(c.app_id):
+                wayland_windows.append(c)
 
         return x11_windows + wayland_windows
 
@@ -383,7 +617,12 @@ class Con:
             pattern.
         :rtype: list(:class:`Con`)
         """
-        return [c for c in self if c.window_instance and re.search(pattern, c.window_instance)]
+        index = self._tree_index()
+        if index is not None:
+            return index.find_instanced(pattern)
+
+        pattern = re.compile(pattern)
+        return [c for c in self if c.window_instance and pattern.search(c.window_instance)]
 
     def find_marked(self, pattern: str = ".*") -> List['Con']:
         """Finds all the containers under this node with a mark that
@@ -393,6 +632,10 @@ class Con:
             pattern.
         :rtype: list(:class:`Con`)
         """
+        index = self._tree_index()
+        if index is not None:
+            return index.find_marked(pattern)
+
         pattern = re.compile(pattern)
         return [c for c in self if any(pattern.search(mark) for mark in c.marks)]
 
@@ -436,3 +679,100 @@ class Con:
                 return con
 
         return None
+
+
+class TreeIndex:
+    """Indexes the containers of a tree by their properties in a single pass
+    so lookups do not search the tree.
+
+    The ``find_*`` methods of the root :class:`Con <i3ipc.Con>` of a tree
+    build an index the first time one of them is called and use it from then
+    on. A tree gotten from :func:`Connection.get_tree()
+    <i3ipc.Connection.get_tree>` is a snapshot, so the index stays valid as
+    long as the tree is not changed.
+
+    Only the descendants of the root are indexed, like the ``find_*``
+    methods only search the descendants of the container. Lists of
+    containers are in breadth-first order.
+
+    :ivar by_id: The containers by their id.
+    :vartype by_id: dict(int, :class:`Con <i3ipc.Con>`)
+    :ivar by_window: The first container with the X11 window id.
+    :vartype by_window: dict(int, :class:`Con <i3ipc.Con>`)
+    :ivar by_pid: The containers by the pid of their window.
+    :vartype by_pid: dict(int, list(:class:`Con <i3ipc.Con>`))
+    :ivar by_mark: The container with the mark.
+    :vartype by_mark: dict(str, :class:`Con <i3ipc.Con>`)
+    :ivar by_class: The containers by their window class.
+    :vartype by_class: dict(str, list(:class:`Con <i3ipc.Con>`))
+    :ivar by_instance: The containers by their window instance.
+    :vartype by_instance: dict(str, list(:class:`Con <i3ipc.Con>`))
+    :ivar by_app_id: (sway only) The containers by their app id.
+    :vartype by_app_id: dict(str, list(:class:`Con <i3ipc.Con>`))
+    :ivar marked: The containers with at least one mark.
+    :vartype marked: list(:class:`Con <i3ipc.Con>`)
+    """
+    def __init__(self, root):
+        self.root = root
+        self.by_id = {}
+        self.by_window = {}
+        self.by_pid = {}
+        self.by_mark = {}
+        self.by_class = {}
+        self.by_instance = {}
+        self.by_app_id = {}
+        self.marked = []
+        # container -> breadth-first position, to merge lists in tree order
+        self._position = {}
+
+        for position, con in enumerate(root):
+            self._position[con] = position
+            self.by_id.setdefault(con.id, con)
+            self.by_window.setdefault(con.window, con)
+            self.by_pid.setdefault(con.pid, []).append(con)
+
+            if con.marks:
+                self.marked.append(con)
+                for mark in con.marks:
+                    self.by_mark.setdefault(mark, con)
+
+            if con.window_class:
+                self.by_class.setdefault(con.window_class, []).append(con)
+            if con.window_instance:
+                self.by_instance.setdefault(con.window_instance, []).append(con)
+            if con.app_id:
+                self.by_app_id.setdefault(con.app_id, []).append(con)
+
+    def _matching(self, groups: Dict[str, List], pattern) -> List:
+        pattern = re.compile(pattern)
+        matches = [cons for key, cons in groups.items() if pattern.search(key)]
+
+        if len(matches) == 1:
+            return list(matches[0])
+
+        return sorted(itertools.chain.from_iterable(matches), key=self._position.__getitem__)
+
+    def find_by_id(self, id: int) -> Optional[Con]:
+        """See :func:`Con.find_by_id() <i3ipc.Con.find_by_id>`."""
+        return self.by_id.get(id)
+
+    def find_by_window(self, window: int) -> Optional[Con]:
+        """See :func:`Con.find_by_window() <i3ipc.Con.find_by_window>`."""
+        return self.by_window.get(window)
+
+    def find_by_pid(self, pid: int) -> List[Con]:
+        """See :func:`Con.find_by_pid() <i3ipc.Con.find_by_pid>`."""
+        return list(self.by_pid.get(pid, ()))
+
+    def find_marked(self, pattern: str = ".*") -> List[Con]:
+        """See :func:`Con.find_marked() <i3ipc.Con.find_marked>`."""
+        pattern = re.compile(pattern)
+        return [c for c in self.marked if any(pattern.search(mark) for mark in c.marks)]
+
+    def find_classed(self, pattern: str) -> List[Con]:
+        """See :func:`Con.find_classed() <i3ipc.Con.find_classed>`."""
+        return self._matching(self.by_class, pattern) + self._matching(self.by_app_id, pattern)
+
+    def find_instanced(self, pattern: str) -> List[Con]:
+        """See :func:`Con.find_instanced() <i3ipc.Con.find_instanced>`."""
+        return self._matching(self.by_instance, pattern)
@@ -5,21 +5,37 @@ from .replies import (BarConfigReply, CommandReply, ConfigReply, OutputReply, Ti
                       VersionReply, WorkspaceReply, SeatReply, InputReply)
 from .events import (IpcBaseEvent, BarconfigUpdateEvent, BindingEvent, OutputEvent, ShutdownEvent,
                      WindowEvent, TickEvent, ModeEvent, WorkspaceEvent, InputEvent, Event)
-from ._private import PubSub, MessageType, EventType, Synchronizer
+from ._private import (PubSub, MessageType, EventType, Synchronizer, FrameParser, SocketPool,
+                       PoolStats, Reconnector, ReconnectStats, pack_commands, join_commands,
+                       map_replies, get_codec, discovery, OrderedExecutor,
+                       SubscriptionHandoff, is_handoff_marker)
+from .eventloop import EventLoop
 
-from typing import List, Optional, Union, Callable
+from typing import List, Optional, Union, Callable, Iterable, Hashable
 import struct
-import json
 import socket
-import os
-from threading import Timer, Lock
+from threading import Lock
 import time
 import logging
-from subprocess import run, PIPE
 
 logger = logging.getLogger(__name__)
 
 
+def _default_ordering(event, data):
+    # the events of a window are handled in order, other events in the order
+    # of their type
+    if isinstance(data, WindowEvent):
+        return data.container_id
+    return event
+
+
+class _ThreadedPubSub(PubSub):
+    def queue_handler(self, handler, event, data=None):
+        conn = self.conn
+        args = (conn, data) if data else (conn, )
+        conn._handler_executor.submit(conn._handler_ordering(event, data), handler, args)
+
+
 class Connection:
     """A connection to the i3 ipc used for querying window manager state and
     listening to events.
@@ -41,16 +57,53 @@ class Connection:
     :param auto_reconnect: Whether to attempt to reconnect if the connection to
         the socket is broken when i3 restarts.
     :type auto_reconnect: bool
+    :param reconnect_deadline: How long in seconds to wait for the socket to
+        come back when reconnecting.
+    :type reconnect_deadline: float
+    :param timeout: The default number of seconds to wait for the reply to a
+        request. If not given, wait as long as it takes.
+    :type timeout: float
+    :param cmd_pool_size: The number of sockets used for requests. Requests
+        from different threads are serialized on a single socket by default.
+        With a larger pool, up to ``cmd_pool_size`` threads can have a request
+        in flight at the same time.
+    :type cmd_pool_size: int
+    :param json_codec: The JSON codec used to decode replies and events:
+        ``"orjson"``, ``"ujson"``, ``"json"`` or an object with ``loads()`` and
+        ``dumps()`` methods. If not given, use the fastest codec that is
+        installed.
+    :type json_codec: str
+    :param handler_threads: The number of threads to run event handlers on.
+        If not given, handlers run one at a time on the thread of the event
+        loop and a slow handler delays every later event. With threads, the
+        loop keeps reading events while the handlers run.
+    :type handler_threads: int
+    :param handler_ordering: With ``handler_threads``, a function of the
+        event name and the event that returns the ordering key of the event.
+        Handlers of events with the same key run one at a time in the order
+        of the events. Handlers of events with different keys may run in
+        parallel. By default, window events are ordered per container and
+        other events per event type.
+    :type handler_ordering: :class:`Callable`
 
     :raises Exception: If the connection to i3 cannot be established.
     """
     _MAGIC = 'i3-ipc'  # safety string for i3-ipc
-    _chunk_size = 1024  # in bytes
-    _timeout = 0.5  # in seconds
     _struct_header = '=%dsII' % len(_MAGIC.encode('utf-8'))
     _struct_header_size = struct.calcsize(_struct_header)
-
-    def __init__(self, socket_path=None, auto_reconnect=False):
+    _max_command_payload = 65536  # in bytes
+    _event_read_size = 65536  # in bytes
+    _handoff_timeout = 5.0  # in seconds
+
+    def __init__(self,
+                 socket_path=None,
+                 auto_reconnect=False,
+                 cmd_pool_size=1,
+                 json_codec=None,
+                 reconnect_deadline=10.0,
+                 timeout=None,
+                 handler_threads: Optional[int] = None,
+                 handler_ordering: Optional[Callable[[str, IpcBaseEvent], Hashable]] = None):
 
         if socket_path:
             logger.info('using user provided socket path: %s', socket_path)
@@ -61,46 +114,70 @@ class Connection:
             raise Exception('Failed to retrieve the i3 or sway IPC socket path')
 
         self.subscriptions = 0
-        self._pubsub = PubSub(self)
+        self._codec = get_codec(json_codec)
+        if handler_threads:
+            self._pubsub = _ThreadedPubSub(self)
+            self._handler_executor = OrderedExecutor(handler_threads, self._handler_error)
+        else:
+            self._pubsub = PubSub(self)
+            self._handler_executor = None
+        self._handler_ordering = handler_ordering or _default_ordering
+        self._handler_exception = None
+        self._handler_lock = Lock()
         self._socket_path = socket_path
-        self._cmd_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        self._cmd_socket.connect(self._socket_path)
-        self._cmd_lock = Lock()
+        self._cmd_pool = SocketPool(self._socket_path, cmd_pool_size)
         self._sub_socket = None
+        self._sub_parser = None
+        self._sub_events = 0
         self._sub_lock = Lock()
+        self._handoff = None
+        self._handoff_parser = None
+        self._resubscribe_pending = False
+        self._event_loop = None
         self._auto_reconnect = auto_reconnect
+        self._reconnector = Reconnector(self._socket_path, reconnect_deadline)
+        self._timeout = timeout
+        self._timeouts = 0
+        self._timeouts_lock = Lock()
         self._quitting = False
         self._synchronizer = None
 
-    def _find_socket_path(self):
-        socket_path = os.environ.get("I3SOCK")
-        if socket_path:
-            logger.info('got socket path from I3SOCK env variable: %s', socket_path)
-            return socket_path
+    def _handler_error(self, e):
+        # called from a handler thread. The exception is raised from the
+        # event loop like the exceptions of handlers that run inline.
+        with self._handler_lock:
+            if self._handler_exception is None:
+                self._handler_exception = e
 
-        socket_path = os.environ.get("SWAYSOCK")
-        if socket_path:
-            logger.info('got socket path from SWAYSOCK env variable: %s', socket_path)
-            return socket_path
+        loop = self._event_loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self._raise_handler_exception)
+        else:
+            logger.error('an event handler raised an exception', exc_info=e)
 
-        for binary in ('i3', 'sway'):
-            try:
-                process = run([binary, '--get-socketpath'], stdout=PIPE, stderr=PIPE)
-                if process.returncode == 0 and process.stdout:
-                    socket_path = process.stdout.decode().strip()
-                    logger.info('got socket path from `%s` binary: %s', binary, socket_path)
-                    return socket_path
-                else:
-                    logger.info(
-                        'could not get socket path from `%s` binary: returncode=%d, stdout=%s, stderr=%s',
-                        process.returncode, process.stdout, process.stderr)
-
-            except Exception as e:
-                logger.info('could not get i3 socket path from `%s` binary', binary, exc_info=e)
-                continue
+    def _stop_handler_threads(self):
+        # called when the connection leaves its event loop. The handlers that
+        # were queued still run, and the threads are started again with the
+        # events of the next loop.
+        if self._handler_executor is not None:
+            self._handler_executor.shutdown(wait=False)
+
+    def _raise_handler_exception(self):
+        with self._handler_lock:
+            e = self._handler_exception
+            self._handler_exception = None
+
+        if e is not None:
+            raise e
+
+    def _call_later(self, delay, callback, *args):
+        # timers of the debounce and throttle limiters
+        if self._event_loop is None:
+            raise RuntimeError('debounced and throttled handlers need a running event loop')
+        self._event_loop.call_later(delay, callback, *args)
 
-        logger.info('could not find i3/sway socket path')
-        return None
+    def _find_socket_path(self):
+        return discovery.env_socket_path() or discovery.find_socket_path()
 
     def _sync(self):
         if self._synchronizer is None:
@@ -125,6 +202,39 @@ class Connection:
         """
         return self._auto_reconnect
 
+    @property
+    def cmd_pool_stats(self) -> PoolStats:
+        """Usage statistics of the pool of sockets used for requests: the pool
+        size (``size``), the number of ``open`` and ``in_use`` sockets, the
+        number of ``checkouts``, how many of them had to wait for a socket
+        (``waits``) with the total and longest wait in seconds (``wait_time``
+        and ``max_wait_time``), and the number of broken sockets that were
+        replaced (``reconnects``).
+
+        :rtype: PoolStats
+        """
+        return self._cmd_pool.stats()
+
+    @property
+    def reconnect_stats(self) -> ReconnectStats:
+        """Statistics of the reconnects of this ``Connection``: the number of
+        successful ``reconnects`` and of ``failures`` to reconnect before the
+        deadline, and the ``last_latency``, ``max_latency`` and
+        ``total_latency`` in seconds from losing the connection to being
+        connected again.
+
+        :rtype: ReconnectStats
+        """
+        return self._reconnector.stats()
+
+    @property
+    def timeouts(self) -> int:
+        """The number of requests that gave up waiting for a reply.
+
+        :rtype: int
+        """
+        return self._timeouts
+
     def _pack(self, msg_type, payload):
         """Packs the given message type and payload. Turns the resulting
         message into a byte string.
@@ -133,223 +243,495 @@ class Connection:
         s = struct.pack('=II', len(pb), msg_type.value)
         return self._MAGIC.encode('utf-8') + s + pb
 
-    def _unpack(self, data):
-        """Unpacks the given byte string and parses the result from JSON.
-        Returns None on failure and saves data into "self.buffer".
-        """
-        msg_magic, msg_length, msg_type = self._unpack_header(data)
-        msg_size = self._struct_header_size + msg_length
-        # XXX: Message shouldn't be any longer than the data
-        payload = data[self._struct_header_size:msg_size]
-        return payload.decode('utf-8', 'replace')
-
     def _unpack_header(self, data):
         """Unpacks the header of given byte string.
         """
         return struct.unpack(self._struct_header, data[:self._struct_header_size])
 
-    def _ipc_recv(self, sock):
-        data = sock.recv(14)
+    def _set_deadline(self, sock, deadline):
+        """Makes the next blocking call on the socket time out at
+        ``deadline`` (a :func:`time.monotonic` time)."""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise socket.timeout('timed out')
+        sock.settimeout(remaining)
+
+    def _recv_exactly(self, sock, size, deadline=None):
+        """Reads exactly ``size`` bytes from the socket into a preallocated
+        buffer. The returned buffer is shorter than ``size`` only if the socket
+        was closed before all the bytes arrived.
+        """
+        buf = bytearray(size)
+        view = memoryview(buf)
+        received = 0
+
+        while received < size:
+            if deadline is not None:
+                self._set_deadline(sock, deadline)
+            n = sock.recv_into(view[received:], size - received)
+            if n == 0:
+                break
+            received += n
 
-        if len(data) == 0:
+        view.release()
+
+        if received < size:
+            del buf[received:]
+
+        return buf
+
+    def _ipc_recv(self, sock, deadline=None):
+        header = self._recv_exactly(sock, self._struct_header_size, deadline)
+
+        if len(header) == 0:
             logger.info('got EOF from ipc socket')
-            return '', 0
+            return b'', 0
 
-        msg_magic, msg_length, msg_type = self._unpack_header(data)
+        if len(header) < self._struct_header_size:
+            raise ConnectionResetError('ipc socket closed while reading the message header')
+
+        msg_magic, msg_length, msg_type = self._unpack_header(header)
         logger.info('reading ipc message: type=%s, length=%s', msg_type, msg_length)
-        msg_size = self._struct_header_size + msg_length
-        while len(data) < msg_size:
-            data += sock.recv(msg_length)
-        payload = self._unpack(data)
+
+        payload = self._recv_exactly(sock, msg_length, deadline)
+
+        if len(payload) < msg_length:
+            raise ConnectionResetError(
+                'ipc socket closed while reading the message ({} bytes remaining)'.format(
+                    msg_length - len(payload)))
+
         logger.info('message payload: %s', payload)
         return payload, msg_type
 
-    def _ipc_send(self, sock, message_type, payload):
+    def _ipc_send(self, sock, message_type, payload, deadline=None):
         """Send and receive a message from the ipc.  NOTE: this is not thread
         safe
         """
         logger.info('sending to ipc socket: type=%s, payload=%s', message_type, payload)
+        if deadline is not None:
+            self._set_deadline(sock, deadline)
         sock.sendall(self._pack(message_type, payload))
-        data, msg_type = self._ipc_recv(sock)
+        data, msg_type = self._ipc_recv(sock, deadline)
+        if deadline is not None:
+            sock.settimeout(None)
         return data
 
-    def _wait_for_socket(self):
-        # for the auto_reconnect feature only
-        socket_path_exists = False
-        for tries in range(0, 500):
-            socket_path_exists = os.path.exists(self._socket_path)
-            if socket_path_exists:
-                break
-            time.sleep(0.001)
+    def _wait_for_socket(self, since=None):
+        # for the auto_reconnect feature only. The deadline counts from
+        # when the connection was lost.
+        if since is None:
+            return self._reconnector.wait()
+        deadline = self._reconnector.deadline - (time.monotonic() - since)
+        return self._reconnector.wait(deadline)
 
-        return socket_path_exists
+    def _message(self, message_type, payload, timeout=None):
+        if timeout is None:
+            timeout = self._timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
 
-    def _message(self, message_type, payload):
         try:
-            self._cmd_lock.acquire()
-            return self._ipc_send(self._cmd_socket, message_type, payload)
-        except ConnectionError as e:
+            return self._deadline_message(message_type, payload, deadline)
+        except (socket.timeout, TimeoutError) as e:
+            with self._timeouts_lock:
+                self._timeouts += 1
+            raise TimeoutError('no reply to {} in {} seconds'.format(message_type,
+                                                                     timeout)) from e
+
+    def _deadline_message(self, message_type, payload, deadline):
+        try:
+            sock = self._cmd_pool.checkout(self._remaining(deadline))
+            data = self._pooled_send(sock, message_type, payload, deadline)
+        except (ConnectionError, FileNotFoundError) as e:
             if not self.auto_reconnect:
                 raise e
 
             logger.info('got a connection error, reconnecting', exc_info=e)
+            start = time.monotonic()
             # XXX: can the socket path change between restarts?
-            if not self._wait_for_socket():
-                logger.info('could not reconnect')
+            if not self._wait_for_socket(start):
+                self._reconnector.record_failure()
                 raise e
 
-            self._cmd_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-            self._cmd_socket.connect(self._socket_path)
-            return self._ipc_send(self._cmd_socket, message_type, payload)
-        finally:
-            self._cmd_lock.release()
+            sock = self._cmd_pool.checkout(self._remaining(deadline))
+            self._reconnector.record(time.monotonic() - start)
+            data = self._pooled_send(sock, message_type, payload, deadline)
 
-    def command(self, payload: str) -> List[CommandReply]:
+        return data
+
+    def _remaining(self, deadline):
+        if deadline is None:
+            return None
+        return max(deadline - time.monotonic(), 0)
+
+    def _pooled_send(self, sock, message_type, payload, deadline=None):
+        # the socket goes back to the pool only after a complete request. A
+        # socket that timed out may still get the reply later, so it is
+        # closed to keep the framing in sync.
+        try:
+            data = self._ipc_send(sock, message_type, payload, deadline)
+        except BaseException:
+            self._cmd_pool.discard(sock)
+            raise
+
+        if data:
+            self._cmd_pool.checkin(sock)
+        else:
+            # EOF, i3 closes the socket when it restarts
+            self._cmd_pool.discard(sock)
+
+        return data
+
+    def _get(self, message_type, payload, parse, raw, decode, timeout):
+        if raw and decode:
+            raise ValueError('raw and dict cannot be used together')
+
+        data = self._message(message_type, payload, timeout)
+
+        if raw:
+            return bytes(data)
+
+        data = self._codec.loads(data)
+
+        if decode or parse is None:
+            return data
+
+        return parse(data)
+
+    def command(self, payload: str, timeout: Optional[float] = None) -> List[CommandReply]:
         """Sends a command to i3.
 
         .. seealso:: https://i3wm.org/docs/userguide.html#list_of_commands
 
         :param cmd: The command to send to i3.
         :type cmd: str
+        :param timeout: Seconds to wait for the reply. If not given, use the
+            ``timeout`` of the ``Connection``.
+        :type timeout: float
         :returns: A list of replies that contain info for the result of each
             command given.
         :rtype: list(:class:`CommandReply <i3ipc.CommandReply>`)
         """
-        data = self._message(MessageType.COMMAND, payload)
+        data = self._message(MessageType.COMMAND, payload, timeout)
         if data:
-            data = json.loads(data)
+            data = self._codec.loads(data)
             return CommandReply._parse_list(data)
         else:
             return []
 
-    def get_version(self) -> VersionReply:
+    def command_batch(self,
+                      commands: List[str],
+                      max_payload: int = None,
+                      timeout: Optional[float] = None) -> List[List[CommandReply]]:
+        """Sends many commands to i3 in as few messages as possible.
+
+        The commands are joined into command strings of at most
+        ``max_payload`` bytes so a batch normally takes a single round trip.
+        Each command is run with its own criteria like separate calls to
+        :func:`command()`.
+
+        :param commands: The commands to send to i3.
+        :type commands: list(str)
+        :param max_payload: The maximum size in bytes of a single message.
+        :type max_payload: int
+        :param timeout: Seconds to wait for the replies to the whole batch. If
+            not given, use the ``timeout`` of the ``Connection``.
+        :type timeout: float
+        :returns: The replies for each command in the order they were given.
+            If a command fails to parse, i3 skips the commands after it in
+            the same message and they get an empty list of replies.
+        :rtype: list(list(:class:`CommandReply <i3ipc.CommandReply>`))
+        """
+        if timeout is None:
+            timeout = self._timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        result = []
+
+        for group in pack_commands(commands, max_payload or self._max_command_payload):
+            group_commands = [commands[i] for i in group]
+            replies = self.command(join_commands(group_commands), self._remaining(deadline))
+            result.extend(map_replies(group_commands, replies))
+
+        return result
+
+    def command_containers(self,
+                           containers: Iterable[Con],
+                           command: str,
+                           timeout: Optional[float] = None) -> List[List[CommandReply]]:
+        """Runs a command on each of the given containers with
+        :func:`command_batch()`.
+
+        :param containers: The containers to run the command on.
+        :type containers: list(:class:`Con <i3ipc.Con>`)
+        :param command: The command to run on each container.
+        :type command: str
+        :param timeout: Seconds to wait for all the replies. If not given, use
+            the ``timeout`` of the ``Connection``.
+        :type timeout: float
+        :returns: The replies for the command on each container.
+        :rtype: list(list(:class:`CommandReply <i3ipc.CommandReply>`))
+        """
+        return self.command_batch(['[con_id="{}"] {}'.format(c.id, command) for c in containers],
+                                  timeout=timeout)
+
+    def get_version(self,
+                    raw: bool = False,
+                    dict: bool = False,
+                    timeout: Optional[float] = None) -> VersionReply:
         """Gets the i3 version.
 
+        :param raw: Return the payload of the reply as bytes without decoding it.
+        :type raw: bool
+        :param dict: Return the decoded JSON of the reply without building
+            reply objects.
+        :type dict: bool
+        :param timeout: Seconds to wait for the reply. If not given, use the
+            ``timeout`` of the ``Connection``.
+        :type timeout: float
+
         :returns: The i3 version.
         :rtype: :class:`i3ipc.VersionReply`
         """
-        data = self._message(MessageType.GET_VERSION, '')
-        data = json.loads(data)
-        return VersionReply(data)
+        return self._get(MessageType.GET_VERSION, '', VersionReply, raw, dict, timeout)
 
-    def get_bar_config(self, bar_id: str = None) -> Optional[BarConfigReply]:
+    def get_bar_config(self,
+                       bar_id: str = None,
+                       raw: bool = False,
+                       dict: bool = False,
+                       timeout: Optional[float] = None) -> Optional[BarConfigReply]:
         """Gets the bar configuration specified by the id.
 
         :param bar_id: The bar id to get the configuration for. If not given,
             get the configuration for the first bar id.
         :type bar_id: str
+        :param raw: Return the payload of the reply as bytes without decoding it.
+        :type raw: bool
+        :param dict: Return the decoded JSON of the reply without building
+            reply objects.
+        :type dict: bool
+        :param timeout: Seconds to wait for the reply. If not given, use the
+            ``timeout`` of the ``Connection``.
+        :type timeout: float
 
         :returns: The bar configuration for the bar id.
         :rtype: :class:`BarConfigReply <i3ipc.BarConfigReply>` or :class:`None`
             if no bar configuration is found.
         """
         if not bar_id:
-            bar_config_list = self.get_bar_config_list()
+            bar_config_list = self.get_bar_config_list(timeout=timeout)
             if not bar_config_list:
                 return None
             bar_id = bar_config_list[0]
 
-        data = self._message(MessageType.GET_BAR_CONFIG, bar_id)
-        data = json.loads(data)
-        return BarConfigReply(data)
+        return self._get(MessageType.GET_BAR_CONFIG, bar_id, BarConfigReply, raw, dict, timeout)
 
-    def get_bar_config_list(self) -> List[str]:
+    def get_bar_config_list(self,
+                            raw: bool = False,
+                            dict: bool = False,
+                            timeout: Optional[float] = None) -> List[str]:
         """Gets the names of all bar configurations.
 
+        :param raw: Return the payload of the reply as bytes without decoding it.
+        :type raw: bool
+        :param dict: Return the decoded JSON of the reply without building
+            reply objects.
+        :type dict: bool
+        :param timeout: Seconds to wait for the reply. If not given, use the
+            ``timeout`` of the ``Connection``.
+        :type timeout: float
+
         :returns: A list of all bar configurations.
         :rtype: list(str)
         """
-        data = self._message(MessageType.GET_BAR_CONFIG, '')
-        return json.loads(data)
+        return self._get(MessageType.GET_BAR_CONFIG, '', None, raw, dict, timeout)
 
-    def get_outputs(self) -> List[OutputReply]:
+    def get_outputs(self,
+                    raw: bool = False,
+                    dict: bool = False,
+                    timeout: Optional[float] = None) -> List[OutputReply]:
         """Gets the list of current outputs.
 
+        :param raw: Return the payload of the reply as bytes without decoding it.
+        :type raw: bool
+        :param dict: Return the decoded JSON of the reply without building
+            reply objects.
+        :type dict: bool
+        :param timeout: Seconds to wait for the reply. If not given, use the
+            ``timeout`` of the ``Connection``.
+        :type timeout: float
+
         :returns: A list of current outputs.
         :rtype: list(:class:`i3ipc.OutputReply`)
         """
-        data = self._message(MessageType.GET_OUTPUTS, '')
-        data = json.loads(data)
-        return OutputReply._parse_list(data)
+        return self._get(MessageType.GET_OUTPUTS, '', OutputReply._parse_list, raw, dict, timeout)
 
-    def get_inputs(self) -> List[InputReply]:
+    def get_inputs(self,
+                   raw: bool = False,
+                   dict: bool = False,
+                   timeout: Optional[float] = None) -> List[InputReply]:
         """(sway only) Gets the inputs connected to the compositor.
 
+        :param raw: Return the payload of the reply as bytes without decoding it.
+        :type raw: bool
+        :param dict: Return the decoded JSON of the reply without building
+            reply objects.
+        :type dict: bool
+        :param timeout: Seconds to wait for the reply. If not given, use the
+            ``timeout`` of the ``Connection``.
+        :type timeout: float
+
         :returns: The reply to the inputs command
         :rtype: list(:class:`i3ipc.InputReply`)
         """
-        data = self._message(MessageType.GET_INPUTS, '')
-        data = json.loads(data)
-        return InputReply._parse_list(data)
+        return self._get(MessageType.GET_INPUTS, '', InputReply._parse_list, raw, dict, timeout)
 
-    def get_seats(self) -> List[SeatReply]:
+    def get_seats(self,
+                  raw: bool = False,
+                  dict: bool = False,
+                  timeout: Optional[float] = None) -> List[SeatReply]:
         """(sway only) Gets the seats configured on the compositor
 
+        :param raw: Return the payload of the reply as bytes without decoding it.
+        :type raw: bool
+        :param dict: Return the decoded JSON of the reply without building
+            reply objects.
+        :type dict: bool
+        :param timeout: Seconds to wait for the reply. If not given, use the
+            ``timeout`` of the ``Connection``.
+        :type timeout: float
+
         :returns: The reply to the seats command
         :rtype: list(:class:`i3ipc.SeatReply`)
         """
-        data = self._message(MessageType.GET_SEATS, '')
-        data = json.loads(data)
-        return SeatReply._parse_list(data)
+        return self._get(MessageType.GET_SEATS, '', SeatReply._parse_list, raw, dict, timeout)
 
-    def get_workspaces(self) -> List[WorkspaceReply]:
+    def get_workspaces(self,
+                       raw: bool = False,
+                       dict: bool = False,
+                       timeout: Optional[float] = None) -> List[WorkspaceReply]:
         """Gets the list of current workspaces.
 
+        :param raw: Return the payload of the reply as bytes without decoding it.
+        :type raw: bool
+        :param dict: Return the decoded JSON of the reply without building
+            reply objects.
+        :type dict: bool
+        :param timeout: Seconds to wait for the reply. If not given, use the
+            ``timeout`` of the ``Connection``.
+        :type timeout: float
+
         :returns: A list of current workspaces
         :rtype: list(:class:`i3ipc.WorkspaceReply`)
         """
-        data = self._message(MessageType.GET_WORKSPACES, '')
-        data = json.loads(data)
-        return WorkspaceReply._parse_list(data)
-
-    def get_tree(self) -> Con:
+        return self._get(MessageType.GET_WORKSPACES, '', WorkspaceReply._parse_list, raw, dict,
+                         timeout)
+
+    def get_tree(self,
+                 raw: bool = False,
+                 dict: bool = False,
+                 timeout: Optional[float] = None,
+                 ipc_data: bool = True,
+                 lazy: bool = False) -> Con:
         """Gets the root container of the i3 layout tree.
 
+        :param raw: Return the payload of the reply as bytes without decoding it.
+        :type raw: bool
+        :param dict: Return the decoded JSON of the reply without building
+            reply objects.
+        :type dict: bool
+        :param timeout: Seconds to wait for the reply. If not given, use the
+            ``timeout`` of the ``Connection``.
+        :type timeout: float
+        :param ipc_data: Keep the decoded JSON of every container in its
+            ``ipc_data``. Pass ``False`` to save memory when the tree is kept
+            around, like for snapshots.
+        :type ipc_data: bool
+        :param lazy: Build the children and rects of a container the first
+            time they are read instead of building the whole tree up front.
+            This is faster for callers that only look at part of the tree,
+            like :func:`Con.find_focused() <i3ipc.Con.find_focused>`.
+        :type lazy: bool
+
         :returns: The root container of the i3 layout tree.
         :rtype: :class:`i3ipc.Con`
         """
-        data = self._message(MessageType.GET_TREE, '')
-        return Con(json.loads(data), None, self)
+        return self._get(MessageType.GET_TREE, '',
+                         lambda data: Con(data, None, self, ipc_data, lazy), raw, dict, timeout)
 
-    def get_marks(self) -> List[str]:
+    def get_marks(self,
+                  raw: bool = False,
+                  dict: bool = False,
+                  timeout: Optional[float] = None) -> List[str]:
         """Gets the names of all currently set marks.
 
+        :param raw: Return the payload of the reply as bytes without decoding it.
+        :type raw: bool
+        :param dict: Return the decoded JSON of the reply without building
+            reply objects.
+        :type dict: bool
+        :param timeout: Seconds to wait for the reply. If not given, use the
+            ``timeout`` of the ``Connection``.
+        :type timeout: float
+
         :returns: A list of currently set marks.
         :rtype: list(str)
         """
-        data = self._message(MessageType.GET_MARKS, '')
-        return json.loads(data)
+        return self._get(MessageType.GET_MARKS, '', None, raw, dict, timeout)
 
-    def get_binding_modes(self) -> List[str]:
+    def get_binding_modes(self,
+                          raw: bool = False,
+                          dict: bool = False,
+                          timeout: Optional[float] = None) -> List[str]:
         """Gets the names of all currently configured binding modes
 
+        :param raw: Return the payload of the reply as bytes without decoding it.
+        :type raw: bool
+        :param dict: Return the decoded JSON of the reply without building
+            reply objects.
+        :type dict: bool
+        :param timeout: Seconds to wait for the reply. If not given, use the
+            ``timeout`` of the ``Connection``.
+        :type timeout: float
+
         :returns: A list of binding modes
         :rtype: list(str)
         """
-        data = self._message(MessageType.GET_BINDING_MODES, '')
-        return json.loads(data)
+        return self._get(MessageType.GET_BINDING_MODES, '', None, raw, dict, timeout)
 
-    def get_config(self) -> ConfigReply:
+    def get_config(self,
+                   raw: bool = False,
+                   dict: bool = False,
+                   timeout: Optional[float] = None) -> ConfigReply:
         """Returns the last loaded i3 config.
 
+        :param raw: Return the payload of the reply as bytes without decoding it.
+        :type raw: bool
+        :param dict: Return the decoded JSON of the reply without building
+            reply objects.
+        :type dict: bool
+        :param timeout: Seconds to wait for the reply. If not given, use the
+            ``timeout`` of the ``Connection``.
+        :type timeout: float
+
         :returns: A class containing the config.
         :rtype: :class:`i3ipc.ConfigReply`
         """
-        data = self._message(MessageType.GET_CONFIG, '')
-        data = json.loads(data)
-        return ConfigReply(data)
+        return self._get(MessageType.GET_CONFIG, '', ConfigReply, raw, dict, timeout)
 
-    def send_tick(self, payload: str = "") -> TickReply:
+    def send_tick(self, payload: str = "", timeout: Optional[float] = None) -> TickReply:
         """Sends a tick with the specified payload.
 
+        :param timeout: Seconds to wait for the reply. If not given, use the
+            ``timeout`` of the ``Connection``.
+        :type timeout: float
+
         :returns: The reply to the tick command
         :rtype: :class:`i3ipc.TickReply`
         """
-        data = self._message(MessageType.SEND_TICK, payload)
-        data = json.loads(data)
+        data = self._message(MessageType.SEND_TICK, payload, timeout)
+        data = self._codec.loads(data)
         return TickReply(data)
 
-    def _subscribe(self, events):
+    def _event_names(self, events):
         events_obj = []
         if events & EventType.WORKSPACE.value:
             events_obj.append("workspace")
@@ -369,13 +751,18 @@ class Connection:
             events_obj.append("tick")
         if events & EventType.INPUT.value:
             events_obj.append("input")
+        return events_obj
+
+    def _subscribe(self, events):
+        events_obj = self._event_names(events)
 
         try:
             self._sub_lock.acquire()
-            data = self._ipc_send(self._sub_socket, MessageType.SUBSCRIBE, json.dumps(events_obj))
+            data = self._ipc_send(self._sub_socket, MessageType.SUBSCRIBE,
+                                  self._codec.dumps(events_obj))
         finally:
             self._sub_lock.release()
-        data = json.loads(data)
+        data = self._codec.loads(data)
         result = CommandReply(data)
         self.subscriptions |= events
         return result
@@ -383,17 +770,147 @@ class Connection:
     def off(self, handler: Callable[['Connection', IpcBaseEvent], None]):
         """Unsubscribe the handler from being called on ipc events.
 
+        When the last handler of an event is removed while the connection is
+        in an event loop, the events move to a new subscription socket
+        without that event, so i3 stops sending it.
+
+        The move is synchronized with a tick that i3 sends to every client
+        subscribed to ticks, including other programs. Its payload starts
+        with ``i3ipc-handoff-`` and connections of this library do not pass
+        it to their tick handlers. The new socket is always subscribed to
+        ticks for the next move.
+
         :param handler: The handler that was previously attached with
             :func:`on()`.
         :type handler: :class:`Callable`
         """
-        self._pubsub.unsubscribe(handler)
+        unused = self._pubsub.unsubscribe(handler)
+        unused.discard('ipc_shutdown')
+
+        if not unused:
+            return
+
+        for event in unused:
+            self.subscriptions &= ~EventType.from_string(event).value
+
+        loop = self._event_loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self._resubscribe)
+
+    def _resubscribe(self):
+        # runs on the event loop thread
+        if self._handoff is not None:
+            self._resubscribe_pending = True
+            return
+
+        loop = self._event_loop
+        if loop is None or self._sub_socket is None:
+            return
+
+        # the tick subscription is kept for the handoffs
+        events = self.subscriptions | EventType.TICK.value
+        if not self._sub_events & ~events:
+            return
+
+        logger.info('moving the events to a socket subscribed to %s', self._event_names(events))
+        old_acked = bool(self._sub_events & EventType.TICK.value)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+        try:
+            sock.connect(self._socket_path)
+            sock.sendall(
+                self._pack(MessageType.SUBSCRIBE, self._codec.dumps(self._event_names(events))))
+            if not old_acked:
+                self._sub_socket.sendall(
+                    self._pack(MessageType.SUBSCRIBE, self._codec.dumps(['tick'])))
+        except OSError as e:
+            logger.info('could not subscribe a new socket', exc_info=e)
+            sock.close()
+            return
+
+        self._handoff = SubscriptionHandoff(self._codec.loads, old_acked, events, sock)
+        self._handoff_parser = FrameParser()
+        self._handoff.timer = loop.call_later(self._handoff_timeout, self._abort_handoff)
+        loop.add_reader(sock, self._handoff_read)
+
+    def _handoff_read(self):
+        handoff = self._handoff
+
+        try:
+            data = handoff.transport.recv(self._event_read_size)
+        except OSError:
+            data = b''
+
+        if not data:
+            self._abort_handoff()
+            return
+
+        self._handoff_parser.feed(data)
+        for msg_type, payload in self._handoff_parser.frames():
+            if handoff.new_message(msg_type, payload):
+                self._dispatch_event(msg_type, payload)
+
+        if handoff.done:
+            self._finish_handoff()
+        else:
+            self._handoff_check_ready()
+
+    def _handoff_check_ready(self):
+        handoff = self._handoff
+        if handoff is None or not handoff.ready:
+            return
+
+        handoff.marker_sent = True
+        try:
+            self.send_tick(handoff.marker)
+        except (OSError, TimeoutError) as e:
+            logger.info('could not send the handoff marker', exc_info=e)
+            self._abort_handoff()
+
+    def _finish_handoff(self):
+        handoff, self._handoff = self._handoff, None
+        handoff.timer.cancel()
+
+        loop = self._event_loop
+        loop.remove_reader(handoff.transport)
+        loop._unregister(self)
+
+        self._sub_socket.close()
+        self._sub_socket = handoff.transport
+        self._sub_parser = self._handoff_parser
+        self._sub_events = handoff.events
+        self._handoff_parser = None
+        loop._connected(self)
+        logger.info('moved the events to the new socket')
+
+        for msg_type, payload in handoff.held:
+            self._dispatch_event(msg_type, payload)
+
+        if self._resubscribe_pending:
+            self._resubscribe_pending = False
+            self._resubscribe()
+
+    def _abort_handoff(self):
+        handoff, self._handoff = self._handoff, None
+        if handoff is None:
+            return
+
+        logger.info('could not move the events to a new socket, keeping the old one')
+        handoff.timer.cancel()
+        if self._event_loop is not None:
+            self._event_loop.remove_reader(handoff.transport)
+        handoff.transport.close()
+        self._handoff_parser = None
+        self._resubscribe_pending = False
 
     def on(self,
            event: Union[Event, str],
-           handler: Callable[['Connection', IpcBaseEvent], None] = None):
+           handler: Callable[['Connection', IpcBaseEvent], None] = None,
+           debounce: Optional[float] = None,
+           throttle: Optional[float] = None,
+           coalesce_by: Union[str, Callable[[IpcBaseEvent], Hashable], None] = None):
         def on_wrapped(handler):
-            self._on(event, handler)
+            self._on(event, handler, debounce, throttle, coalesce_by)
             return handler
 
         if handler:
@@ -401,14 +918,41 @@ class Connection:
         else:
             return on_wrapped
 
-    def _on(self, event: Union[Event, str], handler: Callable[['Connection', IpcBaseEvent], None]):
+    def _on(self,
+            event: Union[Event, str],
+            handler: Callable[['Connection', IpcBaseEvent], None],
+            debounce: Optional[float] = None,
+            throttle: Optional[float] = None,
+            coalesce_by: Union[str, Callable[[IpcBaseEvent], Hashable], None] = None,
+            inline: bool = False):
         """Subscribe to the event and call the handler when it is emitted by
         the i3 ipc.
 
+        Storms of events, like the ``window::title`` events of a terminal,
+        can be thinned out with ``debounce`` or ``throttle``. The events are
+        grouped by ``coalesce_by`` and only the latest event of a group
+        reaches the handler.
+
         :param event: The event to subscribe to.
         :type event: :class:`Event <i3ipc.Event>` or str
         :param handler: The event handler to call.
         :type handler: :class:`Callable`
+        :param debounce: Call the handler with the latest event of a group
+            once no event came for ``debounce`` milliseconds.
+        :type debounce: float
+        :param throttle: Call the handler with the first event of a group
+            right away, then at most once every ``throttle`` milliseconds
+            with the latest event.
+        :type throttle: float
+        :param coalesce_by: What groups the events: a dotted attribute path
+            of the event like ``"container_id"`` or a function of the event.
+            If not given, all the events of this subscription are one group.
+        :type coalesce_by: str or :class:`Callable`
+        :param inline: Call the handler from the loop as soon as the event is
+            read, in the order of the events, instead of passing it to the
+            handler threads or the scheduler. Used by :class:`TreeCache
+            <i3ipc.TreeCache>`.
+        :type inline: bool
         """
         if type(event) is Event:
             event = event.value
@@ -451,18 +995,27 @@ class Connection:
 
         self.subscriptions |= event_type.value
 
-        self._pubsub.subscribe(event, handler)
+        self._pubsub.subscribe(event, handler, debounce, throttle, coalesce_by, inline)
 
     def _event_socket_setup(self):
         self._sub_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
         self._sub_socket.connect(self._socket_path)
+        self._sub_parser = FrameParser()
 
         self._subscribe(self.subscriptions)
+        self._sub_events = self.subscriptions
 
     def _event_socket_teardown(self):
+        self._abort_handoff()
+
         if self._sub_socket:
-            self._sub_socket.shutdown(socket.SHUT_RDWR)
+            try:
+                self._sub_socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                # the socket never connected
+                pass
         self._sub_socket = None
+        self._sub_parser = None
 
     def _event_socket_poll(self):
         if self._sub_socket is None:
@@ -476,41 +1029,78 @@ class Connection:
             self._pubsub.emit('ipc_shutdown', None)
             return True
 
-        data = json.loads(data)
+        self._dispatch_event(msg_type, data)
+
+    def _event_socket_read(self):
+        """Reads what is available on the event socket without blocking and
+        emits the events that are complete. Returns whether the socket was
+        closed.
+        """
+        data = self._sub_socket.recv(self._event_read_size)
+
+        if not data:
+            logger.info('subscription socket got EOF, shutting down')
+            self._pubsub.emit('ipc_shutdown', None)
+            return True
+
+        self._sub_parser.feed(data)
+
+        for msg_type, payload in self._sub_parser.frames():
+            handoff = self._handoff
+            if handoff is not None and not handoff.old_message(msg_type, payload):
+                if handoff.old_done:
+                    # the rest of the events come from the new socket
+                    if handoff.done:
+                        self._finish_handoff()
+                    return False
+                continue
+
+            self._dispatch_event(msg_type, payload)
+            if self._quitting:
+                break
+
+        self._handoff_check_ready()
+        return False
+
+    def _dispatch_event(self, msg_type, data):
+        if not msg_type & (1 << 31):
+            # a reply to a subscription made by a handoff
+            return
+
         msg_type = 1 << (msg_type & 0x7f)
-        event_name = ''
-        event = None
+
+        try:
+            event_name = EventType(msg_type).to_string()
+        except ValueError:
+            # we have not implemented this event
+            return
+
+        if not self._pubsub.wants(event_name, data):
+            return
+
+        data = self._codec.loads(data)
 
         if msg_type == EventType.WORKSPACE.value:
-            event_name = 'workspace'
             event = WorkspaceEvent(data, self)
         elif msg_type == EventType.OUTPUT.value:
-            event_name = 'output'
             event = OutputEvent(data)
         elif msg_type == EventType.MODE.value:
-            event_name = 'mode'
             event = ModeEvent(data)
         elif msg_type == EventType.WINDOW.value:
-            event_name = 'window'
             event = WindowEvent(data, self)
         elif msg_type == EventType.BARCONFIG_UPDATE.value:
-            event_name = 'barconfig_update'
             event = BarconfigUpdateEvent(data)
         elif msg_type == EventType.BINDING.value:
-            event_name = 'binding'
             event = BindingEvent(data)
         elif msg_type == EventType.SHUTDOWN.value:
-            event_name = 'shutdown'
             event = ShutdownEvent(data)
         elif msg_type == EventType.TICK.value:
-            event_name = 'tick'
             event = TickEvent(data)
-        elif msg_type == EventType.INPUT.value:
-            event_name = 'input'
-            event = InputEvent(data)
+            if is_handoff_marker(event.payload):
+                # the handoffs of this or other connections
+                return
         else:
-            # we have not implemented this event
-            return
+            event = InputEvent(data)
 
         try:
             self._pubsub.emit(event_name, event)
@@ -521,44 +1111,47 @@ class Connection:
     def main(self, timeout: float = 0.0):
         """Starts the main loop for this connection to start handling events.
 
+        This runs an :class:`EventLoop <i3ipc.EventLoop>` with just this
+        connection. To handle several connections from one thread, add them
+        to an ``EventLoop`` instead.
+
         :param timeout: If given, quit the main loop after ``timeout`` seconds.
         :type timeout: float
         """
-        loop_exception = None
-        self._quitting = False
-        timer = None
+        loop = EventLoop()
+        end = time.monotonic() + timeout if timeout else None
 
         logger.info('starting the main loop')
 
-        while True:
-            try:
-                self._event_socket_setup()
-
-                if timeout:
-                    timer = Timer(timeout, self.main_quit)
-                    timer.start()
-
-                while not self._event_socket_poll():
-                    pass
-            except Exception as e:
-                loop_exception = e
-            finally:
-                if timer:
-                    timer.cancel()
-
-                self._event_socket_teardown()
-
-                if self._quitting or not self.auto_reconnect:
-                    break
-
-                if not self._wait_for_socket():
-                    break
-
-        if loop_exception:
-            raise loop_exception
+        try:
+            loop.add_connection(self)
+
+            while True:
+                try:
+                    loop.run(None if end is None else max(end - time.monotonic(), 0))
+                    if self._handler_executor is not None:
+                        # let the handlers of the events that were read finish
+                        self._handler_executor.join()
+                        self._raise_handler_exception()
+                    return
+                except Exception as e:
+                    if self._quitting or not self.auto_reconnect:
+                        raise
+                    logger.info('got an exception in the main loop, continuing', exc_info=e)
+        finally:
+            loop.close()
 
     def main_quit(self):
-        """Quits the running main loop for this connection."""
+        """Quits the running main loop for this connection.
+
+        When the connection was added to an :class:`EventLoop
+        <i3ipc.EventLoop>`, it is removed from the loop. This can be called
+        from any thread.
+        """
         logger.info('shutting down the main loop')
         self._quitting = True
-        self._event_socket_teardown()
+        loop = self._event_loop
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.remove_connection, self)
+        else:
+            self._event_socket_teardown()
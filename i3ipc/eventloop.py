@@ -0,0 +1,425 @@
+from collections import deque
+from threading import Lock
+from typing import Callable, Optional
+import heapq
+import itertools
+import logging
+import selectors
+import socket
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class TimerHandle:
+    """A callback scheduled with :func:`EventLoop.call_later()` or
+    :func:`EventLoop.call_at()`.
+
+    :ivar when: The :func:`time.monotonic` time the callback is called at.
+    :vartype when: float
+    """
+    __slots__ = ('when', '_callback', '_args', '_loop', '_cancelled')
+
+    def __init__(self, when, callback, args, loop):
+        self.when = when
+        self._callback = callback
+        self._args = args
+        self._loop = loop
+        self._cancelled = False
+
+    def cancel(self):
+        """Cancels the callback. Does nothing if it was called or cancelled
+        already."""
+        if not self._cancelled:
+            self._cancelled = True
+            if self._loop is not None:
+                self._loop._live_timers -= 1
+                self._loop = None
+
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+
+class _Reconnect:
+    # waits for the ipc socket of a connection that was lost to come back
+    # without blocking the loop. Tries are scheduled with the backoff of the
+    # Reconnector of the connection and a change in the directory of the
+    # socket tries right away.
+    def __init__(self, loop, conn):
+        self._loop = loop
+        self._conn = conn
+        self._reconnector = conn._reconnector
+        self._start = time.monotonic()
+        self._end = self._start + self._reconnector.deadline
+        self._delays = self._reconnector.delays()
+        self._delay = next(self._delays)
+        self._timer = None
+        self._watcher = None
+
+    def start(self):
+        self._watcher = self._reconnector.watch()
+        if self._watcher is not None:
+            self._loop.add_reader(self._watcher.fd, self._changed)
+        self._try()
+
+    def _changed(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._delay = self._delays.send(self._watcher.drain())
+        self._try()
+
+    def _timed_out(self):
+        self._delay = self._delays.send(False)
+        self._try()
+
+    def _try(self):
+        self._timer = None
+
+        if self._reconnector.is_ready():
+            try:
+                self._conn._event_socket_setup()
+            except OSError as e:
+                logger.info('could not set up the event socket', exc_info=e)
+                self._conn._event_socket_teardown()
+            else:
+                self.cancel()
+                self._reconnector.record(time.monotonic() - self._start)
+                self._loop._connected(self._conn)
+                return
+
+        remaining = self._end - time.monotonic()
+        if remaining <= 0:
+            self.cancel()
+            self._reconnector.record_failure()
+            self._loop.remove_connection(self._conn)
+            return
+
+        self._timer = self._loop.call_later(min(self._delay, remaining), self._timed_out)
+
+    def cancel(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._watcher is not None:
+            self._loop.remove_reader(self._watcher.fd)
+            self._watcher.close()
+            self._watcher = None
+
+
+class EventLoop:
+    """A loop that handles the events of any number of :class:`Connection
+    <i3ipc.Connection>` objects, other file descriptors and timers from a
+    single thread with :mod:`selectors`.
+
+    :func:`Connection.main() <i3ipc.Connection.main>` runs a loop with just
+    that connection. Use an ``EventLoop`` to listen to several window
+    managers, or to i3 and a socket of your own, without a thread for each.
+
+    :Example:
+
+    .. code-block:: python3
+
+        loop = EventLoop()
+
+        for path in socket_paths:
+            i3 = Connection(path, auto_reconnect=True)
+            i3.on(Event.WINDOW_FOCUS, on_window_focus)
+            loop.add_connection(i3)
+
+        loop.add_reader(server.fileno(), on_client)
+        loop.call_later(60, loop.stop)
+        loop.run()
+
+    A connection that closes is removed from the loop after its
+    ``ipc_shutdown`` handlers are called. Connections with
+    ``auto_reconnect`` set stay in the loop and are set up again when the
+    socket comes back, while the other connections keep being handled.
+
+    An exception raised by an event handler or a callback stops the loop
+    and is raised from :func:`run()`. The loop can be run again afterwards.
+
+    Only :func:`call_soon_threadsafe()`, :func:`stop()` and
+    :func:`Connection.main_quit() <i3ipc.Connection.main_quit>` may be called
+    from other threads.
+    """
+    def __init__(self):
+        self._selector = selectors.DefaultSelector()
+        self._connections = {}
+        self._readers = {}
+        self._timers = []
+        self._live_timers = 0
+        self._sequence = itertools.count()
+        self._ready = deque()
+        self._ready_lock = Lock()
+        self._running = False
+        self._stopping = False
+        self._closed = False
+
+        self._wakeup_recv, self._wakeup_send = socket.socketpair()
+        self._wakeup_recv.setblocking(False)
+        self._wakeup_send.setblocking(False)
+        self._selector.register(self._wakeup_recv, selectors.EVENT_READ, self._read_wakeup)
+
+    def time(self) -> float:
+        """The current time of the loop clock, :func:`time.monotonic`.
+
+        :rtype: float
+        """
+        return time.monotonic()
+
+    def add_connection(self, conn):
+        """Sets up the event subscriptions of the connection and handles its
+        events in this loop.
+
+        If the socket cannot be reached and the connection has
+        ``auto_reconnect`` set, it is connected as soon as the socket comes
+        up.
+
+        :param conn: The connection to handle the events of.
+        :type conn: :class:`Connection <i3ipc.Connection>`
+        """
+        if conn._event_loop is not None:
+            raise ValueError('the connection is already added to an event loop')
+
+        conn._quitting = False
+
+        try:
+            conn._event_socket_setup()
+        except OSError:
+            if not conn.auto_reconnect:
+                conn._event_socket_teardown()
+                raise
+            logger.info('could not connect to %s, waiting for the socket', conn.socket_path)
+            conn._event_socket_teardown()
+            conn._event_loop = self
+            self._reconnect(conn)
+            return
+
+        conn._event_loop = self
+        self._connected(conn)
+
+    def remove_connection(self, conn):
+        """Stops handling the events of the connection and closes its event
+        socket. Does nothing if the connection is not in this loop.
+
+        :param conn: The connection to remove.
+        :type conn: :class:`Connection <i3ipc.Connection>`
+        """
+        if conn not in self._connections:
+            return
+
+        reconnect = self._connections.pop(conn)
+        if reconnect is not None:
+            reconnect.cancel()
+        else:
+            self._unregister(conn)
+
+        conn._event_socket_teardown()
+        conn._event_loop = None
+        conn._stop_handler_threads()
+
+    def _connected(self, conn):
+        self._connections[conn] = None
+        self._selector.register(conn._sub_socket, selectors.EVENT_READ,
+                                lambda: self._read_connection(conn))
+
+    def _unregister(self, conn):
+        if conn._sub_socket is not None:
+            self._selector.unregister(conn._sub_socket)
+
+    def _read_connection(self, conn):
+        try:
+            closed = conn._event_socket_read()
+        except ConnectionError as e:
+            logger.info('the event socket failed', exc_info=e)
+            closed = True
+
+        if not closed or conn not in self._connections:
+            return
+
+        self._unregister(conn)
+        conn._event_socket_teardown()
+
+        if conn._quitting or not conn.auto_reconnect:
+            self.remove_connection(conn)
+            return
+
+        logger.info('the event socket of %s closed, reconnecting', conn.socket_path)
+        self._reconnect(conn)
+
+    def _reconnect(self, conn):
+        reconnect = _Reconnect(self, conn)
+        self._connections[conn] = reconnect
+        reconnect.start()
+
+    def add_reader(self, fd, callback: Callable, *args):
+        """Calls ``callback(*args)`` whenever the file descriptor is readable.
+
+        :param fd: A file descriptor or an object with a ``fileno()`` method.
+        :param callback: The function to call.
+        :type callback: :class:`Callable`
+        """
+        self.remove_reader(fd)
+        self._readers[fd] = self._selector.register(fd, selectors.EVENT_READ,
+                                                    lambda: callback(*args))
+
+    def remove_reader(self, fd) -> bool:
+        """Stops watching the file descriptor.
+
+        :returns: Whether the file descriptor was being watched.
+        :rtype: bool
+        """
+        if self._readers.pop(fd, None) is None:
+            return False
+        self._selector.unregister(fd)
+        return True
+
+    def call_at(self, when: float, callback: Callable, *args) -> TimerHandle:
+        """Calls ``callback(*args)`` at the :func:`time.monotonic` time
+        ``when``.
+
+        :rtype: :class:`TimerHandle`
+        """
+        timer = TimerHandle(when, callback, args, self)
+        heapq.heappush(self._timers, (when, next(self._sequence), timer))
+        self._live_timers += 1
+        return timer
+
+    def call_later(self, delay: float, callback: Callable, *args) -> TimerHandle:
+        """Calls ``callback(*args)`` after ``delay`` seconds.
+
+        :rtype: :class:`TimerHandle`
+        """
+        return self.call_at(time.monotonic() + delay, callback, *args)
+
+    def call_soon_threadsafe(self, callback: Callable, *args):
+        """Calls ``callback(*args)`` from the loop thread as soon as
+        possible. This can be called from any thread."""
+        with self._ready_lock:
+            self._ready.append((callback, args))
+        self._wakeup()
+
+    def _wakeup(self):
+        try:
+            self._wakeup_send.send(b'\0')
+        except OSError:
+            # a wakeup is pending already or the loop is closed
+            pass
+
+    def _read_wakeup(self):
+        try:
+            while self._wakeup_recv.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def stop(self):
+        """Makes :func:`run()` return after the callback that is running. This
+        can be called from any thread."""
+        self._stopping = True
+        self._wakeup()
+
+    def _has_work(self):
+        return bool(self._connections or self._readers or self._live_timers or self._ready)
+
+    def _select_timeout(self, end):
+        if self._ready:
+            return 0
+
+        timeout = None
+        if self._timers:
+            timeout = max(self._timers[0][0] - time.monotonic(), 0)
+        if end is not None:
+            remaining = max(end - time.monotonic(), 0)
+            timeout = remaining if timeout is None else min(timeout, remaining)
+
+        return timeout
+
+    def _run_timers(self):
+        now = time.monotonic()
+        timers = self._timers
+
+        while timers and timers[0][0] <= now:
+            timer = heapq.heappop(timers)[2]
+            if timer._cancelled:
+                continue
+            timer.cancel()
+            timer._callback(*timer._args)
+            if self._stopping:
+                return
+
+    def _run_ready(self):
+        with self._ready_lock:
+            ready = self._ready
+            self._ready = deque()
+
+        try:
+            while ready:
+                callback, args = ready.popleft()
+                callback(*args)
+                if self._stopping:
+                    break
+        finally:
+            if ready:
+                # put back what is left when the loop stopped or a callback
+                # raised
+                with self._ready_lock:
+                    ready.extend(self._ready)
+                    self._ready = ready
+
+    def run(self, timeout: Optional[float] = None):
+        """Handles events and calls callbacks until :func:`stop()` is called,
+        ``timeout`` seconds have passed, or there is nothing left to wait for
+        (no connections, readers or timers).
+
+        :param timeout: If given, return after at most ``timeout`` seconds.
+        :type timeout: float
+        """
+        if self._closed:
+            raise RuntimeError('the event loop is closed')
+        if self._running:
+            raise RuntimeError('the event loop is already running')
+
+        end = None if timeout is None else time.monotonic() + timeout
+        selector_map = self._selector.get_map()
+        self._running = True
+        self._stopping = False
+
+        try:
+            while not self._stopping and self._has_work():
+                if end is not None and time.monotonic() >= end:
+                    break
+
+                for key, _ in self._selector.select(self._select_timeout(end)):
+                    # an earlier callback may have removed this one
+                    if selector_map.get(key.fd) is not key:
+                        continue
+                    key.data()
+                    if self._stopping:
+                        break
+                else:
+                    self._run_timers()
+                    if not self._stopping:
+                        self._run_ready()
+        finally:
+            self._running = False
+            self._stopping = False
+
+    def close(self):
+        """Removes all the connections and closes the loop. The readers that
+        were added are not closed."""
+        if self._closed:
+            return
+        if self._running:
+            raise RuntimeError('cannot close a running event loop')
+
+        for conn in list(self._connections):
+            self.remove_connection(conn)
+
+        self._readers.clear()
+        self._timers.clear()
+        self._live_timers = 0
+        self._selector.close()
+        self._wakeup_recv.close()
+        self._wakeup_send.close()
+        self._closed = True
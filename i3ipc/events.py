@@ -1,6 +1,7 @@
 from . import con
 from .replies import BarConfigReply, InputReply
 from enum import Enum
+from typing import Optional
 
 
 class IpcBaseEvent:
@@ -9,6 +10,25 @@ class IpcBaseEvent:
     pass
 
 
+class _LazyCon:
+    # builds the Con of an event from its ipc data the first time it is read.
+    # The Con is then stored on the event, which shadows this descriptor.
+    def __init__(self, key):
+        self.key = key
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, event, owner=None):
+        if event is None:
+            return self
+
+        data = event.ipc_data.get(self.key)
+        value = event._Con(data, None, event._conn) if data else None
+        event.__dict__[self.name] = value
+        return value
+
+
 class Event(Enum):
     """An enumeration of events that can be subscribed to with
     :func:`Connection.on()`.
@@ -55,6 +75,9 @@ class WorkspaceEvent(IpcBaseEvent):
 
     .. seealso:: https://i3wm.org/docs/ipc.html#_workspace_event
 
+    The containers are built from the ipc data when they are first read. To
+    tell workspaces apart, :attr:`current_id` and :attr:`old_id` are cheaper.
+
     :ivar change: The type of change.
     :vartype change: str
     :ivar current: The affected workspace.
@@ -65,17 +88,34 @@ class WorkspaceEvent(IpcBaseEvent):
     :ivar ipc_data: The raw data from the i3 ipc.
     :vartype ipc_data: dict
     """
+    current = _LazyCon('current')
+    old = _LazyCon('old')
+
     def __init__(self, data, conn, _Con=con.Con):
         self.ipc_data = data
         self.change = data['change']
-        self.current = None
-        self.old = None
+        self._conn = conn
+        self._Con = _Con
+
+    @property
+    def current_id(self) -> Optional[int]:
+        """The id of the affected workspace without building its
+        :class:`Con`.
 
-        if 'current' in data and data['current']:
-            self.current = _Con(data['current'], None, conn)
+        :rtype: int or :class:`None`
+        """
+        current = self.ipc_data.get('current')
+        return current['id'] if current else None
 
-        if 'old' in data and data['old']:
-            self.old = _Con(data['old'], None, conn)
+    @property
+    def old_id(self) -> Optional[int]:
+        """The id of the previous workspace without building its
+        :class:`Con`.
+
+        :rtype: int or :class:`None`
+        """
+        old = self.ipc_data.get('old')
+        return old['id'] if old else None
 
 
 class OutputEvent(IpcBaseEvent):
@@ -120,16 +160,40 @@ class WindowEvent(IpcBaseEvent):
 
     .. seealso:: https://i3wm.org/docs/ipc.html#_window_event
 
+    The container is built from the ipc data when it is first read. Handlers
+    that only need to know which window changed can use :attr:`container_id`
+    and :attr:`window_id` instead.
+
     :ivar change: The type of change.
     :vartype change: str
     :ivar container: The window's parent container.
     :ivar ipc_data: The raw data from the i3 ipc.
     :vartype ipc_data: dict
     """
+    container = _LazyCon('container')
+
     def __init__(self, data, conn, _Con=con.Con):
         self.ipc_data = data
         self.change = data['change']
-        self.container = _Con(data['container'], None, conn)
+        self._conn = conn
+        self._Con = _Con
+
+    @property
+    def container_id(self) -> int:
+        """The id of the container without building its :class:`Con`.
+
+        :rtype: int
+        """
+        return self.ipc_data['container']['id']
+
+    @property
+    def window_id(self) -> Optional[int]:
+        """The X11 window id of the container without building its
+        :class:`Con`, or ``None`` for containers without an X11 window.
+
+        :rtype: int or :class:`None`
+        """
+        return self.ipc_data['container'].get('window')
 
 
 class BarconfigUpdateEvent(IpcBaseEvent, BarConfigReply):
@@ -10,6 +10,8 @@ class Rect:
     :ivar width: The width of the rectangle.
     :vartype width: int
     """
+    __slots__ = ('x', 'y', 'height', 'width')
+
     def __init__(self, data):
         self.x = data['x']
         self.y = data['y']
@@ -59,6 +61,8 @@ class Gaps:
     :ivar bottom: The bottom outer gaps.
     :vartype bottom: int or :class:`None` if not supported.
     """
+    __slots__ = ('inner', 'outer', 'left', 'right', 'top', 'bottom')
+
     def __init__(self, data):
         self.inner = data['inner']
         self.outer = data['outer']
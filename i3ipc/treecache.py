@@ -0,0 +1,178 @@
+from ._private import TreeMirror, diff_trees
+from .con import Con
+from .events import Event
+from threading import Lock, RLock
+from typing import List
+import logging
+
+logger = logging.getLogger(__name__)
+
+_EVENTS = (Event.WINDOW, Event.WORKSPACE, Event.OUTPUT, Event.SHUTDOWN)
+
+
+class TreeCache:
+    """A copy of the layout tree that is kept up to date from the window and
+    workspace events, so scripts that look at the tree on every event do not
+    need a ``GET_TREE`` round trip each time.
+
+    The tree is gotten once, the first time :func:`get_tree()` is called.
+    Focus, title, mark, urgent, fullscreen and close events of windows and
+    focus, urgent and empty events of workspaces are then applied to it in
+    place. The other events, like new windows or ``output`` and ``shutdown``
+    events, change the tree in ways the event does not tell, so the tree is
+    gotten again the next time it is needed.
+
+    The structure, the focus and the properties of the containers are kept
+    up to date. The geometry and the layout of containers that were not in
+    an event may be out of date.
+
+    :Example:
+
+    .. code-block:: python3
+
+        i3 = Connection()
+        cache = TreeCache(i3)
+
+        def on_binding(i3, e):
+            windows = cache.get_tree().leaves()
+
+        i3.on(Event.BINDING, on_binding)
+        i3.main()
+
+    The events are only handled while the connection runs its
+    :func:`main() <i3ipc.Connection.main>` or an :class:`EventLoop
+    <i3ipc.EventLoop>`. At other times, :func:`get_tree()` gets a new tree
+    every time. Create the cache before the connection starts handling
+    events.
+
+    :param conn: The connection to keep the tree of.
+    :type conn: :class:`Connection <i3ipc.Connection>`
+    :param verify: Compare the tree with a new one from i3 every time it is
+        gotten and log the differences. This is slow and meant for debugging.
+    :type verify: bool
+
+    :ivar fetches: The number of times the tree was gotten from i3.
+    :vartype fetches: int
+    """
+    def __init__(self, conn, verify: bool = False):
+        self._conn = conn
+        self._verify = verify
+        # held by the thread that gets a tree from i3
+        self._fetch_lock = Lock()
+        # guards the tree against the thread that handles the events
+        self._lock = RLock()
+        self._mirror = None
+        # the event socket the events of the tree come from. A new socket
+        # may have missed events.
+        self._socket = None
+        # the events that came while a tree is gotten
+        self._pending = None
+        self.fetches = 0
+
+        for event in _EVENTS:
+            conn._on(event, self._on_event, inline=True)
+
+    def _apply(self, event):
+        try:
+            applied = self._mirror.apply(event)
+        except Exception as e:
+            logger.warning('could not apply the %s event to the tree', event.change, exc_info=e)
+            applied = False
+
+        if not applied:
+            self._mirror = None
+
+    def _on_event(self, conn, event):
+        with self._lock:
+            if self._pending is not None:
+                # the reply may be older than the event, apply it to the new
+                # tree
+                self._pending.append(event)
+            elif self._mirror is not None:
+                self._apply(event)
+
+    def _fetch(self):
+        # the lock is not held while waiting for the reply, so the events
+        # keep being handled
+        with self._lock:
+            self._pending = []
+        try:
+            tree = self._conn.get_tree()
+        finally:
+            with self._lock:
+                pending, self._pending = self._pending, None
+        self.fetches += 1
+        return tree, pending
+
+    def _apply_pending(self, pending):
+        for event in pending:
+            if self._mirror is None:
+                break
+            self._apply(event)
+
+    def _load(self, tree, pending):
+        self._mirror = TreeMirror(tree)
+        self._apply_pending(pending)
+        return tree if self._mirror is None else self._mirror.root
+
+    def get_tree(self) -> Con:
+        """Gets the root container of the layout tree. The tree is updated in
+        place as events come in, so keep the root rather than containers in
+        it across events.
+
+        :rtype: :class:`Con <i3ipc.Con>`
+        """
+        with self._fetch_lock:
+            socket = self._conn._sub_socket
+            if self._conn._event_loop is None or socket is None:
+                # no events are handled to keep the tree up to date
+                with self._lock:
+                    self._mirror = None
+                tree, _ = self._fetch()
+                return tree
+
+            with self._lock:
+                if self._mirror is not None and self._socket is socket and not self._verify:
+                    return self._mirror.root
+
+            fresh, pending = self._fetch()
+
+            with self._lock:
+                if self._mirror is None or self._socket is not socket:
+                    self._socket = socket
+                    return self._load(fresh, pending)
+
+                differences = diff_trees(self._mirror.root, fresh)
+                if differences:
+                    logger.warning('the cached tree is out of date: %s', '; '.join(differences))
+                    return self._load(fresh, pending)
+                self._apply_pending(pending)
+                return fresh if self._mirror is None else self._mirror.root
+
+    def verify(self) -> List[str]:
+        """Compares the cached tree with a new tree from i3. Differences are
+        expected while events are still on their way.
+
+        :returns: The differences, or an empty list if the trees match.
+        :rtype: list(str)
+        """
+        with self._fetch_lock:
+            fresh, pending = self._fetch()
+            with self._lock:
+                if self._mirror is None:
+                    return []
+
+                differences = diff_trees(self._mirror.root, fresh)
+                self._apply_pending(pending)
+                return differences
+
+    def invalidate(self):
+        """Drops the cached tree so the next :func:`get_tree()` gets a new
+        one."""
+        with self._lock:
+            self._mirror = None
+
+    def close(self):
+        """Stops handling events and drops the cached tree."""
+        self._conn.off(self._on_event)
+        self.invalidate()
@@ -8,7 +8,10 @@ from setuptools import setup, find_packages
 
 REQUIRES_PYTHON = '>=3.4.0'
 REQUIRED = []
-EXTRAS = {}
+EXTRAS = {
+    'orjson': ['orjson'],
+    'ujson': ['ujson'],
+}
 
 here = os.path.abspath(os.path.dirname(__file__))
 
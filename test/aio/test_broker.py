@@ -0,0 +1,62 @@
+from .ipctest import IpcTest
+
+from i3ipc.aio import Connection
+from i3ipc.aio.broker import Broker
+
+import pytest
+import asyncio
+
+
+class TestBroker(IpcTest):
+    @pytest.mark.asyncio
+    async def test_broker(self, i3, tmp_path):
+        broker = await Broker(socket_path=str(tmp_path / 'broker.sock'),
+                              upstream_socket_path=i3.socket_path,
+                              cache_tree=True).start()
+
+        try:
+            clients = [await Connection(broker.socket_path).connect() for _ in range(3)]
+            ticks = [[] for _ in clients]
+
+            for client, events in zip(clients, ticks):
+                client.on('tick', lambda conn, e, events=events: events.append(e))
+                await client.subscribe(['tick'])
+
+            await clients[0].send_tick('hello')
+            await asyncio.sleep(0.1)
+
+            # one first tick from the broker, not another one from i3
+            for events in ticks:
+                assert [e.first for e in events] == [True, False]
+                assert [e.payload for e in events] == ['', 'hello']
+
+            # the cached tree is served until a command runs
+            assert (await clients[0].get_tree()).type == 'root'
+            assert (await clients[1].get_tree()).type == 'root'
+            assert broker.tree_hits == 1
+
+            await clients[2].command('open')
+            await clients[0].get_tree()
+            assert broker.tree_misses == 2
+
+            versions = await asyncio.gather(*[c.get_version() for c in clients])
+            assert all(v.major == 4 for v in versions)
+        finally:
+            broker.close()
+
+    @pytest.mark.asyncio
+    async def test_restart(self, i3, tmp_path):
+        broker = await Broker(socket_path=str(tmp_path / 'broker.sock'),
+                              upstream_socket_path=i3.socket_path).start()
+
+        try:
+            client = await Connection(broker.socket_path, auto_reconnect=True).connect()
+            other = await Connection(broker.socket_path).connect()
+
+            await client.command('restart')
+
+            # the broker connected to i3 again and kept the other client
+            assert (await other.get_version()).major == 4
+            assert await client.command('nop')
+        finally:
+            broker.close()
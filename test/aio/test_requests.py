@@ -5,6 +5,8 @@ from i3ipc import (VersionReply, BarConfigReply, OutputReply, WorkspaceReply, Co
 from i3ipc.aio import Con
 
 import pytest
+import asyncio
+import json
 
 
 class TestResquests(IpcTest):
@@ -44,3 +46,49 @@ class TestResquests(IpcTest):
 
         resp = await i3.send_tick()
         assert type(resp) is TickReply
+
+    @pytest.mark.asyncio
+    async def test_concurrent_requests(self, i3):
+        tree, workspaces, version, marks, replies = await asyncio.gather(
+            i3.get_tree(), i3.get_workspaces(), i3.get_version(), i3.get_marks(),
+            i3.command('nop'))
+
+        assert type(tree) is Con
+        assert type(workspaces) is list
+        assert type(workspaces[0]) is WorkspaceReply
+        assert type(version) is VersionReply
+        assert type(marks) is list
+        assert replies[0].success
+
+    @pytest.mark.asyncio
+    async def test_raw_and_dict_replies(self, i3):
+        raw = await i3.get_tree(raw=True)
+        assert type(raw) is bytes
+        assert json.loads(raw)['type'] == 'root'
+
+        tree = await i3.get_tree(dict=True)
+        assert type(tree) is dict
+        assert tree['type'] == 'root'
+
+        workspaces = await i3.get_workspaces(dict=True)
+        assert type(workspaces) is list
+        assert type(workspaces[0]) is dict
+
+        version = await i3.get_version(dict=True)
+        assert type(version['major']) is int
+
+        with pytest.raises(ValueError):
+            await i3.get_outputs(raw=True, dict=True)
+
+    @pytest.mark.asyncio
+    async def test_timeout(self, i3):
+        timeouts = i3.timeouts
+
+        with pytest.raises(TimeoutError):
+            await i3.get_tree(timeout=0)
+
+        assert i3.timeouts == timeouts + 1
+
+        # the late reply to the tree request is dropped
+        resp = await i3.get_version(timeout=5)
+        assert type(resp) is VersionReply
@@ -0,0 +1,100 @@
+from i3ipc._private import HandlerScheduler
+
+import pytest
+import asyncio
+
+
+class TestScheduler:
+    @pytest.mark.asyncio
+    async def test_concurrency_limit(self):
+        errors = []
+        scheduler = HandlerScheduler(errors.append, concurrency=2)
+        running = 0
+        most_running = 0
+        done = []
+
+        async def handler(i):
+            nonlocal running, most_running
+            running += 1
+            most_running = max(most_running, running)
+            await asyncio.sleep(0.001)
+            running -= 1
+            done.append(i)
+
+        for i in range(20):
+            scheduler.submit(handler, (i, ))
+
+        while len(done) < 20:
+            await asyncio.sleep(0.01)
+
+        assert not errors
+        assert most_running == 2
+        assert sorted(done) == list(range(20))
+
+        stats = scheduler.stats()
+        assert stats.submitted == 20
+        assert stats.max_queued == 20
+        assert stats.queued == 0
+        assert stats.running == 0
+
+    @pytest.mark.asyncio
+    async def test_block(self):
+        paused = []
+        scheduler = HandlerScheduler(None,
+                                     queue_size=4,
+                                     pause=lambda: paused.append(True),
+                                     resume=lambda: paused.append(False))
+        calls = []
+
+        for i in range(10):
+            scheduler.submit(calls.append, (i, ))
+
+        # nothing is dropped while blocking
+        assert paused == [True]
+        await asyncio.sleep(0)
+        assert calls == list(range(10))
+        assert paused == [True, False]
+        assert scheduler.stats().pauses == 1
+
+    @pytest.mark.asyncio
+    async def test_drop_oldest(self):
+        scheduler = HandlerScheduler(None, queue_size=4, overflow='drop_oldest')
+        calls = []
+
+        for i in range(10):
+            scheduler.submit(calls.append, (i, ))
+
+        await asyncio.sleep(0)
+        assert calls == [6, 7, 8, 9]
+        assert scheduler.stats().dropped == 6
+
+    @pytest.mark.asyncio
+    async def test_coalesce(self):
+        scheduler = HandlerScheduler(None, queue_size=4, overflow='coalesce')
+        calls = []
+
+        for i in range(10):
+            scheduler.submit(calls.append, ('a{}'.format(i), ), key='a')
+            scheduler.submit(calls.append, ('b{}'.format(i), ), key='b')
+
+        await asyncio.sleep(0)
+        # the calls keep the place of the first call with their key
+        assert calls == ['a9', 'b9']
+        assert scheduler.stats().coalesced == 18
+
+    @pytest.mark.asyncio
+    async def test_errors(self):
+        errors = []
+        scheduler = HandlerScheduler(errors.append)
+
+        async def fail():
+            raise ValueError('async')
+
+        def fail_sync():
+            raise ValueError('sync')
+
+        scheduler.submit(fail, ())
+        scheduler.submit(fail_sync, ())
+        await asyncio.sleep(0.01)
+
+        assert sorted(str(e) for e in errors) == ['async', 'sync']
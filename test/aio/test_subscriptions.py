@@ -0,0 +1,52 @@
+from .ipctest import IpcTest
+
+from i3ipc import Event
+from i3ipc.aio import Connection
+
+import pytest
+import asyncio
+
+
+class TestSubscriptions(IpcTest):
+    @pytest.mark.asyncio
+    async def test_off_shrinks_subscriptions(self, i3):
+        ticks = []
+
+        def on_window(i3, e):
+            pass
+
+        i3.on('tick', lambda i3, e: ticks.append(e.payload))
+        i3.on(Event.WINDOW_FOCUS, on_window)
+        i3.on(Event.WINDOW_TITLE, on_window)
+        await i3.subscribe(['tick', 'window'])
+        await asyncio.sleep(0.1)
+
+        i3.off(on_window)
+        for i in range(20):
+            await i3.send_tick(str(i))
+        await asyncio.sleep(0.2)
+
+        assert Event.WINDOW not in i3._sub_events
+        assert i3._handoff is None
+        # no tick got lost or handled twice while the socket was replaced
+        assert [t for t in ticks if t] == [str(i) for i in range(20)]
+
+    @pytest.mark.asyncio
+    async def test_close_during_handoff(self, i3):
+        conn = await Connection(i3.socket_path).connect()
+
+        def on_window(conn, e):
+            pass
+
+        conn.on(Event.WINDOW, on_window)
+        await conn.subscribe(['window'])
+        await asyncio.sleep(0.1)
+
+        conn.off(on_window)
+        task = conn._handoff_task
+        assert task is not None and not task.done()
+
+        await conn.close()
+        assert task.done()
+        assert conn._handoff is None
+        assert conn._handoff_task is None
@@ -0,0 +1,121 @@
+from i3ipc import Connection
+from i3ipc._private import codec, get_codec
+
+import json
+import pytest
+import socket
+import sys
+import types
+
+_invalid = b'{"name": "a\xffb"}'
+
+
+def loads(data):
+    # rejects invalid UTF-8 like the real modules do
+    return json.loads(bytes(data) if isinstance(data, memoryview) else data)
+
+
+def fake_module(name):
+    return types.SimpleNamespace(__name__=name,
+                                 loads=loads,
+                                 dumps=lambda obj, **kwargs: json.dumps(obj).encode()
+                                 if name == 'orjson' else json.dumps(obj))
+
+
+@pytest.fixture
+def modules(monkeypatch):
+    """Makes the given optional codec modules importable and the others
+    not."""
+    def install(*names):
+        monkeypatch.setattr(codec, '_default_codec', None)
+        for name in ('orjson', 'ujson'):
+            monkeypatch.setitem(sys.modules, name, fake_module(name) if name in names else None)
+
+    return install
+
+
+class Loads:
+    name = 'counting'
+
+    def __init__(self):
+        self.calls = 0
+
+    def loads(self, data):
+        self.calls += 1
+        return loads(data)
+
+    def dumps(self, obj):
+        return json.dumps(obj)
+
+
+class TestCodec:
+    def test_default(self, modules):
+        modules('orjson', 'ujson')
+        assert get_codec().name == 'orjson'
+        assert get_codec() is get_codec()
+
+        modules('ujson')
+        assert get_codec().name == 'ujson'
+
+        modules()
+        assert get_codec().name == 'json'
+
+    def test_by_name(self, modules):
+        modules('orjson', 'ujson')
+
+        for name in ('orjson', 'ujson', 'json'):
+            c = get_codec(name)
+            assert c.name == name
+            assert c.loads(bytearray(b'{"a": [1]}')) == {'a': [1]}
+            assert json.loads(c.dumps({'a': 'é'})) == {'a': 'é'}
+
+        modules()
+        with pytest.raises(ImportError):
+            get_codec('orjson')
+        with pytest.raises(ValueError):
+            get_codec('simplejson')
+
+    def test_custom(self):
+        custom = Loads()
+        c = get_codec(custom)
+
+        assert c.name == 'counting'
+        assert c.loads(b'[1]') == [1]
+        assert custom.calls == 1
+        assert get_codec(c) is c
+
+        with pytest.raises(TypeError):
+            get_codec(object())
+
+    def test_lossy(self, modules):
+        modules('orjson', 'ujson')
+
+        for c in (get_codec('orjson'), get_codec('ujson'), get_codec('json'), get_codec(Loads())):
+            assert c.loads(_invalid) == {'name': 'a�b'}
+            assert c.loads(bytearray(_invalid)) == {'name': 'a�b'}
+            assert c.loads(memoryview(_invalid)) == {'name': 'a�b'}
+
+            with pytest.raises(ValueError):
+                c.loads(b'{"name": ')
+
+    def test_lossy_orjson(self):
+        pytest.importorskip('orjson')
+        assert get_codec('orjson').loads(bytearray(_invalid)) == {'name': 'a�b'}
+
+    def test_connection(self, tmp_path):
+        path = str(tmp_path / 'ipc-socket')
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(path)
+        server.listen(4)
+
+        try:
+            custom = Loads()
+            conn = Connection(path, json_codec=custom)
+            other = Connection(path, json_codec='json')
+
+            assert conn._codec.codec is custom
+            assert other._codec.name == 'json'
+            conn._codec.loads(b'{}')
+            assert custom.calls == 1
+        finally:
+            server.close()
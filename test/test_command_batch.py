@@ -0,0 +1,34 @@
+from ipctest import IpcTest
+
+
+class TestCommandBatch(IpcTest):
+    def test_command_batch(self, i3):
+        replies = i3.command_batch(['nop', 'nop foo, nop bar', 'nop "a;b"'])
+
+        assert [len(r) for r in replies] == [1, 2, 1]
+        assert all(r.success for cmd_replies in replies for r in cmd_replies)
+
+    def test_command_batch_max_payload(self, i3):
+        replies = i3.command_batch(['nop {}'.format(i) for i in range(100)], max_payload=64)
+
+        assert len(replies) == 100
+        assert all(len(r) == 1 and r[0].success for r in replies)
+
+    def test_command_batch_parse_error(self, i3):
+        replies = i3.command_batch(['nop', 'not a command', 'nop'])
+
+        assert replies[0][0].success
+        assert not replies[1][0].success
+        assert replies[2] == []
+
+    def test_command_containers(self, i3):
+        self.fresh_workspace()
+        windows = [self.open_window() for _ in range(3)]
+        leaves = [c for c in i3.get_tree().leaves() if c.window in windows]
+
+        replies = i3.command_containers(leaves, 'floating enable')
+
+        assert len(replies) == 3
+        assert all(r[0].success for r in replies)
+        tree = i3.get_tree()
+        assert all(tree.find_by_window(w).is_floating() for w in windows)
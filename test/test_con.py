@@ -0,0 +1,172 @@
+from i3ipc import Con
+from i3ipc.aio import Con as AioCon
+from treedata import node, window
+
+import json
+import pytest
+
+
+def decode(data):
+    # every string is a new object, like with a JSON codec
+    return json.loads(json.dumps(data))
+
+
+def built(con, name):
+    # reads the slot without building it
+    try:
+        getattr(Con, name).__get__(con)
+        return True
+    except AttributeError:
+        return False
+
+
+class TestCon:
+    def test_properties(self):
+        tree = Con(decode(node(1, nodes=[node(2, window=7), node(3, 'workspace')])), None, None)
+        a, b = tree.nodes
+
+        assert a.parent is tree
+        assert a.window == 7
+        assert a.pid is None
+        assert a.marks == []
+        assert b.type == 'workspace'
+        assert tree.ipc_data['id'] == 1
+        assert not hasattr(tree, 'window_rect')
+        assert not hasattr(tree, '__dict__')
+
+    def test_interned(self):
+        tree = Con(decode(node(1, nodes=[node(2), node(3)])), None, None)
+        a, b = tree.nodes
+
+        assert a.layout is b.layout
+        assert a.border is b.border
+        assert a.type is b.type
+
+    def test_no_ipc_data(self):
+        tree = Con(decode(node(1, nodes=[node(2, floating_nodes=[node(3)])])), None, None, False)
+
+        assert tree.ipc_data is None
+        assert tree.nodes[0].floating_nodes[0].ipc_data is None
+        assert tree.nodes[0].floating_nodes[0].id == 3
+
+    def test_extra_attributes(self):
+        for cls in (Con, AioCon):
+            con = cls(decode(node(1)), None, None)
+            with pytest.raises(AttributeError):
+                con.seen = True
+
+        class Seen(Con):
+            pass
+
+        con = Seen(decode(node(1)), None, None)
+        con.seen = True
+        assert vars(con) == {'seen': True}
+
+    def test_lazy(self):
+        data = decode(
+            node(1, nodes=[node(2, nodes=[node(4)]), node(3, window_rect=node(0)['rect'])],
+                 gaps={'inner': 1, 'outer': 2}))
+        tree = Con(data, None, None, True, True)
+
+        assert not hasattr(tree, 'window_rect')
+        assert tree.gaps.outer == 2
+        assert tree.deco_rect is None
+
+        a, b = tree.nodes
+        assert a.parent is tree
+        assert b.window_rect.width == 10
+        assert tree.nodes is tree.nodes
+        assert [c.id for c in tree] == [2, 3, 4]
+        assert a.nodes[0].ipc_data is data['nodes'][0]['nodes'][0]
+
+        for cls in (Con, AioCon):
+            assert type(cls(data, None, None, False, True).nodes[0].nodes[0]) is cls
+
+    def test_find_focused(self):
+        data = decode(
+            node(1, nodes=[node(2, nodes=[node(4), node(5, focused=True)], focus=[5, 4]), node(3)],
+                 focus=[2, 3]))
+        tree = Con(data, None, None, True, True)
+
+        assert tree.find_focused().id == 5
+        # only the containers on the focus path built their children
+        a, b = tree.nodes
+        assert built(tree, 'nodes') and built(a, 'nodes')
+        assert not built(b, 'nodes') and not built(a.nodes[1], 'nodes')
+
+        data['focus'] = [3, 2]
+        assert Con(data, None, None).find_focused().id == 5
+        assert Con(data, None, None).nodes[1].find_focused() is None
+
+    def test_index(self):
+        data = decode(
+            node(1, nodes=[
+                node(2, nodes=[window(4, 'vim', 'URxvt', pid=100, marks=['b']),
+                               window(5, 'docs', 'Firefox', pid=200)]),
+                window(3, 'mail', 'Firefox', pid=100, marks=['a', 'c']),
+                node(6, app_id='foot', pid=100),
+            ]))
+        tree = Con(data, None, None)
+        ids = lambda cons: [c.id for c in cons]  # noqa: E731
+
+        assert tree.find_by_id(5).id == 5
+        assert tree.find_by_id(1) is None
+        assert tree.find_by_window(400).id == 4
+        assert ids(tree.find_by_pid(100)) == [3, 6, 4]
+        assert ids(tree.find_marked()) == [3, 4]
+        assert ids(tree.find_marked('^c$')) == [3]
+        assert ids(tree.find_classed('URxvt|Firefox|foot')) == [3, 4, 5, 6]
+        assert ids(tree.find_instanced('fire')) == [3, 5]
+        assert tree._index.by_mark['b'].id == 4
+
+        # a container that is not the root searches its descendants, which
+        # gives the same results
+        scanned = Con(data, None, None)
+        scanned.parent = tree
+        for method, arg in (('find_by_id', 5), ('find_by_window', 500), ('find_by_pid', 100),
+                            ('find_marked', '.'), ('find_classed', 'o'), ('find_instanced', 'x')):
+            found = getattr(tree, method)(arg)
+            expected = getattr(scanned, method)(arg)
+            if isinstance(found, list):
+                assert ids(found) == ids(expected)
+            else:
+                assert found.id == expected.id
+
+    def test_iter_descendants(self):
+        data = decode(
+            node(1, 'root', [
+                node(2, 'output', [
+                    node(3, nodes=[node(4, 'workspace', [node(5, window=5)], name='__i3_scratch')],
+                         name='content')
+                ], name='__i3'),
+                node(6, 'output', [
+                    node(7, 'dockarea', [node(8, window=8)]),
+                    node(9, nodes=[
+                        node(10, 'workspace', [node(11, window=11), node(12, window=12)], name='1')
+                    ], name='content'),
+                ], name='eDP-1'),
+            ]))
+        tree = Con(data, None, None, True, True)
+        ids = lambda cons: [c.id for c in cons]  # noqa: E731
+
+        assert ids(tree.iter_descendants()) == ids(tree)
+        assert ids(tree.iter_descendants('dfs')) == [2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12]
+        assert ids(tree.iter_descendants(max_depth=2)) == [2, 6, 3, 7, 9]
+        assert ids(tree.iter_descendants('dfs', max_depth=1)) == [2, 6]
+        assert ids(tree.iter_descendants(prune=Con.is_special)) == [6, 9, 10, 11, 12]
+        assert ids(tree.iter_leaves()) == ids(tree.leaves()) == [5, 11, 12]
+        assert ids(tree.iter_leaves('dfs', prune=Con.is_special)) == [11, 12]
+
+        # pruned subtrees of a lazy tree are not built and neither is the rest
+        # of the tree after the caller stopped
+        tree = Con(data, None, None, True, True)
+        matches = tree.iter_descendants(prune=Con.is_special)
+        assert next(c for c in matches if c.window).id == 11
+        assert not built(tree.nodes[0], 'nodes')
+        assert not built(tree.nodes[1].nodes[1].nodes[0].nodes[1], 'nodes')
+
+        # raised by the call, not when the containers are taken
+        with pytest.raises(ValueError):
+            tree.iter_descendants('random')
+        with pytest.raises(ValueError):
+            tree.iter_leaves('random')
@@ -0,0 +1,81 @@
+from i3ipc import Con
+from i3ipc._private import compile_criteria
+from treedata import node, window
+
+import pytest
+
+
+def make_tree():
+    ws1 = node(10,
+               'workspace',
+               name='1',
+               nodes=[
+                   window(11, 'Mozilla Firefox', 'Firefox', focused=True),
+                   node(12, nodes=[window(13, 'vim "notes"', marks=['edit'])],
+                        marks=['split']),
+               ])
+    ws3 = node(30,
+               'workspace',
+               name='3',
+               nodes=[window(31, 'docs', 'Firefox', urgent=True)],
+               floating_nodes=[
+                   node(32, 'floating_con', nodes=[window(33, 'video', 'mpv', floating='user_on')])
+               ])
+    content = node(3, name='content', nodes=[ws1, ws3])
+    return Con(node(1, 'root', [node(2, 'output', [content], name='eDP-1')]), None, None)
+
+
+class TestCriteria:
+    def query(self, con, criteria):
+        return [c.id for c in con.query(criteria)]
+
+    def test_patterns(self):
+        tree = make_tree()
+
+        assert self.query(tree, '[class="^Firefox$"]') == [11, 31]
+        assert self.query(tree, '[class="Firefox" title="docs"]') == [31]
+        assert self.query(tree, 'instance=urxvt') == [13]
+        assert self.query(tree, r'[title="vim \"notes\""]') == [13]
+        assert self.query(tree, "[title='^v']") == [13, 33]
+        assert self.query(tree, '[id=3300]') == [33]
+        assert self.query(tree, '[class=__focused__]') == [11, 31]
+
+    def test_containers(self):
+        tree = make_tree()
+
+        # only windows match unless con_id or con_mark is given
+        assert self.query(tree, '[all]') == [11, 31, 13, 33]
+        assert self.query(tree, '[con_id=12]') == [12]
+        assert self.query(tree, '[con_mark="^(split|edit)$"]') == [12, 13]
+        assert self.query(tree, '[con_id=__focused__]') == [11]
+
+    def test_context(self):
+        tree = make_tree()
+
+        assert self.query(tree, '[workspace="^3$"]') == [31, 33]
+        assert self.query(tree, '[workspace=__focused__]') == [11, 13]
+        assert self.query(tree, '[floating]') == [33]
+        assert self.query(tree, '[tiling class=Firefox]') == [11, 31]
+        assert self.query(tree, '[urgent=latest]') == [31]
+
+        floating_con = tree.find_by_id(32)
+        assert self.query(floating_con, '[floating]') == [33]
+        assert self.query(tree.find_by_id(30), '[workspace=3 class=.]') == [31, 33]
+
+    def test_lazy(self):
+        tree = make_tree()
+        matches = tree.query('[class=Firefox]')
+        assert next(matches).id == 11
+        assert next(matches).id == 31
+        assert next(matches, None) is None
+
+    def test_errors(self):
+        for criteria in ('[class="x"', '[class=]', '[foo=1]', '[title]', '[con_id=x]'):
+            with pytest.raises(ValueError):
+                compile_criteria(criteria)
+
+        assert compile_criteria('[class=a]') is compile_criteria('[class=a]')
+
+        # raised by the call, not when the results are taken
+        with pytest.raises(ValueError):
+            make_tree().query('[foo=1]')
@@ -0,0 +1,84 @@
+from i3ipc._private import discovery
+
+import os
+import socket
+
+import pytest
+
+
+@pytest.fixture
+def runtime_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_RUNTIME_DIR', str(tmp_path))
+    monkeypatch.setenv('DISPLAY', ':42')
+    monkeypatch.delenv('WAYLAND_DISPLAY', raising=False)
+    monkeypatch.delenv('I3SOCK', raising=False)
+    monkeypatch.delenv('SWAYSOCK', raising=False)
+    return tmp_path
+
+
+def listen(path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(str(path))
+    sock.listen(1)
+    return sock
+
+
+class TestDiscovery:
+    def test_scan_single_socket(self, runtime_dir):
+        (runtime_dir / 'i3').mkdir()
+        path = runtime_dir / 'i3' / 'ipc-socket.1234'
+        server = listen(path)
+
+        # a stale socket is skipped
+        stale = listen(runtime_dir / 'i3' / 'ipc-socket.999')
+        stale.close()
+
+        try:
+            assert discovery.scanned_socket_path() == str(path)
+        finally:
+            server.close()
+
+    def test_scan_ambiguous(self, runtime_dir):
+        (runtime_dir / 'i3').mkdir()
+        servers = [
+            listen(runtime_dir / 'i3' / 'ipc-socket.1'),
+            listen(runtime_dir / 'sway-ipc.1000.2.sock')
+        ]
+
+        try:
+            assert discovery.scanned_socket_path() is None
+        finally:
+            for server in servers:
+                server.close()
+
+    def test_cache(self, runtime_dir, monkeypatch):
+        path = runtime_dir / 'some-socket'
+        server = listen(path)
+
+        try:
+            assert discovery.cached_socket_path() is None
+            discovery.remember_socket_path(str(path))
+            assert discovery.cached_socket_path() == str(path)
+            assert os.stat(discovery.cache_path()).st_mode & 0o777 == 0o600
+
+            # the cache is per display
+            monkeypatch.setenv('DISPLAY', ':43')
+            assert discovery.cached_socket_path() is None
+            monkeypatch.setenv('DISPLAY', ':42')
+        finally:
+            server.close()
+
+        # the socket is gone
+        assert discovery.cached_socket_path() is None
+
+    def test_find_socket_path_caches(self, runtime_dir, monkeypatch):
+        (runtime_dir / 'i3').mkdir()
+        path = runtime_dir / 'i3' / 'ipc-socket.1234'
+        server = listen(path)
+
+        try:
+            assert discovery.find_socket_path() == str(path)
+            monkeypatch.setattr(discovery, 'scanned_socket_path', lambda: None)
+            assert discovery.find_socket_path() == str(path)
+        finally:
+            server.close()
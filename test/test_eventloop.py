@@ -0,0 +1,100 @@
+from ipctest import IpcTest
+
+from i3ipc import Connection, EventLoop
+
+from threading import Timer
+import pytest
+import socket
+import time
+
+
+class TestEventLoop:
+    def test_timers(self):
+        loop = EventLoop()
+        calls = []
+
+        loop.call_later(0.02, calls.append, 2)
+        loop.call_later(0.01, calls.append, 1)
+        loop.call_later(0.01, calls.append, 'cancelled').cancel()
+        loop.call_at(loop.time(), calls.append, 0)
+
+        # returns when there is nothing left to wait for
+        loop.run()
+        assert calls == [0, 1, 2]
+        loop.close()
+
+    def test_readers(self):
+        loop = EventLoop()
+        r, w = socket.socketpair()
+        data = []
+
+        def on_readable():
+            data.append(r.recv(10))
+            loop.remove_reader(r)
+
+        loop.add_reader(r, on_readable)
+        loop.call_later(0.01, w.send, b'hello')
+        loop.run(timeout=1)
+        assert data == [b'hello']
+        loop.close()
+        r.close()
+        w.close()
+
+    def test_stop_threadsafe(self):
+        loop = EventLoop()
+        calls = []
+        loop.call_later(5, calls.append, 'late')
+        Timer(0.01, loop.call_soon_threadsafe, args=(calls.append, 'soon')).start()
+        Timer(0.05, loop.stop).start()
+
+        start = time.monotonic()
+        loop.run()
+        assert time.monotonic() - start < 1
+        assert calls == ['soon']
+        loop.close()
+
+    def test_callback_error(self):
+        loop = EventLoop()
+        calls = []
+
+        def fail():
+            raise ValueError('callback failed')
+
+        loop.call_soon_threadsafe(fail)
+        loop.call_soon_threadsafe(calls.append, 1)
+        loop.call_soon_threadsafe(calls.append, 2)
+
+        with pytest.raises(ValueError):
+            loop.run(timeout=1)
+        assert calls == []
+
+        # the callbacks queued after the failed one are not lost
+        loop.run(timeout=1)
+        assert calls == [1, 2]
+        loop.close()
+
+
+class TestEventLoopConnections(IpcTest):
+    def test_two_connections(self, i3):
+        loop = EventLoop()
+        conns = [Connection(i3.socket_path) for _ in range(2)]
+        events = [[] for _ in conns]
+
+        for conn, received in zip(conns, events):
+            conn.on('tick', lambda c, e, received=received: received.append(e.payload))
+            loop.add_connection(conn)
+
+        loop.call_later(0.01, i3.send_tick, 'hello')
+        loop.call_later(0.1, conns[0].main_quit)
+        loop.run(timeout=1)
+
+        for received in events:
+            assert received == ['', 'hello']
+
+        # main_quit() only removes that connection
+        loop.call_later(0.01, i3.send_tick, 'again')
+        loop.run(timeout=0.1)
+        assert events[0] == ['', 'hello']
+        assert events[1] == ['', 'hello', 'again']
+
+        loop.close()
@@ -0,0 +1,74 @@
+from i3ipc._private import OrderedExecutor
+
+from threading import Lock
+import time
+
+
+class TestOrderedExecutor:
+    def test_order_per_key(self):
+        errors = []
+        executor = OrderedExecutor(4, errors.append, batch_size=3)
+        lock = Lock()
+        calls = {key: [] for key in range(4)}
+        running = set()
+        overlaps = []
+
+        def handler(key, i):
+            with lock:
+                if key in running:
+                    overlaps.append(key)
+                running.add(key)
+            time.sleep(0.001)
+            with lock:
+                running.discard(key)
+                calls[key].append(i)
+
+        for i in range(40):
+            executor.submit(i % 4, handler, (i % 4, i))
+
+        assert executor.join(timeout=5)
+        executor.shutdown()
+
+        assert not errors
+        assert not overlaps
+        for key, received in calls.items():
+            assert received == list(range(key, 40, 4))
+
+    def test_errors(self):
+        errors = []
+        executor = OrderedExecutor(1, errors.append)
+
+        def fail():
+            raise ValueError('handler')
+
+        executor.submit('key', fail, ())
+        executor.submit('key', fail, ())
+        assert executor.join(timeout=5)
+        executor.shutdown()
+
+        assert [str(e) for e in errors] == ['handler', 'handler']
+        assert executor.pending == 0
+
+    def test_shutdown(self):
+        errors = []
+        executor = OrderedExecutor(2, errors.append, batch_size=1)
+        calls = []
+        assert not executor.running
+
+        for i in range(10):
+            executor.submit('key', lambda i: (time.sleep(0.001), calls.append(i)), (i, ))
+
+        # the calls that were submitted still run
+        executor.shutdown(wait=False)
+        assert not executor.running
+        assert executor.join(timeout=5)
+        assert calls == list(range(10))
+
+        # and the threads start again for new calls
+        executor.submit('key', calls.append, (10, ))
+        assert executor.running
+        assert executor.join(timeout=5)
+        executor.shutdown()
+
+        assert not errors
+        assert calls == list(range(11))
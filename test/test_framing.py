@@ -0,0 +1,31 @@
+from i3ipc._private import FrameParser
+
+import json
+import struct
+
+
+def pack(message_type, payload):
+    payload = json.dumps(payload).encode()
+    return b'i3-ipc' + struct.pack('=II', len(payload), message_type) + payload
+
+
+class TestFraming:
+    def test_partial_frames(self):
+        stream = b''.join(pack(i, {'change': 'focus', 'n': i}) for i in range(100))
+        parser = FrameParser()
+        messages = []
+
+        for i in range(0, len(stream), 7):
+            parser.feed(stream[i:i + 7])
+            messages.extend(parser.frames())
+
+        assert [t for t, _ in messages] == list(range(100))
+        assert [json.loads(p)['n'] for _, p in messages] == list(range(100))
+        assert len(parser) == 0
+
+    def test_many_frames_per_feed(self):
+        parser = FrameParser()
+        parser.feed(pack(1, {}) * 10 + pack(2, {})[:10])
+
+        assert len(list(parser.frames())) == 10
+        assert len(parser) == 10
@@ -0,0 +1,74 @@
+from i3ipc._private import SubscriptionHandoff, is_handoff_marker
+
+import json
+
+TICK = (1 << 31) | 7
+WINDOW = (1 << 31) | 3
+REPLY = 2
+
+
+def tick(payload='', first=False):
+    return TICK, json.dumps({'first': first, 'payload': payload}).encode()
+
+
+def window(n):
+    return WINDOW, json.dumps({'change': 'focus', 'n': n}).encode()
+
+
+class TestSubscriptionHandoff:
+    def test_handoff(self):
+        handoff = SubscriptionHandoff(json.loads, old_acked=False)
+        handled = []
+
+        def old(message):
+            if handoff.old_message(*message):
+                handled.append(json.loads(message[1])['n'])
+
+        def new(message):
+            if handoff.new_message(*message):
+                handled.append(json.loads(message[1])['n'])
+
+        old(window(1))
+        # the reply and the first tick of subscribing the old socket to ticks
+        old((REPLY, b'{"success":true}'))
+        old(tick(first=True))
+        new((REPLY, b'{"success":true}'))
+        new(tick(first=True))
+        assert handoff.ready
+
+        handoff.marker_sent = True
+        old(window(2))
+        new(window(2))
+        new(tick(handoff.marker))
+        # held until the old socket gets to the marker
+        new(window(3))
+        assert not handoff.done
+
+        old(tick(handoff.marker))
+        old(window(3))
+        assert handoff.done
+        assert handled == [1, 2]
+        assert [json.loads(p)['n'] for _, p in handoff.held] == [3]
+
+        new(window(4))
+        assert handled == [1, 2, 4]
+
+    def test_old_socket_first(self):
+        handoff = SubscriptionHandoff(json.loads, old_acked=True)
+        handoff.new_message(*tick(first=True))
+        assert handoff.ready
+
+        handoff.marker_sent = True
+        assert not handoff.old_message(*tick(handoff.marker))
+        assert not handoff.done
+        # the new socket got this one before the marker
+        assert not handoff.new_message(*window(1))
+        handoff.new_message(*tick(handoff.marker))
+        assert handoff.done
+        assert handoff.new_message(*window(2))
+
+    def test_marker(self):
+        handoff = SubscriptionHandoff(json.loads, old_acked=True)
+        assert is_handoff_marker(handoff.marker)
+        assert not is_handoff_marker('hello')
+        assert not is_handoff_marker(None)
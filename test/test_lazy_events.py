@@ -0,0 +1,46 @@
+from i3ipc import WindowEvent, WorkspaceEvent, Con
+from treedata import node
+
+
+class CountingCon(Con):
+    built = 0
+
+    def __init__(self, data, parent, conn):
+        CountingCon.built += 1
+        super().__init__(data, parent, conn)
+
+
+class TestLazyEvents:
+    def setup_method(self):
+        CountingCon.built = 0
+
+    def test_window_event(self):
+        e = WindowEvent({'change': 'focus', 'container': node(5, window=77)}, None, CountingCon)
+
+        assert e.container_id == 5
+        assert e.window_id == 77
+        assert CountingCon.built == 0
+
+        assert e.container.id == 5
+        assert e.container is e.container
+        assert CountingCon.built == 1
+
+        no_window = WindowEvent({'change': 'new', 'container': node(6)}, None, CountingCon)
+        assert no_window.window_id is None
+
+    def test_workspace_event(self):
+        e = WorkspaceEvent({'change': 'focus', 'current': node(1), 'old': None}, None, CountingCon)
+
+        assert e.current_id == 1
+        assert e.old_id is None
+        assert CountingCon.built == 0
+
+        assert e.old is None
+        assert e.current.id == 1
+        assert CountingCon.built == 1
+
+    def test_assignment(self):
+        e = WindowEvent({'change': 'focus', 'container': node(5)}, None, CountingCon)
+        e.container = None
+        assert e.container is None
+        assert CountingCon.built == 0
@@ -0,0 +1,45 @@
+from i3ipc import EventLoop
+from i3ipc._private import EventLimiter
+
+import pytest
+
+
+class Event:
+    def __init__(self, con_id, n):
+        self.con_id = con_id
+        self.n = n
+
+
+class TestEventLimiter:
+    def run_storm(self, **kwargs):
+        loop = EventLoop()
+        delivered = []
+        limiter = EventLimiter(loop.call_later, lambda event, data: delivered.append(data.n),
+                               **kwargs)
+
+        # 50 events, 2 ms apart, alternating between two containers
+        for i in range(50):
+            loop.call_later(i * 0.002, limiter.push, 'window', Event(i % 2, i))
+
+        loop.run(timeout=2)
+        loop.close()
+        return delivered
+
+    def test_debounce(self):
+        assert self.run_storm(debounce=30) == [49]
+
+    def test_debounce_coalesce_by(self):
+        delivered = self.run_storm(debounce=30, coalesce_by='con_id')
+        assert sorted(delivered) == [48, 49]
+
+    def test_throttle(self):
+        delivered = self.run_storm(throttle=40, coalesce_by=lambda e: e.con_id)
+        # the first event of each container goes out right away and the
+        # last one at the end of its window
+        assert delivered[:2] == [0, 1]
+        assert sorted(delivered[-2:]) == [48, 49]
+        assert len(delivered) < 15
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            EventLimiter(None, None, debounce=10, throttle=10)
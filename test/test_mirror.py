@@ -0,0 +1,148 @@
+from i3ipc import Con, WindowEvent, WorkspaceEvent
+from i3ipc._private import TreeMirror, diff_trees
+from treedata import node, window
+
+import copy
+
+
+def make_data():
+    ws1 = node(10,
+               'workspace',
+               name='1',
+               nodes=[
+                   window(11, 'one', focused=True),
+                   node(12, nodes=[window(13, 'two'), window(14, 'three')]),
+               ],
+               floating_nodes=[node(15, 'floating_con', nodes=[window(16, 'four')])])
+    ws2 = node(20, 'workspace', name='2', nodes=[window(21, 'five')])
+    content = node(3, name='content', nodes=[ws1, ws2])
+    return node(1, 'root', [node(2, 'output', [content], name='eDP-1')])
+
+
+def find(data, id):
+    if data['id'] == id:
+        return data
+    for n in data['nodes'] + data['floating_nodes']:
+        found = find(n, id)
+        if found is not None:
+            return found
+    return None
+
+
+def remove(data, id):
+    for n in data['nodes'] + data['floating_nodes']:
+        for name in ('nodes', 'floating_nodes'):
+            n[name] = [c for c in n[name] if c['id'] != id]
+        if id in n['focus']:
+            n['focus'].remove(id)
+        remove(n, id)
+
+
+def window_event(change, data):
+    return WindowEvent({'change': change, 'container': data}, None)
+
+
+class TestTreeMirror:
+    def setup_method(self):
+        self.data = make_data()
+        self.expected = copy.deepcopy(self.data)
+        self.mirror = TreeMirror(Con(self.data, None, None))
+
+    def check(self):
+        assert diff_trees(self.mirror.root, Con(self.expected, None, None)) == []
+
+    def test_window_focus(self):
+        tree = self.mirror.root
+        assert tree.find_focused().id == 11
+
+        find(self.expected, 11)['focused'] = False
+        find(self.expected, 13)['focused'] = True
+        find(self.expected, 10)['focus'] = [12, 11, 15]
+        assert self.mirror.apply(window_event('focus', find(self.expected, 13)))
+
+        self.check()
+        assert tree.find_focused().id == 13
+        assert self.mirror.root is tree
+
+    def test_window_properties(self):
+        title = find(self.expected, 21)
+        title['name'] = title['window_properties']['title'] = 'six'
+        assert self.mirror.apply(window_event('title', title))
+        assert self.mirror.root.find_by_id(21).window_title == 'six'
+
+        # marks are unique
+        find(self.expected, 11)['marks'] = ['a']
+        assert self.mirror.apply(window_event('mark', find(self.expected, 11)))
+        assert self.mirror.root.find_marked('a')[0].id == 11
+
+        find(self.expected, 11)['marks'] = []
+        find(self.expected, 14)['marks'] = ['a']
+        assert self.mirror.apply(window_event('mark', find(self.expected, 14)))
+
+        self.check()
+        assert [c.id for c in self.mirror.root.find_marked('a')] == [14]
+
+    def test_window_close(self):
+        tree = self.mirror.root
+        assert tree.find_by_id(11) is not None
+
+        remove(self.expected, 11)
+        assert self.mirror.apply(window_event('close', find(self.data, 11)))
+        assert tree.find_by_id(11) is None
+        assert tree.find_focused() is None
+
+        # the floating container is closed with its window
+        remove(self.expected, 16)
+        remove(self.expected, 15)
+        assert self.mirror.apply(window_event('close', find(self.data, 16)))
+
+        # closing an unknown window changes nothing
+        assert self.mirror.apply(window_event('close', window(99, 'gone')))
+        self.check()
+
+        # the split container may be flattened
+        assert not self.mirror.apply(window_event('close', find(self.data, 14)))
+
+    def test_window_not_applied(self):
+        assert not self.mirror.apply(window_event('new', window(17, 'new')))
+        assert not self.mirror.apply(window_event('move', find(self.data, 13)))
+        assert not self.mirror.apply(window_event('focus', window(99, 'unknown')))
+
+    def test_workspace_focus(self):
+        old = find(self.expected, 10)
+        find(old, 11)['focused'] = False
+        current = find(self.expected, 20)
+        find(current, 21)['focused'] = True
+        find(self.expected, 3)['focus'] = [20, 10]
+
+        e = WorkspaceEvent({
+            'change': 'focus',
+            'current': copy.deepcopy(current),
+            'old': copy.deepcopy(old)
+        }, None)
+        assert self.mirror.apply(e)
+
+        self.check()
+        assert self.mirror.root.find_focused().id == 21
+        assert self.mirror.root.find_by_id(11).workspace().name == '1'
+
+    def test_workspace_empty(self):
+        remove(self.expected, 20)
+        e = WorkspaceEvent({'change': 'empty', 'current': find(self.data, 20), 'old': None}, None)
+        assert self.mirror.apply(e)
+        self.check()
+
+        e = WorkspaceEvent({'change': 'init', 'current': node(30, 'workspace'), 'old': None}, None)
+        assert not self.mirror.apply(e)
+
+    def test_diff_trees(self):
+        find(self.expected, 13)['name'] = 'changed'
+        remove(self.expected, 21)
+
+        differences = diff_trees(self.mirror.root, Con(self.expected, None, None))
+        assert len(differences) == 3
+        assert any('name' in d and 'changed' in d for d in differences)
+        assert any('nodes are [21], not []' in d for d in differences)
+        assert any('focus is [21], not []' in d for d in differences)
+
+        assert diff_trees(self.mirror.root, Con(self.data, None, None)) == []
@@ -0,0 +1,31 @@
+from ipctest import IpcTest
+
+from threading import Thread
+import i3ipc
+
+
+class TestPool(IpcTest):
+    def test_pooled_requests(self, i3):
+        conn = i3ipc.Connection(cmd_pool_size=4)
+        errors = []
+
+        def worker():
+            try:
+                for _ in range(10):
+                    assert conn.get_tree().type == 'root'
+                    assert conn.command('nop')[0].success
+            except Exception as e:
+                errors.append(e)
+
+        threads = [Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert not errors
+        stats = conn.cmd_pool_stats
+        assert stats.size == 4
+        assert 1 <= stats.open <= 4
+        assert stats.in_use == 0
+        assert stats.checkouts == 160
@@ -0,0 +1,33 @@
+from i3ipc._private import PubSub
+from i3ipc._private.pubsub import peek_change
+
+
+class TestPrefilter:
+    def test_peek_change(self):
+        assert peek_change(b'{"change":"focus","container":{"id":1}}') == 'focus'
+        # sway puts spaces around the separators
+        assert peek_change(b'{ "change": "title", "container": { } }') == 'title'
+        # a title that looks like a change is escaped
+        assert peek_change(b'{"container":{"name":"\\"change\\":\\"x\\""},"change":"move"}') == 'move'
+        assert peek_change(b'{"first":true,"payload":""}') is None
+
+    def test_wants(self):
+        pubsub = PubSub(None)
+        focus = b'{"change":"focus","container":{}}'
+        title = b'{"change":"title","container":{}}'
+
+        assert not pubsub.wants('window', focus)
+
+        pubsub.subscribe('window::focus', print)
+        assert pubsub.wants('window', focus)
+        assert not pubsub.wants('window', title)
+        assert not pubsub.wants('workspace', focus)
+
+        pubsub.subscribe('window', repr)
+        assert pubsub.wants('window', title)
+
+        pubsub.unsubscribe(repr)
+        assert not pubsub.wants('window', title)
+
+        # an undecided change is decoded
+        assert pubsub.wants('window', b'{"container":{}}')
@@ -0,0 +1,51 @@
+from i3ipc._private import Reconnector, reconnect
+
+from threading import Timer
+import socket
+import time
+
+import pytest
+
+
+@pytest.fixture(params=['inotify', 'backoff'])
+def watch(request, monkeypatch):
+    if request.param == 'backoff':
+        monkeypatch.setattr(reconnect, '_libc', False)
+    return request.param
+
+
+class TestReconnect:
+    def test_wait_for_socket(self, tmp_path, watch):
+        path = str(tmp_path / 'ipc-socket')
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+        def listen():
+            server.bind(path)
+            server.listen(1)
+
+        Timer(0.1, listen).start()
+        try:
+            start = time.monotonic()
+            assert Reconnector(path).wait(deadline=5)
+            assert time.monotonic() - start < 1
+        finally:
+            server.close()
+
+    def test_deadline(self, tmp_path, watch):
+        reconnector = Reconnector(str(tmp_path / 'ipc-socket'), deadline=0.2)
+        start = time.monotonic()
+        assert not reconnector.wait()
+        assert 0.2 <= time.monotonic() - start < 1
+
+    def test_stats(self, tmp_path):
+        reconnector = Reconnector(str(tmp_path / 'ipc-socket'))
+        reconnector.record(0.5)
+        reconnector.record(0.1)
+        reconnector.record_failure()
+
+        stats = reconnector.stats()
+        assert stats.reconnects == 2
+        assert stats.failures == 1
+        assert stats.last_latency == 0.1
+        assert stats.max_latency == 0.5
+        assert stats.total_latency == pytest.approx(0.6)
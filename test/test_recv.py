@@ -0,0 +1,78 @@
+from i3ipc import Connection
+from i3ipc._private import PubSub, get_codec
+
+import json
+import pytest
+import struct
+
+
+class ChunkedSocket:
+    """Returns what it holds at most ``chunk`` bytes at a time, then EOF."""
+    def __init__(self, data, chunk):
+        self.data = data
+        self.chunk = chunk
+
+    def recv_into(self, view, size):
+        n = min(size, self.chunk, len(self.data))
+        view[:n] = self.data[:n]
+        self.data = self.data[n:]
+        return n
+
+
+def pack(message_type, payload):
+    return b'i3-ipc' + struct.pack('=II', len(payload), message_type) + payload
+
+
+def make_conn():
+    # the receive path does not need a connected socket
+    conn = Connection.__new__(Connection)
+    conn._codec = get_codec('json')
+    conn._pubsub = PubSub(conn)
+    return conn
+
+
+class TestRecv:
+    def test_short_reads(self):
+        conn = make_conn()
+        payload = json.dumps({'name': 'x' * 1000}).encode()
+
+        for chunk in (1, 7, 4096):
+            data, msg_type = conn._ipc_recv(ChunkedSocket(pack(4, payload), chunk))
+            assert msg_type == 4
+            assert data == payload
+
+    def test_eof(self):
+        assert make_conn()._ipc_recv(ChunkedSocket(b'', 10)) == (b'', 0)
+
+    def test_closed_in_message(self):
+        conn = make_conn()
+        message = pack(4, b'{"success": true}')
+
+        with pytest.raises(ConnectionResetError):
+            conn._ipc_recv(ChunkedSocket(message[:5], 3))
+
+        with pytest.raises(ConnectionResetError):
+            conn._ipc_recv(ChunkedSocket(message[:-1], 3))
+
+    def test_invalid_utf8_event(self):
+        conn = make_conn()
+        events = []
+        conn._pubsub.subscribe('window', lambda conn, e: events.append(e))
+
+        payload = b'{"change": "title", "container": {"id": 1, "name": "a\xff\xfeb"}}'
+        conn._dispatch_event((1 << 31) | 3, bytearray(payload))
+
+        assert events[0].container_id == 1
+        assert events[0].ipc_data['container']['name'] == 'a��b'
+
+    def test_handoff_marker_tick(self):
+        conn = make_conn()
+        ticks = []
+        conn._pubsub.subscribe('tick', lambda conn, e: ticks.append(e.payload))
+
+        # the marker of a handoff of another program
+        for payload in ('i3ipc-handoff-1234-0', 'hello'):
+            data = json.dumps({'first': False, 'payload': payload}).encode()
+            conn._dispatch_event((1 << 31) | 7, bytearray(data))
+
+        assert ticks == ['hello']
@@ -0,0 +1,21 @@
+from ipctest import IpcTest
+
+from i3ipc import VersionReply
+import i3ipc
+
+import pytest
+
+
+class TestTimeouts(IpcTest):
+    def test_timeout(self, i3):
+        conn = i3ipc.Connection(timeout=5)
+
+        with pytest.raises(TimeoutError):
+            conn.get_tree(timeout=0)
+
+        assert conn.timeouts == 1
+
+        # the socket that timed out was replaced
+        assert type(conn.get_version()) is VersionReply
+        assert conn.command('nop')[0].success
+        assert conn.timeouts == 1
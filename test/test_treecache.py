@@ -0,0 +1,94 @@
+from i3ipc import Con, TreeCache
+from test_mirror import make_data, find, window_event
+
+import copy
+
+
+class FakeConnection:
+    """Hands out copies of a tree. ``during_fetch`` is called while a tree is
+    gotten, like events handled by the loop thread meanwhile."""
+    def __init__(self, data):
+        self.data = data
+        self.handlers = []
+        self.during_fetch = None
+        self._event_loop = object()
+        self._sub_socket = object()
+
+    def _on(self, event, handler, inline=False):
+        assert inline
+        self.handlers.append(handler)
+
+    def off(self, handler):
+        self.handlers = [h for h in self.handlers if h != handler]
+
+    def emit(self, event):
+        for handler in set(self.handlers):
+            handler(self, event)
+
+    def get_tree(self):
+        tree = Con(copy.deepcopy(self.data), None, self)
+        if self.during_fetch is not None:
+            self.during_fetch()
+        return tree
+
+
+class TestTreeCache:
+    def test_events(self):
+        conn = FakeConnection(make_data())
+        cache = TreeCache(conn)
+        tree = cache.get_tree()
+
+        title = copy.deepcopy(find(conn.data, 21))
+        title['name'] = 'six'
+        conn.emit(window_event('title', title))
+
+        assert cache.get_tree() is tree
+        assert tree.find_by_id(21).name == 'six'
+        assert cache.fetches == 1
+
+        conn.emit(window_event('new', title))
+        assert cache.get_tree() is not tree
+        assert cache.fetches == 2
+
+        # a new event socket may have missed events
+        conn._sub_socket = object()
+        cache.get_tree()
+        assert cache.fetches == 3
+
+        cache.close()
+        assert not conn.handlers
+
+    def test_events_during_fetch(self):
+        conn = FakeConnection(make_data())
+        cache = TreeCache(conn)
+
+        # the reply was built before the title changed
+        title = copy.deepcopy(find(conn.data, 21))
+        title['name'] = 'six'
+        conn.during_fetch = lambda: conn.emit(window_event('title', title))
+
+        tree = cache.get_tree()
+        assert tree.find_by_id(21).name == 'six'
+        assert cache.fetches == 1
+
+    def test_no_event_loop(self):
+        conn = FakeConnection(make_data())
+        conn._event_loop = None
+        cache = TreeCache(conn)
+
+        assert cache.get_tree() is not cache.get_tree()
+        assert cache.fetches == 2
+
+    def test_verify(self):
+        conn = FakeConnection(make_data())
+        cache = TreeCache(conn, verify=True)
+        tree = cache.get_tree()
+
+        assert cache.verify() == []
+        assert cache.get_tree() is tree
+
+        # an event that never came
+        find(conn.data, 13)['name'] = 'changed'
+        assert len(cache.verify()) == 1
+        assert cache.get_tree() is not tree
+        assert cache.get_tree().find_by_id(13).name == 'changed'
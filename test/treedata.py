@@ -0,0 +1,24 @@
+"""Builders of the layout tree data i3 sends, for the tests that do not need
+a running i3."""
+
+
+def node(id, type='con', nodes=(), floating_nodes=(), **kwargs):
+    data = {
+        'id': id,
+        'type': type,
+        'layout': 'splith',
+        'border': 'normal',
+        'rect': {'x': 0, 'y': 0, 'width': 10, 'height': 10},
+        'focused': False,
+        'marks': [],
+        'nodes': list(nodes),
+        'floating_nodes': list(floating_nodes),
+        'focus': [n['id'] for n in list(nodes) + list(floating_nodes)]
+    }
+    data.update(kwargs)
+    return data
+
+
+def window(id, title, klass='URxvt', **kwargs):
+    props = {'class': klass, 'instance': klass.lower(), 'title': title}
+    return node(id, window=id * 100, window_properties=props, name=title, **kwargs)